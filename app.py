@@ -3,13 +3,12 @@ import cv2
 import numpy as np
 from PIL import Image
 import time
-import pandas as pd
 from datetime import datetime, date
 import config
-from face_recognizer import FaceRecognizer
-from face_detector import FaceDetector
-from spoof_detector import SpoofDetector
-from attendance_manager import AttendanceManager
+from components import ComponentRegistry
+from face_tracker import FaceTracker
+from metrics import metrics
+from preview import PreviewRenderer, StatusSlot
 from utils import format_timestamp, get_time_difference
 
 # Page configuration
@@ -19,16 +18,20 @@ st.set_page_config(
     layout="wide"
 )
 
-# Initialize components
+# Initialize components (shared across sessions, models warm up in the background)
 @st.cache_resource
 def load_components():
-    recognizer = FaceRecognizer()
-    detector = FaceDetector()
-    spoof_detector = SpoofDetector()
-    db_manager = AttendanceManager()
-    return recognizer, detector, spoof_detector, db_manager
+    registry = ComponentRegistry()
+    registry.start_warmup()
+    
+    if config.METRICS_HTTP_PORT:
+        metrics.start_http_server()
+    
+    return registry
 
-recognizer, detector, spoof_detector, db_manager = load_components()
+registry = load_components()
+recognizer, detector, spoof_detector, db_manager = registry.components()
+recognizer.poll_gallery()
 
 # Sidebar navigation
 st.sidebar.title("📋 Navigation")
@@ -38,6 +41,14 @@ page = st.sidebar.radio(
      "👥 Manage Users", "⚙️ Settings"]
 )
 
+# Model status
+if registry.warmup_error:
+    st.sidebar.error(f"❌ Model warm-up failed: {registry.warmup_error}")
+elif registry.is_ready():
+    st.sidebar.success(f"✅ Ready (models loaded in {registry.warmup_seconds:.1f}s)")
+else:
+    st.sidebar.info("⏳ Loading face models...")
+
 # Title
 st.title("👤 Face Authentication Attendance System")
 
@@ -48,7 +59,7 @@ if page == "🏠 Home":
     col1, col2, col3 = st.columns(3)
     
     with col1:
-        st.metric("Total Registered Users", len(recognizer.known_face_names))
+        st.metric("Total Registered Users", recognizer.gallery.identity_count())
     
     with col2:
         today_records = db_manager.get_today_attendance()
@@ -65,7 +76,6 @@ if page == "🏠 Home":
     st.subheader("📋 Latest Attendance Records")
     if len(today_records) > 0:
         latest = today_records.head(5).copy()
-        latest['timestamp'] = pd.to_datetime(latest['timestamp'])
         latest['time'] = latest['timestamp'].dt.strftime('%I:%M %p')
         
         display_df = latest[['name', 'employee_id', 'action', 'time']]
@@ -124,10 +134,25 @@ elif page == "✅ Mark Attendance":
     
     # Camera loop
     if st.session_state.get('camera_running', False):
+        if not registry.is_ready():
+            with st.spinner("Loading face models..."):
+                registry.ready.wait()
+        
         cap = cv2.VideoCapture(config.CAMERA_INDEX)
-        consecutive_frames = 0
+        tracker = FaceTracker(recognizer)
         last_recognized = None
         
+        # Preview is capped and downscaled; status widgets only change with their text
+        preview = PreviewRenderer(camera_placeholder)
+        status_slot = StatusSlot(status_placeholder)
+        recognition_slot = StatusSlot(recognition_status)
+        spoof_slot = StatusSlot(spoof_status)
+        last_record_slot = StatusSlot(last_record_placeholder)
+        last_record_employee = None  # Employee whose last record is shown
+        last_record = None
+        last_metrics_dump = time.time()
+        last_replay = time.time()
+        
         while st.session_state.get('camera_running', False):
             ret, frame = cap.read()
             
@@ -135,13 +160,17 @@ elif page == "✅ Mark Attendance":
                 st.error("Failed to access camera")
                 break
             
-            # Preprocess frame
-            processed_frame = detector.preprocess_frame(frame)
+            # Start / stop an on-demand profile requested from the Settings page
+            if registry.profiler.on_frame():
+                print(registry.profiler.last_report)
             
-            # Recognize faces
-            results = recognizer.recognize_face(processed_frame)
+            # Detect, encode and fuse faces across frames
+            # (lighting preprocessing is applied to face regions)
+            face_locations, face_encodings = recognizer.detect_and_encode(frame)
+            tracks = tracker.update(face_locations, face_encodings)
+            results = [track for track in tracks if track['employee_id'] is not None]
             
-            display_frame = frame.copy()
+            boxes = []
             
             if len(results) > 0:
                 result = results[0]
@@ -160,58 +189,76 @@ elif page == "✅ Mark Attendance":
                 
                 # Display info
                 color = (0, 255, 0) if is_live else (0, 0, 255)
-                display_frame = detector.draw_face_box(
-                    display_frame, face_location, name, color
-                )
+                boxes.append((face_location, name, color))
+                
+                recognition_slot.show('success', f"✅ Recognized: **{name}** (Confidence: {confidence}%)")
                 
-                recognition_status.success(f"✅ Recognized: **{name}** (Confidence: {confidence}%)")
+                # Show last attendance record (read once per face and after a punch)
+                if employee_id != last_record_employee:
+                    last_record = db_manager.get_user_last_attendance(employee_id)
+                    last_record_employee = employee_id
                 
-                # Show last attendance record
-                last_att = db_manager.get_user_last_attendance(employee_id)
-                if last_att:
-                    last_name, last_action, last_time = last_att
+                if last_record:
+                    last_name, last_action, last_time = last_record
                     time_ago = get_time_difference(last_time)
-                    last_record_placeholder.info(
+                    last_record_slot.show(
+                        'info',
                         f"🕒 Last Record: **{last_action.upper()}** at {format_timestamp(last_time)} ({time_ago})"
                     )
                 else:
-                    last_record_placeholder.info("🕒 No previous attendance record")
+                    last_record_slot.show('info', "🕒 No previous attendance record")
                 
                 if is_live:
-                    spoof_status.success(f"✅ Liveness: {liveness_conf:.1f}%")
-                    consecutive_frames += 1
+                    spoof_slot.show('success', f"✅ Liveness: {liveness_conf:.1f}%")
                     
-                    # Mark attendance after consecutive frames
-                    if consecutive_frames >= config.CONSECUTIVE_FRAMES_FOR_RECOGNITION:
-                        if last_recognized != employee_id:
+                    # Mark attendance once the fused identity is confident enough
+                    if result['ready']:
+                        if last_recognized == employee_id:
+                            tracker.mark_committed(result['track_id'])
+                        else:
                             success, message, action = recognizer.mark_attendance(employee_id)
+                            last_record_employee = None
                             
                             if success:
-                                status_placeholder.success(f"✅ {message}")
+                                status_slot.show('success', f"✅ {message}")
+                                tracker.mark_committed(result['track_id'])
                                 time.sleep(2)
                                 last_recognized = employee_id
                             else:
-                                status_placeholder.warning(f"⚠️ {message}")
-                        
-                        consecutive_frames = 0
+                                # Retry once the track has gathered evidence again
+                                status_slot.show('warning', f"⚠️ {message}")
+                                tracker.reset_evidence(result['track_id'])
                 else:
-                    spoof_status.error(f"❌ Spoof detected! ({liveness_conf:.1f}%)")
-                    consecutive_frames = 0
+                    spoof_slot.show('error', f"❌ Spoof detected! ({liveness_conf:.1f}%)")
+                    tracker.reset_evidence(result['track_id'])
+            elif len(tracks) > 0:
+                recognition_slot.show('info', "🔍 Identifying...")
+                spoof_slot.show('info', "⏳ Waiting...")
+                last_record_slot.clear()
             else:
-                recognition_status.info("👤 No face detected")
-                spoof_status.info("⏳ Waiting...")
-                last_record_placeholder.empty()
-                consecutive_frames = 0
+                recognition_slot.show('info', "👤 No face detected")
+                spoof_slot.show('info', "⏳ Waiting...")
+                last_record_slot.clear()
             
-            # Display frame
-            camera_placeholder.image(
-                cv2.cvtColor(display_frame, cv2.COLOR_BGR2RGB),
-                channels="RGB",
-                use_container_width=True
-            )
+            # Display frame (skipped frames are never drawn or encoded)
+            preview.render(frame, boxes, detector.draw_face_box)
+            
+            if metrics.enabled and time.time() - last_metrics_dump >= config.METRICS_DUMP_INTERVAL:
+                metrics.dump()
+                last_metrics_dump = time.time()
+            
+            # Apply punches left in the journal while the database was locked
+            if db_manager.journal is not None and time.time() - last_replay >= config.JOURNAL_REPLAY_INTERVAL:
+                db_manager.replay_journal(timeout=config.JOURNAL_APPLY_TIMEOUT)
+                last_replay = time.time()
             
-            time.sleep(0.1)
+            # Pick up enrollments / deletions and settings changed elsewhere
+            # (no sleep here: cap.read() paces the loop at the camera's frame
+            # rate and the preview renderer caps what is sent to the browser)
+            recognizer.poll_gallery()
+            registry.settings.poll()
         
+        registry.profiler.stop()
         cap.release()
 
 # REGISTER USER PAGE
@@ -246,6 +293,7 @@ elif page == "📝 Register User":
             "Department",
             ["", "Engineering", "HR", "Finance", "Marketing", "Operations"]
         )
+        site = st.text_input("Site", config.SITE_ID or "")
         
         register_button = st.button("✅ Register User", use_container_width=True)
         
@@ -259,7 +307,7 @@ elif page == "📝 Register User":
                 
                 with st.spinner("Processing..."):
                     success, message = recognizer.register_new_face(
-                        frame, name, employee_id, email, department
+                        frame, name, employee_id, email, department or None, site or None
                     )
                 
                 if success:
@@ -279,11 +327,10 @@ elif page == "📊 View Attendance":
     selected_date = st.date_input("Select Date", value=date.today())
     
     # Get attendance data
-    df = db_manager.get_today_attendance()
+    df = db_manager.get_attendance_range(selected_date, selected_date)
     
     if len(df) > 0:
-        # Format timestamp
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
+        # Format timestamp (already local time)
         df['time'] = df['timestamp'].dt.strftime('%I:%M %p')
         df['date'] = df['timestamp'].dt.date
         
@@ -316,7 +363,7 @@ elif page == "📊 View Attendance":
             mime="text/csv"
         )
     else:
-        st.info("No attendance records for today")
+        st.info(f"No attendance records for {selected_date.strftime('%d %b %Y')}")
 
 # MANAGE USERS PAGE
 elif page == "👥 Manage Users":
@@ -350,6 +397,7 @@ elif page == "👥 Manage Users":
                     st.write(f"**Employee ID:** {row['employee_id']}")
                     st.write(f"**Email:** {row['email'] if row['email'] else 'N/A'}")
                     st.write(f"**Department:** {row['department'] if row['department'] else 'N/A'}")
+                    st.write(f"**Site:** {row['site'] if row['site'] else 'N/A'}")
                     st.write(f"**Registered:** {row['registered_date']}")
                     
                     # Last attendance
@@ -364,6 +412,21 @@ elif page == "👥 Manage Users":
                     else:
                         st.warning("⚠️ No attendance records yet")
                 
+                    # Additional captures make recognition more robust
+                    templates = len(recognizer.gallery.rows_for(row['employee_id']))
+                    st.write(f"**Face Templates:** {templates}")
+                    photo = st.file_uploader(
+                        "➕ Add face photo", type=['jpg', 'jpeg', 'png'],
+                        key=f"photo_{row['employee_id']}"
+                    )
+                    if photo is not None and st.button("Add Photo", key=f"add_{row['employee_id']}"):
+                        frame = cv2.imdecode(np.frombuffer(photo.getvalue(), np.uint8), cv2.IMREAD_COLOR)
+                        success, message = recognizer.add_face_template(frame, row['employee_id'])
+                        if success:
+                            st.success(f"✅ {message}")
+                        else:
+                            st.error(f"❌ {message}")
+                
                 with col2:
                     # Delete button
                     delete_key = f"del_{row['employee_id']}"
@@ -389,11 +452,13 @@ elif page == "⚙️ Settings":
     
     st.subheader("🔧 Recognition Parameters")
     
+    current = registry.settings.current
+    
     tolerance = st.slider(
         "Face Recognition Tolerance",
         min_value=0.3,
         max_value=0.8,
-        value=config.FACE_RECOGNITION_TOLERANCE,
+        value=float(current.tolerance),
         step=0.05,
         help="Lower = more strict matching"
     )
@@ -402,7 +467,7 @@ elif page == "⚙️ Settings":
         "Consecutive Frames Required",
         min_value=1,
         max_value=10,
-        value=config.CONSECUTIVE_FRAMES_FOR_RECOGNITION,
+        value=int(current.consecutive_frames),
         help="Frames needed before marking attendance"
     )
     
@@ -410,24 +475,101 @@ elif page == "⚙️ Settings":
     
     enable_blink = st.checkbox(
         "Enable Blink Detection",
-        value=config.ENABLE_BLINK_DETECTION
+        value=current.blink_detection
     )
     
     enable_movement = st.checkbox(
         "Enable Movement Detection",
-        value=config.ENABLE_MOVEMENT_DETECTION
+        value=current.movement_detection
     )
     
     min_time = st.number_input(
         "Minimum Time Between Punches (seconds)",
         min_value=10,
         max_value=300,
-        value=config.MIN_TIME_BETWEEN_PUNCHES
+        value=int(current.min_time_between_punches)
     )
     
     if st.button("💾 Save Settings"):
-        st.success("✅ Settings saved successfully!")
-        st.info("⚠️ Please restart the application for changes to take effect")
+        try:
+            registry.settings.update(
+                tolerance=tolerance,
+                consecutive_frames=consecutive_frames,
+                blink_detection=enable_blink,
+                movement_detection=enable_movement,
+                min_time_between_punches=min_time
+            )
+            st.success("✅ Settings saved and applied to the running system")
+        except ValueError as e:
+            st.error(f"❌ {str(e)}")
+    
+    st.markdown("---")
+    st.subheader("📈 Performance Metrics")
+    
+    metrics.enabled = st.checkbox(
+        "Enable Instrumentation",
+        value=metrics.enabled,
+        help="Stage timers and counters for detection, encoding, liveness and database calls"
+    )
+    
+    stages, counters = metrics.snapshot()
+    
+    if stages:
+        import pandas as pd  # Deferred - only this table needs it
+        
+        stages_df = pd.DataFrame(stages)
+        stages_df.columns = ['Stage', 'Calls', 'Mean (ms)', 'p50 (ms)', 'p95 (ms)', 'p99 (ms)']
+        st.dataframe(stages_df, use_container_width=True, hide_index=True)
+    else:
+        st.info("No measurements yet. Start the camera on 'Mark Attendance' to collect them.")
+    
+    # Counters in rows of four
+    counter_items = sorted(counters.items())
+    for row_start in range(0, len(counter_items), 4):
+        counter_cols = st.columns(4)
+        for col, (name, value) in zip(counter_cols, counter_items[row_start:row_start + 4]):
+            col.metric(name.replace('_', ' ').capitalize(), value)
+    
+    col_refresh, col_dump, col_reset = st.columns(3)
+    with col_refresh:
+        if st.button("🔄 Refresh Metrics", use_container_width=True):
+            st.rerun()
+    with col_dump:
+        if st.button("💾 Write Metrics File", use_container_width=True):
+            st.success(f"✅ Written to {metrics.dump()}")
+    with col_reset:
+        if st.button("🗑️ Reset Metrics", use_container_width=True):
+            metrics.reset()
+            st.rerun()
+    
+    st.markdown("---")
+    st.subheader("🔬 Profile Recognition Loop")
+    
+    col_mode, col_amount = st.columns(2)
+    with col_mode:
+        profile_mode = st.radio("Capture for", ["Seconds", "Frames"], horizontal=True)
+    with col_amount:
+        profile_amount = st.number_input(
+            "Amount",
+            min_value=1,
+            max_value=600,
+            value=config.PROFILE_DEFAULT_SECONDS
+        )
+    
+    if registry.profiler.active:
+        st.info("⏺️ Capturing profile...")
+    elif registry.profiler.pending:
+        st.info("⏳ Profile requested - it starts with the next frame on 'Mark Attendance'")
+    
+    if st.button("▶️ Capture Profile"):
+        if profile_mode == "Seconds":
+            registry.profiler.request(seconds=int(profile_amount))
+        else:
+            registry.profiler.request(frames=int(profile_amount))
+        st.rerun()
+    
+    if registry.profiler.last_report:
+        st.code(registry.profiler.last_report, language=None)
 
 # Footer
 st.markdown("---")
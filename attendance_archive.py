@@ -0,0 +1,45 @@
+"""
+Archive closed months of attendance
+
+Months older than ATTENDANCE_HOT_MONTHS are moved out of the live database into
+compressed read-only files in ATTENDANCE_ARCHIVE_DIR. Date range queries still
+read them; punches only ever touch the current month.
+
+    python attendance_archive.py list
+    python attendance_archive.py archive              # everything older than the hot window
+    python attendance_archive.py archive --month 2026-01
+"""
+import argparse
+import sqlite3
+from attendance_manager import AttendanceManager
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive closed months of attendance")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    
+    subparsers.add_parser('list', help="Show attendance partitions")
+    
+    archive_parser = subparsers.add_parser('archive', help="Archive closed months")
+    archive_parser.add_argument('--month', help="Archive one month (YYYY-MM)")
+    archive_parser.add_argument(
+        '--keep', type=int,
+        help="Hot months to keep, including the current one (default: ATTENDANCE_HOT_MONTHS; "
+             "0 = archive every closed month)"
+    )
+    
+    args = parser.parse_args()
+    db_manager = AttendanceManager()
+    
+    if args.command == 'list':
+        conn = sqlite3.connect(db_manager.db_path)
+        for month, state, path in db_manager.get_partitions(conn.cursor()):
+            print(f"{month}  {state:8s}  {path or ''}")
+        conn.close()
+    elif args.month:
+        print(f"Archived {args.month} to {db_manager.archive_month(args.month)}")
+    else:
+        archived = db_manager.archive_closed_months(args.keep)
+        print(f"Archived {len(archived)} months: {', '.join(archived)}" if archived else "Nothing to archive")
+
+if __name__ == '__main__':
+    main()
@@ -1,24 +1,203 @@
+import functools
+import gzip
+import os
+import threading
+import shutil
 import sqlite3
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
-import pandas as pd
 import pytz
 import config
+from metrics import metrics, timed
+from punch_journal import PunchJournal, JournalLockedError
+from runtime_settings import default_settings
+
+def partition_table(month):
+    """Table holding one month of attendance ('2026-01' -> attendance_2026_01)"""
+    return f"attendance_{month.replace('-', '_')}"
+
+def month_range(start_month, end_month):
+    """Months from start to end inclusive, as 'YYYY-MM' strings"""
+    year, month = int(start_month[:4]), int(start_month[5:7])
+    months = []
+    while f"{year:04d}-{month:02d}" <= end_month:
+        months.append(f"{year:04d}-{month:02d}")
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+# Partition layouts: text IST timestamps (before epoch storage) and UTC epoch seconds
+FORMAT_TEXT = 1
+FORMAT_EPOCH = 2
+
+class QueryCache:
+    """
+    LRU cache of query results, each tagged with the data version it was read at
+    An entry is only returned while the database is still at that version
+    """
+    def __init__(self, max_entries=None):
+        self.max_entries = config.QUERY_CACHE_SIZE if max_entries is None else max_entries
+        self._entries = OrderedDict()  # key -> (version, result)
+        self._lock = threading.Lock()
+    
+    def get(self, key, version):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+    
+    def put(self, key, version, result):
+        if self.max_entries <= 0:
+            return
+        
+        with self._lock:
+            self._entries[key] = (version, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+def cached_query(method):
+    """
+    Serve a read-only AttendanceManager query from the query cache, keyed by
+    method name and arguments. Callers get a copy they are free to modify.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args):
+        if self.query_cache.max_entries <= 0:
+            return method(self, *args)
+        
+        key = (method.__name__,) + args
+        version = self.get_data_version()
+        result = self.query_cache.get(key, version)
+        
+        if result is None:
+            metrics.inc('query_cache_misses')
+            result = method(self, *args)
+            self.query_cache.put(key, version, result)
+        else:
+            metrics.inc('query_cache_hits')
+        
+        return result.copy()
+    return wrapper
 
 class AttendanceManager:
-    def __init__(self):
-        self.db_path = config.DB_PATH
-        self.timezone = pytz.timezone('Asia/Kolkata')  # IST timezone
+    """
+    Attendance is stored in one table per month (attendance_YYYY_MM) listed in
+    attendance_partitions. Punches only touch the current month, queries only the
+    months in their date range, and closed months can be archived to compressed
+    read-only files. The `attendance` view is the union of the hot months.
+    
+    Punch times are stored as UTC epoch seconds (punched_at) and only converted
+    to local time for display.
+    
+    With the punch journal enabled, punches are journaled first and then applied
+    to the database, so a crash or a locked database doesn't lose them. Each
+    process writes its own journal (see open_journal).
+    
+    Dashboard queries are cached per process; every write bumps a data version
+    stored in the database, so writes from other processes (kiosks) invalidate
+    the cache too.
+    """
+    def __init__(self, db_path=None, journal_path=None, kiosk_id=None):
+        self.db_path = db_path or config.DB_PATH
+        self.kiosk_id = kiosk_id or config.KIOSK_ID
+        self.journal_writer = self.kiosk_id  # Key of this process's journal in punch_journal_state
+        self.timezone = pytz.timezone(config.TIMEZONE)  # IST timezone
+        if self.db_path == config.DB_PATH:
+            self.archive_dir = config.ATTENDANCE_ARCHIVE_DIR
+            default_journal_path = config.PUNCH_JOURNAL_PATH
+        else:
+            self.archive_dir = os.path.join(os.path.dirname(os.path.abspath(self.db_path)), 'archive')
+            default_journal_path = os.path.join(os.path.dirname(os.path.abspath(self.db_path)), 'punch_journal.bin')
+        self._hot_months = set()  # Partitions known to exist (per process)
+        self.journal = None
+        self.query_cache = QueryCache()
+        self.settings = default_settings()  # Replaced as a whole by apply_settings
         self.init_database()
+        
+        if config.PUNCH_JOURNAL_ENABLED:
+            self.journal, self.journal_writer = self.open_journal(journal_path or default_journal_path)
+            self.journal.advance(self.get_applied_seq())
+            self.replay_journal()
+    
+    def apply_settings(self, settings):
+        """Switch to new runtime settings (minimum time between punches)"""
+        self.settings = settings
+    
+    def open_journal(self, path):
+        """
+        Claim a punch journal for this process
+        Sequence numbers are only unique per writer, so a journal held by another
+        process (e.g. the kiosk UI while the recognition service runs) is never
+        shared: the next free slot <name>.1.bin, <name>.2.bin, ... is used instead,
+        with its own key in punch_journal_state. Whoever claims a slot later
+        replays what is left in it.
+        Returns: (PunchJournal, writer key)
+        """
+        base, ext = os.path.splitext(path)
+        
+        for slot in range(config.JOURNAL_MAX_WRITERS):
+            slot_path = path if slot == 0 else f"{base}.{slot}{ext}"
+            try:
+                journal = PunchJournal(slot_path)
+            except JournalLockedError:
+                continue
+            
+            if slot == 0:
+                return journal, self.kiosk_id
+            
+            print(f"Punch journal {path} is in use by another process - journaling to {slot_path}")
+            metrics.inc('journal_slot_fallbacks')
+            return journal, f"{self.kiosk_id}#{slot}"
+        
+        raise JournalLockedError(f"All {config.JOURNAL_MAX_WRITERS} punch journals at {path} are in use")
+    
+    def close(self):
+        """Flush the punch journal and release it for other processes"""
+        if self.journal is not None:
+            self.journal.close()
     
     def get_current_time(self):
         """Get current time in IST"""
         return datetime.now(self.timezone).strftime('%Y-%m-%d %H:%M:%S')
     
+    def to_epoch(self, timestamp):
+        """IST 'YYYY-MM-DD HH:MM:SS' text -> UTC epoch seconds"""
+        local_time = self.timezone.localize(datetime.strptime(timestamp, '%Y-%m-%d %H:%M:%S'))
+        return int(local_time.timestamp())
+    
+    def date_to_epoch(self, day):
+        """Epoch of local midnight at the start of a date"""
+        return int(self.timezone.localize(datetime(day.year, day.month, day.day)).timestamp())
+    
+    def format_time(self, epoch, fmt='%Y-%m-%d %H:%M:%S'):
+        """UTC epoch seconds -> local time text (display only)"""
+        return datetime.fromtimestamp(epoch, self.timezone).strftime(fmt)
+    
+    def month_of(self, epoch):
+        """Local month ('YYYY-MM') of an epoch - selects the partition"""
+        return self.format_time(epoch, '%Y-%m')
+    
+    def connect(self):
+        """Connection with to_epoch() available to SQL (used by migrations)"""
+        conn = sqlite3.connect(self.db_path)
+        conn.create_function('to_epoch', 1, self.to_epoch, deterministic=True)
+        return conn
+    
     def init_database(self):
         """Initialize database tables"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self.connect()
         cursor = conn.cursor()
         
+        # Readers (punch lookups, reports) don't wait for a writer
+        cursor.execute('PRAGMA journal_mode=WAL')
+        
         # Users table
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS users (
@@ -31,22 +210,225 @@ class AttendanceManager:
             )
         ''')
         
-        # Attendance table
+        # Site column (added after the first release)
+        cursor.execute('PRAGMA table_info(users)')
+        if 'site' not in [column[1] for column in cursor.fetchall()]:
+            cursor.execute('ALTER TABLE users ADD COLUMN site TEXT')
+        
+        # Attendance partitions: state is 'hot' (table in this database) or 'archived'
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS attendance_partitions (
+                month TEXT PRIMARY KEY,
+                state TEXT CHECK(state IN ('hot', 'archived')),
+                path TEXT
+            )
+        ''')
+        
+        # Layout of each partition (added with epoch timestamps)
+        cursor.execute('PRAGMA table_info(attendance_partitions)')
+        if 'format' not in [column[1] for column in cursor.fetchall()]:
+            cursor.execute(f'ALTER TABLE attendance_partitions ADD COLUMN format INTEGER DEFAULT {FORMAT_TEXT}')
+        
+        # Databases from before partitioning have a single attendance table
+        cursor.execute("SELECT type FROM sqlite_master WHERE name = 'attendance'")
+        existing = cursor.fetchone()
+        if existing and existing[0] == 'table':
+            self.migrate_to_partitions(cursor)
+        
+        # Bumped by every write; cached query results are tagged with it
         cursor.execute('''
-            CREATE TABLE IF NOT EXISTS attendance (
+            CREATE TABLE IF NOT EXISTS data_version (
+                id INTEGER PRIMARY KEY CHECK(id = 1),
+                version INTEGER NOT NULL
+            )
+        ''')
+        cursor.execute('INSERT OR IGNORE INTO data_version (id, version) VALUES (1, 0)')
+        
+        # Last punch journal sequence number applied, per journal writer (kiosk or kiosk#slot)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS punch_journal_state (
+                kiosk TEXT PRIMARY KEY,
+                seq INTEGER
+            )
+        ''')
+        
+        cursor.execute('SELECT month, state, path FROM attendance_partitions WHERE format = ?', (FORMAT_TEXT,))
+        legacy = cursor.fetchall()
+        if legacy:
+            self.migrate_to_epoch(cursor, legacy)
+        
+        self.ensure_partition(cursor, self.month_of(time.time()))
+        
+        conn.commit()
+        conn.close()
+    
+    def bump_data_version(self, cursor):
+        """Invalidate cached query results (call inside the writing transaction)"""
+        cursor.execute('UPDATE data_version SET version = version + 1')
+    
+    def get_data_version(self):
+        """Current data version (one single-row read)"""
+        conn = sqlite3.connect(self.db_path)
+        version = conn.execute('SELECT version FROM data_version').fetchone()[0]
+        conn.close()
+        return version
+    
+    def create_partition_table(self, cursor, table, schema=''):
+        """Create a month table and its indexes (schema = database prefix, e.g. 'archive.')"""
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS {schema}{table} (
                 attendance_id INTEGER PRIMARY KEY AUTOINCREMENT,
                 user_id INTEGER,
                 employee_id TEXT,
                 action TEXT CHECK(action IN ('punch-in', 'punch-out')),
-                timestamp TEXT,
+                punched_at INTEGER NOT NULL,  -- UTC epoch seconds
                 FOREIGN KEY (user_id) REFERENCES users(user_id)
             )
         ''')
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS {schema}idx_{table}_employee ON {table} (employee_id, punched_at)')
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS {schema}idx_{table}_punched_at ON {table} (punched_at)')
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS {schema}idx_{table}_user ON {table} (user_id)')
+    
+    def ensure_partition(self, cursor, month):
+        """
+        Create the partition for a month if needed
+        Runs in the caller's transaction, started as BEGIN IMMEDIATE if none is
+        open, so processes reaching a new month together don't race to create it
+        """
+        if month in self._hot_months:
+            return
+        
+        if not cursor.connection.in_transaction:
+            cursor.execute('BEGIN IMMEDIATE')
+        
+        self.create_partition_table(cursor, partition_table(month))
+        cursor.execute(
+            "INSERT OR IGNORE INTO attendance_partitions (month, state, path, format) VALUES (?, 'hot', NULL, ?)",
+            (month, FORMAT_EPOCH)
+        )
+        
+        if cursor.rowcount == 1:
+            self.rebuild_view(cursor)
+        else:
+            cursor.execute('SELECT state FROM attendance_partitions WHERE month = ?', (month,))
+            if cursor.fetchone()[0] == 'archived':
+                raise ValueError(f"Attendance for {month} is archived (read-only)")
+        
+        self._hot_months.add(month)
+    
+    def rebuild_view(self, cursor):
+        """Recreate the `attendance` view over all hot partitions"""
+        cursor.execute("SELECT month FROM attendance_partitions WHERE state = 'hot' ORDER BY month")
+        tables = [partition_table(month) for (month,) in cursor.fetchall()]
+        
+        cursor.execute('DROP VIEW IF EXISTS attendance')
+        if tables:
+            cursor.execute('CREATE VIEW attendance AS ' + ' UNION ALL '.join(
+                f'SELECT attendance_id, user_id, employee_id, action, punched_at FROM {table}'
+                for table in tables
+            ))
+    
+    def migrate_to_partitions(self, cursor):
+        """
+        Move the rows of the single attendance table into monthly partitions
+        Rows without a timestamp can't be placed in a month; they are kept in
+        attendance_unmigrated
+        """
+        cursor.execute('SELECT COUNT(*) FROM attendance WHERE timestamp IS NULL')
+        unplaced = cursor.fetchone()[0]
+        if unplaced:
+            cursor.execute('CREATE TABLE IF NOT EXISTS attendance_unmigrated AS SELECT * FROM attendance WHERE 0')
+            cursor.execute('INSERT INTO attendance_unmigrated SELECT * FROM attendance WHERE timestamp IS NULL')
+            print(f"{unplaced} attendance rows have no timestamp - kept in attendance_unmigrated")
+        
+        cursor.execute('SELECT DISTINCT substr(timestamp, 1, 7) FROM attendance WHERE timestamp IS NOT NULL')
+        months = [month for (month,) in cursor.fetchall()]
+        
+        for month in months:
+            table = partition_table(month)
+            self.create_partition_table(cursor, table)
+            cursor.execute(f'''
+                INSERT INTO {table} (attendance_id, user_id, employee_id, action, punched_at)
+                SELECT attendance_id, user_id, employee_id, action, to_epoch(timestamp) FROM attendance
+                WHERE timestamp >= ? AND timestamp < ?
+            ''', (month, month + '~'))
+            cursor.execute(
+                "INSERT OR IGNORE INTO attendance_partitions (month, state, path, format) VALUES (?, 'hot', NULL, ?)",
+                (month, FORMAT_EPOCH)
+            )
+        
+        cursor.execute('DROP TABLE attendance')
+        self.rebuild_view(cursor)
+        print(f"Migrated attendance into {len(months)} monthly partitions")
+    
+    def convert_partition(self, cursor, table, schema=''):
+        """Rebuild a month table with text timestamps as an epoch table, keeping attendance ids"""
+        cursor.execute(f'ALTER TABLE {schema}{table} RENAME TO {table}_text')
+        for index in ('employee', 'timestamp', 'user'):
+            cursor.execute(f'DROP INDEX IF EXISTS {schema}idx_{table}_{index}')
+        
+        self.create_partition_table(cursor, table, schema)
+        cursor.execute(f'''
+            INSERT INTO {schema}{table} (attendance_id, user_id, employee_id, action, punched_at)
+            SELECT attendance_id, user_id, employee_id, action, to_epoch(timestamp) FROM {schema}{table}_text
+        ''')
+        cursor.execute(f'DROP TABLE {schema}{table}_text')
+    
+    def migrate_to_epoch(self, cursor, partitions):
+        """Convert partitions with text timestamps in place (archives are rewritten)"""
+        for month, state, path in partitions:
+            table = partition_table(month)
+            
+            if state == 'hot':
+                cursor.execute('DROP VIEW IF EXISTS attendance')
+                self.convert_partition(cursor, table)
+            else:
+                database_path = path[:-len('.gz')] + '.tmp'
+                with gzip.open(path, 'rb') as source, open(database_path, 'wb') as target:
+                    shutil.copyfileobj(source, target)
+                
+                archive_conn = self.connect()
+                archive_conn.execute('ATTACH DATABASE ? AS archive', (database_path,))
+                self.convert_partition(archive_conn.cursor(), table, 'archive.')
+                archive_conn.commit()
+                archive_conn.close()
+                self.write_archive(database_path, path)
+            
+            cursor.execute('UPDATE attendance_partitions SET format = ? WHERE month = ?', (FORMAT_EPOCH, month))
+        
+        self.rebuild_view(cursor)
+        print(f"Converted {len(partitions)} attendance partitions to epoch timestamps")
+    
+    def get_partitions(self, cursor):
+        """All partitions, newest first: list of (month, state, path)"""
+        cursor.execute('SELECT month, state, path FROM attendance_partitions ORDER BY month DESC')
+        return cursor.fetchall()
+    
+    def insert_records(self, records):
+        """
+        Bulk insert attendance records, routed to their month partitions
+        records: iterable of (user_id, employee_id, action, punched_at epoch seconds)
+        """
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        by_month = {}
+        for record in records:
+            by_month.setdefault(self.month_of(record[3]), []).append(record)
         
+        for month, rows in by_month.items():
+            self.ensure_partition(cursor, month)
+            cursor.executemany(
+                f'INSERT INTO {partition_table(month)} (user_id, employee_id, action, punched_at) VALUES (?, ?, ?, ?)',
+                rows
+            )
+        
+        self.bump_data_version(cursor)
         conn.commit()
         conn.close()
     
-    def register_user(self, name, employee_id, email=None, department=None):
+    @timed('db.register_user')
+    def register_user(self, name, employee_id, email=None, department=None, site=None):
         """Register a new user"""
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
@@ -54,41 +436,190 @@ class AttendanceManager:
         try:
             current_time = self.get_current_time()
             cursor.execute('''
-                INSERT INTO users (name, employee_id, email, department, registered_date)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (name, employee_id, email, department, current_time))
-            conn.commit()
+                INSERT INTO users (name, employee_id, email, department, registered_date, site)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (name, employee_id, email, department, current_time, site))
             user_id = cursor.lastrowid
+            self.bump_data_version(cursor)
+            conn.commit()
             return user_id, "User registered successfully"
         except sqlite3.IntegrityError:
             return None, "Employee ID already exists"
         finally:
             conn.close()
     
-    def get_last_attendance(self, employee_id):
-        """Get last attendance record for a user"""
+    @timed('db.register_users')
+    def register_users(self, users):
+        """
+        Register many users in a single transaction
+        users: list of dicts with name, employee_id and optional email, department, site
+        Returns: dict employee_id -> (user_id, message); user_id is None if rejected
+        """
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
+        results = {}
         
-        cursor.execute('''
-            SELECT action, timestamp FROM attendance
-            WHERE employee_id = ?
-            ORDER BY timestamp DESC
-            LIMIT 1
-        ''', (employee_id,))
+        try:
+            current_time = self.get_current_time()
+            
+            for user in users:
+                try:
+                    cursor.execute('''
+                        INSERT INTO users (name, employee_id, email, department, registered_date, site)
+                        VALUES (?, ?, ?, ?, ?, ?)
+                    ''', (user['name'], user['employee_id'], user.get('email'),
+                          user.get('department'), current_time, user.get('site')))
+                    results[user['employee_id']] = (cursor.lastrowid, "User registered successfully")
+                except sqlite3.IntegrityError:
+                    results[user['employee_id']] = (None, "Employee ID already exists")
+            
+            self.bump_data_version(cursor)
+            conn.commit()
+            return results
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+    
+    def find_last_record(self, cursor, employee_id, columns):
+        """
+        Most recent record of a user, searching hot partitions newest first
+        (normally only the current month is touched)
+        """
+        for month, state, _ in self.get_partitions(cursor):
+            if state != 'hot':
+                continue
+            
+            cursor.execute(f'''
+                SELECT {columns}
+                FROM {partition_table(month)} a
+                JOIN users u ON a.user_id = u.user_id
+                WHERE a.employee_id = ?
+                ORDER BY a.punched_at DESC
+                LIMIT 1
+            ''', (employee_id,))
+            
+            result = cursor.fetchone()
+            if result is not None:
+                return result
+        
+        return None
+    
+    @timed('db.get_last_attendance')
+    def get_last_attendance(self, employee_id):
+        """
+        Get last attendance record for a user
+        Returns: (action, punched_at epoch seconds) or None
+        """
+        try:
+            conn = sqlite3.connect(self.db_path, timeout=self.lookup_timeout())
+            cursor = conn.cursor()
+            result = self.find_last_record(cursor, employee_id, 'a.action, a.punched_at')
+            conn.close()
+        except sqlite3.OperationalError:
+            if self.journal is None:
+                raise
+            result = None
+        
+        # Journaled punches may not have reached the database yet
+        if self.journal is not None:
+            journaled = self.journal.last_punch(employee_id)
+            if journaled is not None and (result is None or journaled[1] > result[1]):
+                result = journaled
         
-        result = cursor.fetchone()
-        conn.close()
         return result
     
-    def mark_attendance(self, employee_id, action):
-        """Mark punch-in or punch-out"""
+    def lookup_timeout(self):
+        """Lock wait for the reads of a punch (short when the journal can take over)"""
+        return config.JOURNAL_APPLY_TIMEOUT if self.journal is not None else 5.0
+    
+    def get_applied_seq(self):
+        """Last punch journal sequence number applied to the database for this process's journal"""
         conn = sqlite3.connect(self.db_path)
+        row = conn.execute('SELECT seq FROM punch_journal_state WHERE kiosk = ?', (self.journal_writer,)).fetchone()
+        conn.close()
+        return row[0] if row else 0
+    
+    @timed('db.replay_journal')
+    def replay_journal(self, timeout=5.0):
+        """
+        Apply journaled punches the database doesn't have yet (idempotent: the
+        applied sequence number is updated in the same transaction)
+        Returns: number of punches applied, or None if the database is busy
+        """
+        if self.journal is None or not self.journal.events:
+            return 0
+        
+        conn = sqlite3.connect(self.db_path, timeout=timeout, isolation_level=None)
         cursor = conn.cursor()
         
-        # Get user_id
-        cursor.execute('SELECT user_id FROM users WHERE employee_id = ?', (employee_id,))
-        user = cursor.fetchone()
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute('SELECT seq FROM punch_journal_state WHERE kiosk = ?', (self.journal_writer,))
+            row = cursor.fetchone()
+            applied_seq = row[0] if row else 0
+            
+            events = self.journal.events_after(applied_seq)
+            if not events:
+                cursor.execute('ROLLBACK')
+                self.journal.applied(applied_seq)
+                return 0
+            
+            by_month = {}
+            for event in events:
+                by_month.setdefault(self.month_of(event[3]), []).append(event)
+            
+            for month, month_events in by_month.items():
+                try:
+                    self.ensure_partition(cursor, month)
+                except ValueError as e:
+                    print(f"Dropping {len(month_events)} journaled punches: {e}")
+                    continue
+                
+                # Punches of users deleted in the meantime are skipped
+                cursor.executemany(f'''
+                    INSERT INTO {partition_table(month)} (user_id, employee_id, action, punched_at)
+                    SELECT user_id, employee_id, ?, ? FROM users WHERE employee_id = ?
+                ''', [(action, punched_at, employee_id) for _, employee_id, action, punched_at in month_events])
+            
+            last_seq = events[-1][0]
+            cursor.execute('''
+                INSERT OR REPLACE INTO punch_journal_state (kiosk, seq) VALUES (?, ?)
+            ''', (self.journal_writer, last_seq))
+            self.bump_data_version(cursor)
+            cursor.execute('COMMIT')
+        except sqlite3.OperationalError:
+            if conn.in_transaction:
+                cursor.execute('ROLLBACK')
+            metrics.inc('journal_replay_busy')
+            return None
+        finally:
+            conn.close()
+        
+        self.journal.applied(last_seq)
+        metrics.inc('journal_punches_applied', len(events))
+        return len(events)
+    
+    @timed('db.mark_attendance')
+    def mark_attendance(self, employee_id, action):
+        """
+        Mark punch-in or punch-out
+        With the journal, the punch is acknowledged once journaled; it is applied
+        to the database now or, if the database is locked, by a later replay
+        """
+        conn = sqlite3.connect(self.db_path, timeout=self.lookup_timeout())
+        cursor = conn.cursor()
+        
+        # Get user_id (the journal accepts the punch if the database is locked)
+        try:
+            cursor.execute('SELECT user_id FROM users WHERE employee_id = ?', (employee_id,))
+            user = cursor.fetchone()
+        except sqlite3.OperationalError:
+            if self.journal is None:
+                conn.close()
+                raise
+            user = (None,)
         
         if not user:
             conn.close()
@@ -97,25 +628,37 @@ class AttendanceManager:
         user_id = user[0]
         
         # Check for recent entries (prevent duplicates)
+        now = int(time.time())
         last_record = self.get_last_attendance(employee_id)
         if last_record:
-            last_time = datetime.strptime(last_record[1], '%Y-%m-%d %H:%M:%S')
-            current_time = datetime.now(self.timezone).replace(tzinfo=None)
-            time_diff = (current_time - last_time).total_seconds()
+            time_diff = now - last_record[1]
             
-            if time_diff < config.MIN_TIME_BETWEEN_PUNCHES:
+            min_interval = self.settings.min_time_between_punches
+            if time_diff < min_interval:
                 conn.close()
-                return False, f"Please wait {int(config.MIN_TIME_BETWEEN_PUNCHES - time_diff)} seconds"
+                metrics.inc('punches_rejected')
+                return False, f"Please wait {int(min_interval - time_diff)} seconds"
         
-        # Insert attendance record with IST time
-        current_time = self.get_current_time()
-        cursor.execute('''
-            INSERT INTO attendance (user_id, employee_id, action, timestamp)
+        if self.journal is not None:
+            conn.close()
+            self.journal.append(employee_id, action, now)
+            if self.replay_journal(timeout=config.JOURNAL_APPLY_TIMEOUT) is None:
+                metrics.inc('punches_journaled_only')
+            metrics.inc('punches_recorded')
+            return True, f"{action.capitalize()} recorded successfully"
+        
+        # Insert attendance record (current month partition only)
+        month = self.month_of(now)
+        self.ensure_partition(cursor, month)
+        cursor.execute(f'''
+            INSERT INTO {partition_table(month)} (user_id, employee_id, action, punched_at)
             VALUES (?, ?, ?, ?)
-        ''', (user_id, employee_id, action, current_time))
+        ''', (user_id, employee_id, action, now))
         
+        self.bump_data_version(cursor)
         conn.commit()
         conn.close()
+        metrics.inc('punches_recorded')
         return True, f"{action.capitalize()} recorded successfully"
     
     def get_user_by_employee_id(self, employee_id):
@@ -128,22 +671,90 @@ class AttendanceManager:
         conn.close()
         return user
     
+    def get_user_partitions(self):
+        """Site and department of every user: {employee_id: (site, department)}"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        cursor.execute('SELECT employee_id, site, department FROM users')
+        partitions = {employee_id: (site, department) for employee_id, site, department in cursor.fetchall()}
+        conn.close()
+        return partitions
+    
+    @timed('db.get_today_attendance')
     def get_today_attendance(self):
         """Get all attendance records for today (IST)"""
-        conn = sqlite3.connect(self.db_path)
+        today = datetime.now(self.timezone).date()
+        return self.get_attendance_range(today, today)
+    
+    @timed('db.get_attendance_range')
+    @cached_query
+    def get_attendance_range(self, start_date, end_date):
+        """
+        Get attendance records between two dates (inclusive, IST)
+        Only the partitions overlapping the range are read; archived months are
+        attached read-only, ATTENDANCE_ARCHIVE_ATTACH_BATCH at a time (SQLite
+        attaches at most 10 databases to a connection)
+        Returns: DataFrame with name, employee_id, action, punched_at and a
+        timezone-aware local timestamp
+        """
+        import pandas as pd
         
-        # Get today's date in IST
-        today_date = datetime.now(self.timezone).strftime('%Y-%m-%d')
+        start = self.date_to_epoch(start_date)
+        end = self.date_to_epoch(end_date + timedelta(days=1))
+        wanted = set(month_range(start_date.strftime('%Y-%m'), end_date.strftime('%Y-%m')))
         
-        query = f'''
-            SELECT u.name, u.employee_id, a.action, a.timestamp
-            FROM attendance a
-            JOIN users u ON a.user_id = u.user_id
-            WHERE DATE(a.timestamp) = DATE('{today_date}')
-            ORDER BY a.timestamp DESC
-        '''
-        df = pd.read_sql_query(query, conn)
+        conn = sqlite3.connect(self.db_path, uri=True)
+        cursor = conn.cursor()
+        
+        hot, archived = [], []
+        for month, state, path in self.get_partitions(cursor):
+            if month in wanted:
+                (archived if state == 'archived' else hot).append((month, path))
+        
+        def select(table):
+            return f'''
+                SELECT u.name, u.employee_id, a.action, a.punched_at
+                FROM {table} a
+                JOIN users u ON a.user_id = u.user_id
+                WHERE a.punched_at >= ? AND a.punched_at < ?
+            '''
+        
+        def read(tables):
+            query = ' UNION ALL '.join(select(table) for table in tables)
+            return pd.read_sql_query(query, conn, params=[start, end] * len(tables))
+        
+        frames = []
+        if hot:
+            frames.append(read([partition_table(month) for month, _ in hot]))
+        
+        used_archives = set()
+        batch_size = config.ATTENDANCE_ARCHIVE_ATTACH_BATCH
+        for offset in range(0, len(archived), batch_size):
+            schemas = []
+            for month, path in archived[offset:offset + batch_size]:
+                database_path = self.open_archive(path)
+                used_archives.add(database_path)
+                schema = f"archive_{month.replace('-', '_')}"
+                cursor.execute(f"ATTACH DATABASE ? AS {schema}", (f"file:{database_path}?mode=ro",))
+                schemas.append((schema, month))
+            
+            try:
+                frames.append(read([f"{schema}.{partition_table(month)}" for schema, month in schemas]))
+            finally:
+                for schema, _ in schemas:
+                    cursor.execute(f"DETACH DATABASE {schema}")
         conn.close()
+        self.prune_archive_cache(keep=used_archives)
+        
+        if frames:
+            df = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+            df = df.sort_values('punched_at', ascending=False, kind='stable', ignore_index=True)
+        else:
+            df = pd.DataFrame({'name': [], 'employee_id': [], 'action': [], 'punched_at': pd.Series([], dtype='int64')})
+        
+        # Display-time conversion, vectorised (no string parsing)
+        df['timestamp'] = pd.to_datetime(df['punched_at'], unit='s', utc=True).dt.tz_convert(self.timezone)
         return df
     
     def delete_user(self, employee_id):
@@ -162,12 +773,15 @@ class AttendanceManager:
             
             user_id, name = user
             
-            # Delete attendance records
-            cursor.execute('DELETE FROM attendance WHERE user_id = ?', (user_id,))
+            # Delete attendance records (hot partitions; archived months are read-only)
+            for month, state, _ in self.get_partitions(cursor):
+                if state == 'hot':
+                    cursor.execute(f'DELETE FROM {partition_table(month)} WHERE user_id = ?', (user_id,))
             
             # Delete user
             cursor.execute('DELETE FROM users WHERE user_id = ?', (user_id,))
             
+            self.bump_data_version(cursor)
             conn.commit()
             conn.close()
             
@@ -176,11 +790,15 @@ class AttendanceManager:
             conn.close()
             return False, f"Error deleting user: {str(e)}"
     
+    @timed('db.get_all_users')
+    @cached_query
     def get_all_users(self):
         """Get all registered users"""
+        import pandas as pd
+        
         conn = sqlite3.connect(self.db_path)
         query = '''
-            SELECT user_id, name, employee_id, email, department, registered_date
+            SELECT user_id, name, employee_id, email, department, site, registered_date
             FROM users
             ORDER BY name
         '''
@@ -188,20 +806,148 @@ class AttendanceManager:
         conn.close()
         return df
     
+    @timed('db.get_user_last_attendance')
     def get_user_last_attendance(self, employee_id):
-        """Get detailed last attendance for a user"""
+        """
+        Get detailed last attendance for a user
+        Returns: (name, action, punched_at epoch seconds) or None
+        """
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
-        cursor.execute('''
-            SELECT u.name, a.action, a.timestamp
-            FROM attendance a
-            JOIN users u ON a.user_id = u.user_id
-            WHERE a.employee_id = ?
-            ORDER BY a.timestamp DESC
-            LIMIT 1
-        ''', (employee_id,))
-        
-        result = cursor.fetchone()
+        result = self.find_last_record(cursor, employee_id, 'u.name, a.action, a.punched_at')
+        conn.close()
+        return result
+    
+    def archive_month(self, month):
+        """
+        Move a closed month to a compressed read-only file in the archive directory
+        Returns: path of the archive
+        """
+        if month >= self.month_of(time.time()):
+            raise ValueError(f"{month} is not closed yet")
+        
+        os.makedirs(self.archive_dir, exist_ok=True)
+        table = partition_table(month)
+        database_path = os.path.join(self.archive_dir, f"{table}.db")
+        archive_path = database_path + '.gz'
+        
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute('SELECT state FROM attendance_partitions WHERE month = ?', (month,))
+            row = cursor.fetchone()
+            if row is None or row[0] != 'hot':
+                raise ValueError(f"No hot partition for {month}")
+            
+            if os.path.exists(database_path):
+                os.remove(database_path)
+            
+            cursor.execute("ATTACH DATABASE ? AS archive", (database_path,))
+            self.create_partition_table(cursor, table, 'archive.')
+            cursor.execute(f'INSERT INTO archive.{table} SELECT * FROM {table}')
+            conn.commit()
+            cursor.execute('DETACH DATABASE archive')
+            
+            # Compressed and read-only before the hot copy is dropped
+            self.write_archive(database_path, archive_path)
+            
+            cursor.execute(f'DROP TABLE {table}')
+            cursor.execute(
+                "UPDATE attendance_partitions SET state = 'archived', path = ? WHERE month = ?",
+                (archive_path, month)
+            )
+            self.rebuild_view(cursor)
+            self.bump_data_version(cursor)
+            conn.commit()
+        finally:
+            conn.close()
+        
+        self._hot_months.discard(month)
+        return archive_path
+    
+    def archive_closed_months(self, keep_months=None):
+        """
+        Archive hot months older than the newest `keep_months` (ATTENDANCE_HOT_MONTHS)
+        The current month always stays hot, so 0 archives every closed month
+        Returns: list of archived months
+        """
+        keep_months = config.ATTENDANCE_HOT_MONTHS if keep_months is None else keep_months
+        if keep_months < 0:
+            raise ValueError("keep_months can't be negative")
+        keep_months = max(keep_months, 1)
+        
+        conn = sqlite3.connect(self.db_path)
+        hot = [month for month, state, _ in self.get_partitions(conn.cursor()) if state == 'hot']
         conn.close()
-        return result
\ No newline at end of file
+        
+        current = self.month_of(time.time())
+        year, month = int(current[:4]), int(current[5:7]) - (keep_months - 1)
+        while month < 1:
+            year, month = year - 1, month + 12
+        cutoff = f"{year:04d}-{month:02d}"
+        
+        archived = []
+        for month in sorted(hot):
+            if month < cutoff:
+                self.archive_month(month)
+                archived.append(month)
+        return archived
+    
+    def write_archive(self, database_path, archive_path):
+        """Compact a month database and publish it as a compressed read-only archive"""
+        archive_conn = sqlite3.connect(database_path)
+        archive_conn.execute('VACUUM')
+        archive_conn.close()
+        
+        temp_path = archive_path + '.tmp'
+        with open(database_path, 'rb') as source, gzip.open(temp_path, 'wb') as target:
+            shutil.copyfileobj(source, target)
+        os.chmod(temp_path, 0o444)
+        os.replace(temp_path, archive_path)
+        os.remove(database_path)
+    
+    def open_archive(self, archive_path):
+        """
+        Decompressed copy of an archived month (cached next to the archives)
+        The copy's mtime is refreshed on every use, so prune_archive_cache drops
+        the least recently read months
+        """
+        cache_dir = os.path.join(self.archive_dir, 'cache')
+        database_path = os.path.join(cache_dir, os.path.basename(archive_path)[:-len('.gz')])
+        
+        if not os.path.exists(database_path) or os.path.getmtime(database_path) < os.path.getmtime(archive_path):
+            os.makedirs(cache_dir, exist_ok=True)
+            temp_path = database_path + '.tmp'
+            with gzip.open(archive_path, 'rb') as source, open(temp_path, 'wb') as target:
+                shutil.copyfileobj(source, target)
+            os.chmod(temp_path, 0o444)
+            os.replace(temp_path, database_path)
+        else:
+            os.utime(database_path)
+        
+        return database_path
+    
+    def prune_archive_cache(self, keep=()):
+        """
+        Delete the least recently read decompressed months beyond ATTENDANCE_ARCHIVE_CACHE_MONTHS
+        keep: paths that must stay (e.g. the ones the current query used)
+        """
+        cache_dir = os.path.join(self.archive_dir, 'cache')
+        if not os.path.isdir(cache_dir):
+            return
+        
+        cached = sorted(
+            (os.path.join(cache_dir, file_name) for file_name in os.listdir(cache_dir) if file_name.endswith('.db')),
+            key=os.path.getmtime, reverse=True
+        )
+        
+        for path in cached[config.ATTENDANCE_ARCHIVE_CACHE_MONTHS:]:
+            if path in keep:
+                continue
+            try:
+                os.remove(path)
+                metrics.inc('archive_cache_evictions')
+            except OSError:
+                pass  # Still open elsewhere (Windows) - dropped on a later prune
@@ -0,0 +1,49 @@
+"""
+Benchmark detect_faces over the whole frame vs a cropped ROI with a minimum face size
+
+Pass --image to time a real camera frame instead of a synthetic one.
+"""
+import argparse
+
+import cv2
+
+from common import time_call, synthetic_frame, print_table
+
+from face_detector import FaceDetector
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--image', help="BGR image to run detection on")
+    parser.add_argument('--roi', type=int, nargs=4, default=[160, 60, 480, 420],
+                        metavar=('LEFT', 'TOP', 'RIGHT', 'BOTTOM'))
+    parser.add_argument('--min-face-size', type=int, nargs='+', default=[0, 80, 120, 160])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    
+    frame = cv2.imread(args.image) if args.image else synthetic_frame()
+    
+    rows = []
+    for roi in [None, tuple(args.roi)]:
+        for min_face_size in args.min_face_size:
+            detector = FaceDetector()
+            settings = {'min_face_size': min_face_size}
+            if roi is not None:
+                settings['roi'] = roi
+            detector.configure_region(settings)
+            
+            timing = time_call(lambda: detector.detect_faces(frame), repeat=args.repeat)
+            rows.append({
+                'roi': 'full frame' if roi is None else 'x'.join(map(str, roi)),
+                'min_face': min_face_size,
+                'scale': round(detector.detection_scale, 2),
+                'upsample': detector.region_upsample_times,
+                'faces': len(detector.detect_faces(frame)),
+                'median_ms': timing['median_ms'],
+            })
+    
+    print_table(rows, ['roi', 'min_face', 'scale', 'upsample', 'faces', 'median_ms'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Compare saving full enrollment frames inline with the background face image store
+
+Reports the time the registration call spends on the image and the bytes kept
+per capture: cv2.imwrite of the whole frame vs an aligned crop plus thumbnail
+queued to the writer thread.
+"""
+import argparse
+import os
+import tempfile
+
+import cv2
+
+from common import time_call, synthetic_frame, print_table
+
+import config
+from face_store import FaceImageStore
+
+
+def directory_bytes(path):
+    return sum(
+        os.path.getsize(os.path.join(root, file_name))
+        for root, _, file_names in os.walk(path) for file_name in file_names
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', nargs='+', default=['640x480', '1280x720'])
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    rows = []
+
+    for size in args.sizes:
+        width, height = (int(value) for value in size.split('x'))
+        frames = [synthetic_frame(width, height, seed=seed) for seed in range(args.repeat + 3)]
+        face_location = (height // 4, width * 5 // 8, height * 3 // 4, width * 3 // 8)
+
+        with tempfile.TemporaryDirectory() as work_dir:
+            full_dir = os.path.join(work_dir, 'full')
+            os.makedirs(full_dir)
+            counter = iter(range(10 ** 9))
+
+            def imwrite_frame():
+                index = next(counter)
+                cv2.imwrite(os.path.join(full_dir, f"{index}.jpg"), frames[index % len(frames)])
+
+            timing = time_call(imwrite_frame, repeat=args.repeat)
+            captures = len(os.listdir(full_dir))
+            rows.append({
+                'frame': size,
+                'storage': 'full frame, inline imwrite',
+                'call_ms': timing['median_ms'],
+                'kb_per_capture': round(directory_bytes(full_dir) / captures / 1024, 1),
+            })
+
+            store = FaceImageStore(base_dir=os.path.join(work_dir, 'store'))
+            counter = iter(range(10 ** 9))
+
+            def store_crop():
+                index = next(counter)
+                store.save(f"EMP{index:06d}", frames[index % len(frames)], face_location)
+
+            timing = time_call(store_crop, repeat=args.repeat)
+            store.flush()
+            rows.append({
+                'frame': size,
+                'storage': f'{config.FACE_CROP_SIZE}px crop + thumbnail, queued',
+                'call_ms': timing['median_ms'],
+                'kb_per_capture': round(directory_bytes(store.base_dir) / (args.repeat + 3) / 1024, 1),
+            })
+
+    print_table(rows, ['frame', 'storage', 'call_ms', 'kb_per_capture'])
+
+
+if __name__ == '__main__':
+    main()
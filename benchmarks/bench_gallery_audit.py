@@ -0,0 +1,58 @@
+"""
+Time the blockwise gallery audit on synthetic galleries with planted duplicates
+
+Reports wall time, templates/sec and whether every planted duplicate was found.
+Timings for larger galleries grow with the square of the size.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from common import print_table
+
+from gallery_audit import audit_gallery
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 30000])
+    parser.add_argument('--duplicates', type=int, default=20, help="Planted duplicate enrollments")
+    parser.add_argument('--workers', type=int)
+    args = parser.parse_args()
+    
+    rng = np.random.default_rng(0)
+    rows = []
+    
+    for size in args.sizes:
+        encodings = rng.normal(0, 0.09, (size, 128)).astype(np.float32)
+        employee_ids = [f"EMP{i:06d}" for i in range(size)]
+        
+        # Same person registered twice under a new id
+        sources = rng.choice(size - args.duplicates, args.duplicates, replace=False)
+        for offset, source in enumerate(sources):
+            encodings[size - args.duplicates + offset] = encodings[source] + rng.normal(0, 0.01, 128)
+        
+        start = time.perf_counter()
+        neighbours, duplicates = audit_gallery(encodings, employee_ids, workers=args.workers)
+        elapsed = time.perf_counter() - start
+        
+        found = {frozenset(pair[:2]) for pair in duplicates}
+        planted = {
+            frozenset((employee_ids[source], employee_ids[size - args.duplicates + offset]))
+            for offset, source in enumerate(sources)
+        }
+        
+        rows.append({
+            'templates': size,
+            'seconds': round(elapsed, 2),
+            'templates_per_sec': round(size / elapsed),
+            'duplicates_found': f"{len(planted & found)}/{len(planted)}",
+            'false_duplicates': len(found - planted),
+        })
+    
+    print_table(rows, ['templates', 'seconds', 'templates_per_sec', 'duplicates_found', 'false_duplicates'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Compare employee deletion and re-enrollment: parallel lists (list.index + del)
+against the gallery's id-to-rows map with tombstones and background compaction
+"""
+import argparse
+import time
+
+import numpy as np
+
+from common import print_table
+
+from face_gallery import FaceGallery
+
+
+def legacy_delete(encodings, names, employee_ids, employee_id):
+    """Previous behaviour: O(n) search, O(n) shifts, first template only"""
+    index = employee_ids.index(employee_id)
+    del encodings[index]
+    del names[index]
+    del employee_ids[index]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--templates', type=int, default=3, help="Templates per employee")
+    parser.add_argument('--deletes', type=int, default=500)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    rows = []
+
+    for size in args.sizes:
+        encodings = rng.normal(0, 0.09, (size, 128)).astype(np.float32)
+        employee_ids = [f"EMP{i // args.templates:06d}" for i in range(size)]
+        victims = list(dict.fromkeys(rng.choice(employee_ids, args.deletes * 2)))[:args.deletes]
+
+        legacy = (list(encodings), list(employee_ids), list(employee_ids))
+        start = time.perf_counter()
+        for employee_id in victims:
+            legacy_delete(*legacy, employee_id)
+        legacy_ms = (time.perf_counter() - start) * 1000 / len(victims)
+
+        gallery = FaceGallery()
+        gallery.load(encodings, employee_ids, employee_ids)
+        start = time.perf_counter()
+        for employee_id in victims:
+            gallery.remove_employee(employee_id)
+        gallery_ms = (time.perf_counter() - start) * 1000 / len(victims)
+
+        start = time.perf_counter()
+        for employee_id in victims:
+            gallery.add(encodings[0], employee_id, employee_id)
+        enroll_ms = (time.perf_counter() - start) * 1000 / len(victims)
+
+        compaction_start = time.perf_counter()
+        compacted = gallery.compact()
+        compaction_ms = (time.perf_counter() - compaction_start) * 1000
+
+        rows.append({
+            'rows': size,
+            'legacy_delete_ms': round(legacy_ms, 4),
+            'tombstone_delete_ms': round(gallery_ms, 4),
+            're_enroll_ms': round(enroll_ms, 4),
+            'compaction_ms': round(compaction_ms, 2) if compacted else '-',
+            'live_rows': len(gallery),
+        })
+
+    print_table(rows, ['rows', 'legacy_delete_ms', 'tombstone_delete_ms', 're_enroll_ms', 'compaction_ms', 'live_rows'])
+
+
+if __name__ == '__main__':
+    main()
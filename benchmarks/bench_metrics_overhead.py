@@ -0,0 +1,58 @@
+"""
+Measure the per-call overhead of the instrumentation layer
+
+Times a trivial function bare, wrapped with metrics disabled, and wrapped with
+metrics enabled, then relates the overhead to a real stage (match_encoding).
+"""
+import argparse
+import time
+
+import numpy as np
+
+from common import print_table
+
+from metrics import MetricsRegistry
+
+
+def per_call_ns(func, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        func()
+    return (time.perf_counter() - start) / calls * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--calls', type=int, default=200000)
+    args = parser.parse_args()
+    
+    registry = MetricsRegistry()
+    
+    def noop():
+        return None
+    
+    wrapped = registry.timed('bench.noop')(noop)
+    
+    bare = per_call_ns(noop, args.calls)
+    registry.enabled = False
+    disabled = per_call_ns(wrapped, args.calls)
+    registry.enabled = True
+    enabled = per_call_ns(wrapped, args.calls)
+    
+    # A 1000-encoding match is one of the cheapest instrumented stages
+    gallery = np.random.default_rng(0).normal(0, 0.09, (1000, 128))
+    probe = gallery[0]
+    stage = per_call_ns(lambda: np.linalg.norm(gallery - probe, axis=1).argmin(), 2000)
+    
+    rows = [
+        {'mode': 'bare call', 'ns_per_call': round(bare), 'overhead_ns': 0},
+        {'mode': 'disabled', 'ns_per_call': round(disabled), 'overhead_ns': round(disabled - bare)},
+        {'mode': 'enabled', 'ns_per_call': round(enabled), 'overhead_ns': round(enabled - bare)},
+    ]
+    print_table(rows, ['mode', 'ns_per_call', 'overhead_ns'])
+    print(f"\nEnabled overhead vs a 1000-encoding match ({stage / 1000:.0f} us): "
+          f"{100 * (enabled - bare) / stage:.3f}%")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+Compare global gallery search with site-partitioned search
+
+A kiosk at one site searches its own partitions first and falls back to the
+whole gallery only when nothing is within tolerance. Reports match latency for
+local hits, fallbacks (employee from another site) and the unpartitioned search.
+"""
+import argparse
+
+import numpy as np
+
+from common import time_call, print_table
+
+import config
+from face_gallery import FaceGallery, PartitionedGallery
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--employees', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--sites', type=int, default=10)
+    parser.add_argument('--departments', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    tolerance = config.FACE_RECOGNITION_TOLERANCE
+    rows = []
+
+    for size in args.employees:
+        encodings = rng.normal(0, 0.09, (size, 128)).astype(np.float32)
+        employee_ids = [f"EMP{i:06d}" for i in range(size)]
+        sites = [f"site{i % args.sites}" for i in range(size)]
+        departments = [f"dept{(i // args.sites) % args.departments}" for i in range(size)]
+
+        local_probe = encodings[0] + rng.normal(0, 0.02, 128)  # site0 employee
+        remote_probe = encodings[1] + rng.normal(0, 0.02, 128)  # site1 employee
+
+        flat = FaceGallery()
+        flat.load(encodings, employee_ids, employee_ids)
+
+        partitioned = PartitionedGallery(sites=['site0'])
+        partitioned.load(encodings, employee_ids, employee_ids, sites, departments)
+
+        for label, call in [
+            ('global', lambda: flat.match_identity(local_probe)),
+            ('partitioned, local hit', lambda: partitioned.match_identity(local_probe, tolerance)),
+            ('partitioned, fallback', lambda: partitioned.match_identity(remote_probe, tolerance)),
+        ]:
+            timing = time_call(call, repeat=args.repeat)
+            rows.append({
+                'employees': size,
+                'search': label,
+                'partitions': len(partitioned.partitions) if label != 'global' else 1,
+                'median_ms': timing['median_ms'],
+                'p95_ms': timing['p95_ms'],
+            })
+
+        assert partitioned.match_identity(local_probe, tolerance)[0] == employee_ids[0]
+        assert partitioned.match_identity(remote_probe, tolerance)[0] == employee_ids[1]
+
+    print_table(rows, ['employees', 'search', 'partitions', 'median_ms', 'p95_ms'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+"""
+Benchmark lighting preprocessing: legacy full-frame CLAHE vs adaptive ROI-only CLAHE
+
+Timings run on synthetic dim / normal / bright frames. Pass --dataset to also
+compare recognition rates on local images laid out as <dataset>/<employee_id>/<image>;
+the first image of each employee is enrolled and the rest are used as probes.
+"""
+import argparse
+
+import cv2
+import numpy as np
+
+from common import time_call, synthetic_frame, list_labelled_images, print_table
+
+import config
+import face_recognition
+from face_detector import FaceDetector
+
+
+def legacy_preprocess(frame):
+    """Full-frame LAB/CLAHE pass as it ran before adaptive preprocessing"""
+    lab = cv2.cvtColor(frame, cv2.COLOR_BGR2LAB)
+    l, a, b = cv2.split(lab)
+    clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8, 8))
+    l = clahe.apply(l)
+    lab = cv2.merge([l, a, b])
+    return cv2.cvtColor(lab, cv2.COLOR_LAB2BGR)
+
+
+def lighting_class(detector, frame):
+    """Label a frame as dim, bright, flat or normal"""
+    mean_luminance, contrast = detector.estimate_lighting(frame)
+    if mean_luminance < config.LIGHTING_MIN_LUMINANCE:
+        return 'dim'
+    if mean_luminance > config.LIGHTING_MAX_LUMINANCE:
+        return 'bright'
+    if contrast < config.LIGHTING_MIN_CONTRAST:
+        return 'flat'
+    return 'normal'
+
+
+def run_timings(detector, repeat):
+    # A centred face-sized box stands in for a detection result
+    face_locations = [(150, 400, 330, 240)]
+    rows = []
+    
+    for label, brightness, contrast in [('dim', 35, 15), ('normal', 110, 90), ('bright', 225, 15)]:
+        frame = synthetic_frame(brightness=brightness, contrast=contrast)
+        
+        legacy = time_call(lambda: legacy_preprocess(frame), repeat=repeat)
+        adaptive = time_call(lambda: detector.preprocess_frame(frame, face_locations), repeat=repeat)
+        
+        rows.append({
+            'scene': label,
+            'class': lighting_class(detector, frame),
+            'legacy_ms': legacy['median_ms'],
+            'adaptive_ms': adaptive['median_ms'],
+            'speedup': round(legacy['median_ms'] / max(adaptive['median_ms'], 1e-6), 1),
+        })
+    
+    print_table(rows, ['scene', 'class', 'legacy_ms', 'adaptive_ms', 'speedup'])
+
+
+def encode(detector, frame, mode):
+    """Detect and encode the largest face using the given preprocessing mode"""
+    if mode == 'legacy':
+        frame = legacy_preprocess(frame)
+        face_locations = detector.detect_faces(frame)
+    else:
+        face_locations = detector.detect_faces(frame)
+        frame = detector.preprocess_frame(frame, face_locations)
+    
+    if len(face_locations) == 0:
+        return None
+    
+    largest = max(face_locations, key=lambda loc: (loc[2] - loc[0]) * (loc[1] - loc[3]))
+    encodings = detector.get_face_encodings(frame, [largest])
+    return encodings[0] if encodings else None
+
+
+def run_recognition(detector, dataset_dir):
+    images = list_labelled_images(dataset_dir)
+    
+    for mode in ['legacy', 'adaptive']:
+        gallery_encodings, gallery_labels = [], []
+        probes = []
+        seen = set()
+        
+        for label, path in images:
+            frame = cv2.imread(path)
+            if frame is None:
+                continue
+            
+            if label not in seen:
+                encoding = encode(detector, frame, mode)
+                if encoding is not None:
+                    gallery_encodings.append(encoding)
+                    gallery_labels.append(label)
+                    seen.add(label)
+                continue
+            
+            probes.append((label, lighting_class(detector, frame), encode(detector, frame, mode)))
+        
+        stats = {}
+        for label, scene, encoding in probes:
+            entry = stats.setdefault(scene, {'probes': 0, 'detected': 0, 'correct': 0})
+            entry['probes'] += 1
+            
+            if encoding is None:
+                continue
+            entry['detected'] += 1
+            
+            if gallery_encodings:
+                distances = face_recognition.face_distance(gallery_encodings, encoding)
+                best = int(np.argmin(distances))
+                if distances[best] <= config.FACE_RECOGNITION_TOLERANCE and gallery_labels[best] == label:
+                    entry['correct'] += 1
+        
+        rows = [
+            {
+                'scene': scene,
+                'probes': entry['probes'],
+                'detected': entry['detected'],
+                'recognition_rate': f"{100 * entry['correct'] / entry['probes']:.1f}%",
+            }
+            for scene, entry in sorted(stats.items())
+        ]
+        
+        print(f"\n[{mode}] {len(gallery_labels)} enrolled, {len(probes)} probes")
+        print_table(rows, ['scene', 'probes', 'detected', 'recognition_rate'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=200, help="Timing iterations per scene")
+    parser.add_argument('--dataset', help="Directory of labelled dim/bright face images")
+    args = parser.parse_args()
+    
+    detector = FaceDetector()
+    
+    print("Preprocessing time per 640x480 frame (median)")
+    run_timings(detector, args.repeat)
+    
+    if args.dataset:
+        run_recognition(detector, args.dataset)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""
+Compare the full-size per-frame camera preview with the capped, downscaled one
+
+The old loop converted every frame BGR->RGB and handed the array to Streamlit,
+which re-encodes it with PIL. The preview renderer draws, resizes and encodes a
+JPEG only for the frames it sends (at most PREVIEW_MAX_FPS per second). Reports
+the cost per sent frame, the bytes shipped to the browser and the CPU time per
+second of video at --camera-fps.
+
+With --loop-seconds it also runs the Mark Attendance loop against a simulated
+camera (frames every 1/--camera-fps s, --process-ms of recognition per frame)
+and measures the frames processed and previewed per second, with and without
+the fixed 0.1 s sleep the loop used to end with.
+"""
+import argparse
+import io
+import time
+
+import cv2
+from PIL import Image
+
+from common import time_call, synthetic_frame, print_table
+
+import config
+from face_detector import FaceDetector
+from preview import PreviewRenderer, encode_preview
+
+
+class NullPlaceholder:
+    def image(self, *args, **kwargs):
+        pass
+
+
+def run_loop(frame, seconds, camera_fps, process_seconds, fixed_sleep, boxes, draw):
+    """
+    Camera loop with a simulated camera and recognition stage
+    Returns: (frames processed per second, preview frames per second)
+    """
+    preview = PreviewRenderer(NullPlaceholder())
+    frame_interval = 1.0 / camera_fps
+    processed = rendered = 0
+    start = next_frame = time.perf_counter()
+
+    while time.perf_counter() - start < seconds:
+        # cap.read() blocks until the camera delivers the next frame
+        next_frame = max(next_frame + frame_interval, time.perf_counter())
+        time.sleep(max(0.0, next_frame - time.perf_counter()))
+
+        time.sleep(process_seconds)  # Detection, encoding and matching
+        processed += 1
+        if preview.render(frame, boxes, draw):
+            rendered += 1
+
+        if fixed_sleep:
+            time.sleep(fixed_sleep)
+
+    elapsed = time.perf_counter() - start
+    return processed / elapsed, rendered / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', nargs='+', default=['640x480', '1280x720', '1920x1080'])
+    parser.add_argument('--camera-fps', type=float, default=30)
+    parser.add_argument('--legacy-format', choices=['PNG', 'JPEG'], default='PNG',
+                        help="Format PIL re-encodes the full-size array in")
+    parser.add_argument('--repeat', type=int, default=30)
+    parser.add_argument('--loop-seconds', type=float, default=0,
+                        help="Also measure the camera loop for this long per variant")
+    parser.add_argument('--process-ms', type=float, default=40, help="Simulated recognition time per frame")
+    args = parser.parse_args()
+
+    detector = FaceDetector()
+    rows = []
+
+    for size in args.sizes:
+        width, height = (int(value) for value in size.split('x'))
+        frame = synthetic_frame(width, height)
+        face_location = (height // 4, width * 2 // 3, height * 3 // 4, width // 3)
+
+        def legacy():
+            display_frame = detector.draw_face_box(frame.copy(), face_location, "EMP000001")
+            rgb = cv2.cvtColor(display_frame, cv2.COLOR_BGR2RGB)
+            buffer = io.BytesIO()
+            Image.fromarray(rgb).save(buffer, format=args.legacy_format)
+            return buffer.getvalue()
+
+        def capped():
+            return encode_preview(frame, boxes=[(face_location, "EMP000001", (0, 255, 0))],
+                                  draw=detector.draw_face_box)
+
+        for label, render, sent_fps in [
+            ('full size, every frame', legacy, args.camera_fps),
+            (f'{config.PREVIEW_MAX_WIDTH}px JPEG, {config.PREVIEW_MAX_FPS} fps',
+             capped, min(args.camera_fps, config.PREVIEW_MAX_FPS or args.camera_fps)),
+        ]:
+            timing = time_call(render, repeat=args.repeat)
+            rows.append({
+                'frame': size,
+                'preview': label,
+                'ms_per_sent_frame': timing['median_ms'],
+                'kb_per_sent_frame': round(len(render()) / 1024, 1),
+                'cpu_ms_per_s': round(timing['median_ms'] * sent_fps, 1),
+            })
+
+    print_table(rows, ['frame', 'preview', 'ms_per_sent_frame', 'kb_per_sent_frame', 'cpu_ms_per_s'])
+
+    if args.loop_seconds:
+        width, height = (int(value) for value in args.sizes[0].split('x'))
+        frame = synthetic_frame(width, height)
+        boxes = [((height // 4, width * 2 // 3, height * 3 // 4, width // 3), "EMP000001", (0, 255, 0))]
+        loop_rows = []
+
+        for label, fixed_sleep in [('fixed 0.1 s sleep', 0.1), ('no sleep', 0.0)]:
+            processed_fps, preview_fps = run_loop(
+                frame, args.loop_seconds, args.camera_fps, args.process_ms / 1000.0,
+                fixed_sleep, boxes, detector.draw_face_box
+            )
+            loop_rows.append({
+                'loop': label,
+                'processed_fps': round(processed_fps, 1),
+                'preview_fps': round(preview_fps, 1),
+            })
+
+        print(f"\n{args.sizes[0]} camera at {args.camera_fps} fps, {args.process_ms} ms recognition per frame, "
+              f"PREVIEW_MAX_FPS={config.PREVIEW_MAX_FPS}")
+        print_table(loop_rows, ['loop', 'processed_fps', 'preview_fps'])
+
+
+if __name__ == '__main__':
+    main()
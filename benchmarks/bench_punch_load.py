@@ -0,0 +1,259 @@
+"""
+Load test of one attendance database shared by many kiosks
+
+Simulates a working day compressed into --duration seconds against a temporary
+database: every kiosk registers its share of the employees with register_user,
+then replays its punches through FaceRecognizer.mark_attendance at their
+scheduled times (a burst around WORK_START_TIME, optional lunch punches and the
+evening punch-out), while --readers dashboard threads poll the report queries.
+
+    python benchmarks/bench_punch_load.py --kiosks 16 --employees 5000
+    python benchmarks/bench_punch_load.py --kiosks 32 --mode process --duration 120
+    python benchmarks/bench_punch_load.py --no-journal   # direct SQLite writes
+
+Reports throughput, p50/p95/p99 latency and error counts per operation, and how
+late punches started compared to their schedule (lag grows once the database
+can't keep up). Recognition itself is not simulated.
+"""
+import argparse
+import collections
+import os
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+from common import print_table
+
+import config
+from attendance_manager import AttendanceManager
+from face_detector import FaceDetector
+from face_recognizer import FaceRecognizer
+
+
+def seconds_of_day(clock):
+    """'09:00:00' -> seconds after midnight"""
+    hours, minutes, seconds = (int(part) for part in clock.split(':'))
+    return hours * 3600 + minutes * 60 + seconds
+
+
+def build_schedule(employees, lunch_fraction, seed=0):
+    """
+    Simulated punch times (seconds of day) for every employee
+    Returns: (list of (seconds, employee_index) sorted by time, window start, window end)
+    """
+    rng = random.Random(seed)
+    work_start = seconds_of_day(config.WORK_START_TIME)
+    work_end = seconds_of_day(config.WORK_END_TIME)
+    window_start, window_end = work_start - 3600, work_end + 3600
+
+    punches = []
+    for employee in range(employees):
+        # Most people arrive in the last 20 minutes before the start time
+        arrival = work_start + rng.gauss(-600, 720)
+        departure = work_end + rng.gauss(600, 1200)
+        times = [arrival, departure]
+
+        if rng.random() < lunch_fraction:
+            lunch_out = (work_start + work_end) / 2 + rng.gauss(0, 900)
+            times += [lunch_out, lunch_out + rng.uniform(1200, 3600)]
+
+        for punch_time in times:
+            punches.append((min(max(punch_time, window_start), window_end), employee))
+
+    punches.sort()
+    return punches, window_start, window_end
+
+
+def kiosk_manager(kiosk, db_path, work_dir):
+    """Each kiosk owns its database connection settings and punch journal"""
+    return AttendanceManager(
+        db_path=db_path,
+        journal_path=os.path.join(work_dir, f"journal_kiosk{kiosk}.bin"),
+        kiosk_id=f"kiosk{kiosk}",
+    )
+
+
+def call(samples, op, func, *args, lag_ms=0.0):
+    """Run one operation and record (op, latency_ms, outcome, detail, lag_ms)"""
+    start = time.perf_counter()
+    try:
+        result = func(*args)
+        outcome, detail = 'ok', None
+        if isinstance(result, tuple) and result[0] in (False, None):
+            outcome, detail = 'rejected', result[1]
+    except Exception as e:
+        outcome, detail = 'error', f"{type(e).__name__}: {e}"
+    samples.append((op, (time.perf_counter() - start) * 1000, outcome, detail, lag_ms))
+
+
+def register_kiosk(kiosk, db_path, work_dir, employee_ids, journal):
+    config.PUNCH_JOURNAL_ENABLED = journal
+    db_manager = kiosk_manager(kiosk, db_path, work_dir)
+    samples = []
+
+    for employee_id in employee_ids:
+        call(samples, 'register_user', db_manager.register_user, f"Employee {employee_id}", employee_id)
+
+    return samples
+
+
+def run_kiosk(kiosk, db_path, work_dir, punches, start_at, journal):
+    """
+    Replay a kiosk's punches at their scheduled offsets from start_at (wall clock)
+    Returns: (samples, punches still only in the journal at the end)
+    """
+    config.PUNCH_JOURNAL_ENABLED = journal
+    config.MIN_TIME_BETWEEN_PUNCHES = 0  # Simulated time runs much faster than the cooldown
+    db_manager = kiosk_manager(kiosk, db_path, work_dir)
+    recognizer = FaceRecognizer(
+        FaceDetector(), db_manager, encodings_path=os.path.join(work_dir, f"kiosk{kiosk}.pkl")
+    )
+    samples = []
+
+    for offset, employee_id in punches:
+        delay = start_at + offset - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        lag_ms = max(0.0, -delay * 1000)
+        call(samples, 'mark_attendance', recognizer.mark_attendance, employee_id, lag_ms=lag_ms)
+
+    unapplied = 0
+    if db_manager.journal is not None:
+        db_manager.replay_journal(timeout=30)
+        unapplied = len(db_manager.journal.events)
+        db_manager.journal.close()
+
+    return samples, unapplied
+
+
+def run_readers(db_manager, readers, interval, stop):
+    """Dashboard sessions re-running the Home / View Attendance / Manage Users queries"""
+    samples = []
+
+    def reader():
+        while not stop.is_set():
+            call(samples, 'get_today_attendance', db_manager.get_today_attendance)
+            call(samples, 'get_all_users', db_manager.get_all_users)
+            stop.wait(interval)
+
+    threads = [threading.Thread(target=reader, daemon=True) for _ in range(readers)]
+    for thread in threads:
+        thread.start()
+    return threads, samples
+
+
+def summarize(samples, elapsed):
+    rows = []
+    by_op = collections.defaultdict(list)
+    for sample in samples:
+        by_op[sample[0]].append(sample)
+
+    for op, op_samples in by_op.items():
+        latencies = np.array([sample[1] for sample in op_samples])
+        outcomes = collections.Counter(sample[2] for sample in op_samples)
+        lags = np.array([sample[4] for sample in op_samples])
+        rows.append({
+            'op': op,
+            'count': len(op_samples),
+            'ok': outcomes['ok'],
+            'rejected': outcomes['rejected'],
+            'errors': outcomes['error'],
+            'per_s': round(len(op_samples) / elapsed[op], 1),
+            'p50_ms': round(float(np.percentile(latencies, 50)), 2),
+            'p95_ms': round(float(np.percentile(latencies, 95)), 2),
+            'p99_ms': round(float(np.percentile(latencies, 99)), 2),
+            'max_ms': round(float(latencies.max()), 2),
+            'lag_p95_ms': round(float(np.percentile(lags, 95)), 1) if op == 'mark_attendance' else '',
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--kiosks', type=int, default=8)
+    parser.add_argument('--employees', type=int, default=2000)
+    parser.add_argument('--mode', choices=['thread', 'process'], default='thread',
+                        help="Kiosks as threads of one process or as separate processes")
+    parser.add_argument('--duration', type=float, default=60,
+                        help="Real seconds the simulated working day is compressed into")
+    parser.add_argument('--lunch-fraction', type=float, default=0.3,
+                        help="Share of employees who also punch out and in for lunch")
+    parser.add_argument('--readers', type=int, default=4, help="Dashboard sessions polling reports")
+    parser.add_argument('--read-interval', type=float, default=1.0, help="Seconds between dashboard reruns")
+    parser.add_argument('--no-journal', action='store_true', help="Write punches straight to SQLite")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    journal = not args.no_journal
+    config.PUNCH_JOURNAL_ENABLED = journal
+    employee_ids = [f"EMP{i:06d}" for i in range(args.employees)]
+    punches, window_start, window_end = build_schedule(args.employees, args.lunch_fraction, args.seed)
+    scale = args.duration / (window_end - window_start)
+
+    # Employees use the kiosk at their own entrance
+    kiosk_punches = [[] for _ in range(args.kiosks)]
+    for punch_time, employee in punches:
+        kiosk_punches[employee % args.kiosks].append(((punch_time - window_start) * scale, employee_ids[employee]))
+
+    pool_class = ProcessPoolExecutor if args.mode == 'process' else ThreadPoolExecutor
+    samples = []
+    elapsed = {}
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        db_path = os.path.join(work_dir, 'attendance.db')
+        dashboard = AttendanceManager(db_path=db_path, kiosk_id='dashboard')
+
+        with pool_class(max_workers=args.kiosks) as pool:
+            start = time.perf_counter()
+            futures = [
+                pool.submit(register_kiosk, kiosk, db_path, work_dir, employee_ids[kiosk::args.kiosks], journal)
+                for kiosk in range(args.kiosks)
+            ]
+            for future in futures:
+                samples.extend(future.result())
+            elapsed['register_user'] = time.perf_counter() - start
+
+            print(f"Registered {args.employees} employees; replaying {len(punches)} punches "
+                  f"on {args.kiosks} kiosks ({args.mode}s) over {args.duration:.0f}s")
+
+            stop = threading.Event()
+            readers, reader_samples = run_readers(dashboard, args.readers, args.read_interval, stop)
+
+            start = time.perf_counter()
+            start_at = time.time() + 1.0  # Time for the kiosks to start up
+            futures = [
+                pool.submit(run_kiosk, kiosk, db_path, work_dir, kiosk_punches[kiosk], start_at, journal)
+                for kiosk in range(args.kiosks)
+            ]
+            unapplied = 0
+            for future in futures:
+                kiosk_samples, kiosk_unapplied = future.result()
+                samples.extend(kiosk_samples)
+                unapplied += kiosk_unapplied
+            elapsed['mark_attendance'] = time.perf_counter() - start - 1.0
+
+            stop.set()
+            for reader in readers:
+                reader.join()
+            samples.extend(reader_samples)
+            elapsed['get_today_attendance'] = elapsed['get_all_users'] = elapsed['mark_attendance']
+
+        acknowledged = sum(1 for sample in samples if sample[0] == 'mark_attendance' and sample[2] == 'ok')
+        stored = len(dashboard.get_today_attendance())
+
+    print_table(summarize(samples, elapsed), [
+        'op', 'count', 'ok', 'rejected', 'errors', 'per_s', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms', 'lag_p95_ms'
+    ])
+    print(f"\nPunches acknowledged: {acknowledged}, stored: {stored}, still journaled: {unapplied}")
+
+    errors = collections.Counter(sample[3] for sample in samples if sample[2] == 'error')
+    for message, count in errors.most_common(5):
+        print(f"{count:6d} x {message}")
+
+
+if __name__ == '__main__':
+    main()
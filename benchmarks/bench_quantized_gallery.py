@@ -0,0 +1,89 @@
+"""
+Compare gallery representations: legacy list of float64 arrays, contiguous float32,
+and quantized (float16 / int8) coarse search with exact re-ranking
+
+Reports memory per 100k identities, match latency and agreement with an exact
+float64 search on noisy probes of enrolled encodings.
+"""
+import argparse
+import sys
+
+import numpy as np
+
+from common import time_call, print_table
+
+import config
+from face_gallery import FaceGallery
+
+
+def legacy_bytes(encodings):
+    """Memory of the previous list-of-arrays layout"""
+    arrays = [np.array(row, dtype=np.float64) for row in encodings]
+    return sys.getsizeof(arrays) + sum(sys.getsizeof(array) for array in arrays)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--probes', type=int, default=200)
+    parser.add_argument('--noise', type=float, default=0.02, help="Per-dimension probe noise")
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    
+    rng = np.random.default_rng(0)
+    rows = []
+    
+    for size in args.sizes:
+        encodings = rng.normal(0, 0.09, (size, 128))
+        employee_ids = [f"EMP{i:06d}" for i in range(size)]
+        
+        probe_rows = rng.integers(0, size, args.probes)
+        probes = encodings[probe_rows] + rng.normal(0, args.noise, (args.probes, 128))
+        
+        legacy = list(encodings)
+        exact_best = [
+            int(np.argmin(np.linalg.norm(np.asarray(legacy) - probe, axis=1)))
+            for probe in probes[:50]
+        ]
+        
+        timing = time_call(lambda: np.linalg.norm(np.asarray(legacy) - probes[0], axis=1).argmin(), repeat=args.repeat)
+        rows.append({
+            'size': size,
+            'layout': 'legacy float64 list',
+            'bytes_per_100k': f"{legacy_bytes(encodings) / size * 100000 / 1e6:.1f} MB",
+            'disk_per_100k': '-',
+            'match_ms': timing['median_ms'],
+            'top1_agreement': '100.0%',
+            'max_distance_error': 0.0,
+        })
+        
+        for quantization in [None, 'float16', 'int8']:
+            gallery = FaceGallery(quantization=quantization or '', rerank_k=config.GALLERY_RERANK_K)
+            gallery.load(encodings, employee_ids, employee_ids)
+            
+            timing = time_call(lambda: gallery.match(probes[0]), repeat=args.repeat)
+            
+            agree = 0
+            max_error = 0.0
+            for probe, expected in zip(probes[:50], exact_best):
+                best, distance, _ = gallery.match(probe)
+                agree += best == expected
+                max_error = max(max_error, abs(distance - float(np.linalg.norm(encodings[expected] - probe))))
+            
+            resident, disk = gallery.memory_bytes(), gallery.disk_bytes()
+            gallery.close()
+            rows.append({
+                'size': size,
+                'layout': quantization or 'float32',
+                'bytes_per_100k': f"{resident / size * 100000 / 1e6:.1f} MB",
+                'disk_per_100k': f"{disk / size * 100000 / 1e6:.1f} MB",
+                'match_ms': timing['median_ms'],
+                'top1_agreement': f"{100 * agree / 50:.1f}%",
+                'max_distance_error': f"{max_error:.2e}",
+            })
+    
+    print_table(rows, ['size', 'layout', 'bytes_per_100k', 'disk_per_100k', 'match_ms', 'top1_agreement', 'max_distance_error'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,231 @@
+"""
+Load test of the recognition service: batched vs one-at-a-time gallery matching
+
+Starts recognition_service in this process on a free port with a synthetic
+gallery of --gallery-size employees, then keeps --concurrency keep-alive
+clients sending requests for --duration seconds per --batch-sizes entry. By
+default requests carry probe encodings (POST /recognize as JSON), so gallery
+matching is what gets measured; with --image every request uploads that photo
+and also pays for detection and encoding.
+
+    python benchmarks/bench_service_load.py --gallery-size 100000 --concurrency 64
+    python benchmarks/bench_service_load.py --image face.jpg --concurrency 8
+    python benchmarks/bench_service_load.py --target 127.0.0.1:8600   # running service
+
+The clients share this process with the service; use --target against a
+separately started service to keep them off its CPU. Reports requests/sec,
+p50/p95/p99/max latency, 503 rejections, errors and the mean number of
+requests per matching batch.
+"""
+import argparse
+import asyncio
+import collections
+import json
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from common import print_table
+
+import config
+from attendance_manager import AttendanceManager
+from face_detector import FaceDetector
+from face_recognizer import FaceRecognizer
+from metrics import metrics
+from recognition_service import RecognitionService
+
+
+def build_recognizer(work_dir, gallery_size, rng):
+    """
+    Recognizer on a temporary database with a synthetic gallery
+    Returns: (recognizer, gallery encodings)
+    """
+    db_manager = AttendanceManager(
+        db_path=os.path.join(work_dir, 'attendance.db'),
+        journal_path=os.path.join(work_dir, 'journal.bin'),
+    )
+    recognizer = FaceRecognizer(
+        FaceDetector(), db_manager, encodings_path=os.path.join(work_dir, 'encodings.pkl')
+    )
+
+    encodings = rng.normal(0, 0.09, (gallery_size, 128)).astype(np.float32)
+    employee_ids = [f"EMP{i:06d}" for i in range(gallery_size)]
+    recognizer.gallery.load(encodings, employee_ids, employee_ids)
+    return recognizer, encodings
+
+
+def build_request(path, body, content_type):
+    head = (
+        f"POST {path} HTTP/1.1\r\nHost: localhost\r\n"
+        f"Content-Type: {content_type}\r\nContent-Length: {len(body)}\r\n\r\n"
+    )
+    return head.encode('latin-1') + body
+
+
+def encoding_requests(encodings, count, rng):
+    """JSON /recognize requests, each probing a known employee with some noise"""
+    requests = []
+    for _ in range(count):
+        probe = encodings[rng.integers(len(encodings))] + rng.normal(0, 0.02, 128)
+        body = json.dumps({'encodings': [probe.round(5).tolist()]}).encode()
+        requests.append(build_request('/recognize', body, 'application/json'))
+    return requests
+
+
+def start_service(service):
+    """
+    Run the service on its own event loop thread
+    Returns: (port, stop)
+    """
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, name="service-loop", daemon=True)
+    thread.start()
+    server = asyncio.run_coroutine_threadsafe(service.start('127.0.0.1', 0), loop).result()
+
+    def stop():
+        asyncio.run_coroutine_threadsafe(service.stop(server), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+
+    return server.sockets[0].getsockname()[1], stop
+
+
+async def read_response(reader):
+    """Returns: (status, keep connection open)"""
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    headers = dict(
+        (name.strip().lower(), value.strip())
+        for name, _, value in (line.partition(':') for line in lines[1:] if line)
+    )
+    await reader.readexactly(int(headers.get('content-length', 0)))
+    return int(lines[0].split(' ')[1]), headers.get('connection', '').lower() != 'close'
+
+
+async def client(host, port, requests, stop_at, samples):
+    """Send requests back to back on one connection until stop_at"""
+    connection = None
+    index = 0
+
+    while time.perf_counter() < stop_at:
+        start = time.perf_counter()
+        try:
+            if connection is None:
+                connection = await asyncio.open_connection(host, port)
+            reader, writer = connection
+            writer.write(requests[index % len(requests)])
+            await writer.drain()
+            status, persistent = await read_response(reader)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            samples.append((time.perf_counter() - start, 'error'))
+            connection = None
+            continue
+
+        index += 1
+        outcome = 'ok' if status == 200 else 'rejected' if status == 503 else 'error'
+        samples.append((time.perf_counter() - start, outcome))
+
+        if status == 503:
+            await asyncio.sleep(0.001)  # Back off briefly instead of hammering a full queue
+        if not persistent:
+            writer.close()
+            connection = None
+
+    if connection is not None:
+        connection[1].close()
+
+
+async def run_load(host, port, requests, concurrency, duration):
+    """Returns: (list of (seconds, outcome), elapsed seconds)"""
+    samples = []
+    start = time.perf_counter()
+    stop_at = start + duration
+    await asyncio.gather(*[
+        client(host, port, requests[i::concurrency] or requests, stop_at, samples)
+        for i in range(concurrency)
+    ])
+    return samples, time.perf_counter() - start
+
+
+def summarize(label, samples, elapsed):
+    latencies = np.array([seconds * 1000 for seconds, _ in samples]) if samples else np.zeros(1)
+    outcomes = collections.Counter(outcome for _, outcome in samples)
+    counters = metrics.snapshot()[1]
+    batches = counters.get('service_batches', 0)
+
+    return {
+        'batching': label,
+        'requests': len(samples),
+        'ok': outcomes['ok'],
+        'rejected': outcomes['rejected'],
+        'errors': outcomes['error'],
+        'req_per_s': round(outcomes['ok'] / elapsed, 1),
+        'p50_ms': round(float(np.percentile(latencies, 50)), 2),
+        'p95_ms': round(float(np.percentile(latencies, 95)), 2),
+        'p99_ms': round(float(np.percentile(latencies, 99)), 2),
+        'max_ms': round(float(latencies.max()), 2),
+        'mean_batch': round(counters.get('service_batched_requests', 0) / batches, 1) if batches else '',
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--gallery-size', type=int, default=100000)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, config.SERVICE_BATCH_SIZE])
+    parser.add_argument('--workers', type=int, default=config.SERVICE_WORKERS)
+    parser.add_argument('--queue-size', type=int, default=config.SERVICE_QUEUE_SIZE)
+    parser.add_argument('--image', help="Upload this photo instead of sending encodings")
+    parser.add_argument('--target', help="HOST:PORT of a running service to load instead")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    rows = []
+
+    if args.image:
+        with open(args.image, 'rb') as f:
+            image_requests = [build_request('/recognize', f.read(), 'image/jpeg')]
+
+    if args.target:
+        host, port = args.target.rsplit(':', 1)
+        probes = rng.normal(0, 0.09, (64, 128)).astype(np.float32)
+        requests = image_requests if args.image else encoding_requests(probes, 256, rng)
+        samples, elapsed = asyncio.run(run_load(host, int(port), requests, args.concurrency, args.duration))
+        rows.append(summarize(f'remote {args.target}', samples, elapsed))
+    else:
+        with tempfile.TemporaryDirectory() as work_dir:
+            recognizer, encodings = build_recognizer(work_dir, args.gallery_size, rng)
+            requests = image_requests if args.image else encoding_requests(encodings, 256, rng)
+
+            for batch_size in args.batch_sizes:
+                service = RecognitionService(
+                    recognizer, workers=args.workers, queue_size=args.queue_size,
+                    batch_size=batch_size, batch_wait=0 if batch_size == 1 else None,
+                )
+                port, stop = start_service(service)
+                metrics.reset()
+
+                try:
+                    samples, elapsed = asyncio.run(
+                        run_load('127.0.0.1', port, requests, args.concurrency, args.duration)
+                    )
+                finally:
+                    stop()
+
+                label = 'none' if batch_size == 1 else f'up to {batch_size}'
+                rows.append(summarize(label, samples, elapsed))
+
+    if not args.target:
+        print(f"gallery={args.gallery_size} employees, concurrency={args.concurrency}, {args.duration}s per run")
+    print_table(rows, [
+        'batching', 'requests', 'ok', 'rejected', 'errors', 'req_per_s',
+        'p50_ms', 'p95_ms', 'p99_ms', 'max_ms', 'mean_batch',
+    ])
+
+
+if __name__ == '__main__':
+    main()
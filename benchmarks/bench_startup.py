@@ -0,0 +1,75 @@
+"""
+Startup benchmark: cold import through first processed frame
+
+Each mode runs in a fresh interpreter:
+  eager   - import face_recognition and pandas up front (previous behaviour)
+  lazy    - lazy imports, first frame pays the model load
+  warmup  - lazy imports plus background warm-up, first frame after ready
+"""
+import argparse
+import json
+import subprocess
+import sys
+
+from common import ROOT_DIR, print_table
+
+CHILD = r'''
+import json, sys, time
+start = time.perf_counter()
+sys.path.insert(0, {root!r})
+mode = {mode!r}
+marks = {{}}
+
+if mode == 'eager':
+    import face_recognition, pandas
+
+from components import ComponentRegistry
+import numpy as np
+import config
+marks['import_s'] = time.perf_counter() - start
+
+registry = ComponentRegistry()
+if mode == 'warmup':
+    registry.start_warmup()
+registry.components()
+marks['ui_ready_s'] = time.perf_counter() - start
+
+if mode == 'warmup':
+    registry.ready.wait()
+
+frame = np.zeros((config.FRAME_HEIGHT, config.FRAME_WIDTH, 3), dtype=np.uint8)
+before_frame = time.perf_counter()
+registry.recognizer.detect_and_encode(frame)
+marks['first_frame_ms'] = (time.perf_counter() - before_frame) * 1000
+marks['total_s'] = time.perf_counter() - start
+print(json.dumps(marks))
+'''
+
+
+def run_mode(mode):
+    output = subprocess.run(
+        [sys.executable, '-c', CHILD.format(root=ROOT_DIR, mode=mode)],
+        capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+    
+    rows = []
+    for mode in ['eager', 'lazy', 'warmup']:
+        runs = [run_mode(mode) for _ in range(args.runs)]
+        row = {'mode': mode}
+        for key in ['import_s', 'ui_ready_s', 'first_frame_ms', 'total_s']:
+            values = sorted(run[key] for run in runs)
+            row[key] = round(values[len(values) // 2], 3)
+        rows.append(row)
+    
+    print_table(rows, ['mode', 'import_s', 'ui_ready_s', 'first_frame_ms', 'total_s'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""
+Scaling benchmark for tile-parallel HOG detection across worker counts and frame sizes
+
+Compares single-pass face_locations on the whole frame with detect_faces_tiled.
+"""
+import argparse
+import os
+
+import cv2
+
+from common import time_call, synthetic_frame, print_table
+
+import config
+import face_recognition
+from face_detector import FaceDetector, split_tiles, tile_grid
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', nargs='+', default=['640x480', '1280x720', '1920x1080'])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--pool', choices=['process', 'thread'], default=config.DETECTION_POOL)
+    parser.add_argument('--upsample', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    
+    config.DETECTION_POOL = args.pool
+    print(f"{os.cpu_count()} CPU cores, {args.pool} pool, upsample={args.upsample}")
+    
+    rows = []
+    for size in args.sizes:
+        width, height = map(int, size.split('x'))
+        rgb = cv2.cvtColor(synthetic_frame(width, height), cv2.COLOR_BGR2RGB)
+        
+        single = time_call(
+            lambda: face_recognition.face_locations(rgb, number_of_times_to_upsample=args.upsample),
+            repeat=args.repeat, warmup=1
+        )
+        rows.append({'size': size, 'tiles': 1, 'workers': 'single pass', 'median_ms': single['median_ms'], 'speedup': 1.0})
+        
+        for workers in args.workers:
+            config.DETECTION_WORKERS = workers
+            grid = config.TILE_GRID or tile_grid(height, width, workers)
+            tiles = len(split_tiles(height, width, grid, config.TILE_OVERLAP))
+            detector = FaceDetector()
+            
+            try:
+                tiled = time_call(lambda: detector.detect_faces_tiled(rgb, args.upsample), repeat=args.repeat, warmup=1)
+            finally:
+                detector.close()
+            
+            rows.append({
+                'size': size,
+                'tiles': tiles,
+                'workers': workers,
+                'median_ms': tiled['median_ms'],
+                'speedup': round(single['median_ms'] / tiled['median_ms'], 2),
+            })
+    
+    print_table(rows, ['size', 'tiles', 'workers', 'median_ms', 'speedup'])
+
+
+if __name__ == '__main__':
+    main()
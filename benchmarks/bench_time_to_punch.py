@@ -0,0 +1,120 @@
+"""
+Measure time from face-appearing to punch on recorded clips: per-frame consecutive
+counting vs temporal fusion
+
+Clips are named <employee_id>__<anything>.<ext>; use unknown__<anything> for people
+who are not enrolled. Matching uses the gallery at config.ENCODINGS_PATH.
+Liveness checks are not applied, only the recognition decision is timed.
+"""
+import argparse
+import os
+
+import cv2
+import numpy as np
+
+from common import print_table
+
+import config
+from face_recognizer import FaceRecognizer
+from face_tracker import FaceTracker
+
+
+def legacy_decision(recognizer, face_encodings, state):
+    """Old rule: any match for CONSECUTIVE_FRAMES_FOR_RECOGNITION frames in a row"""
+    matches = []
+    for face_encoding in face_encodings:
+        employee_id, _, distance, _ = recognizer.match_identity(face_encoding)
+        if distance <= recognizer.tolerance:
+            matches.append(employee_id)
+    
+    if not matches:
+        state['consecutive'] = 0
+        return None
+    
+    state['consecutive'] += 1
+    if state['consecutive'] >= config.CONSECUTIVE_FRAMES_FOR_RECOGNITION:
+        return matches[0]
+    return None
+
+
+def run_clip(recognizer, path):
+    """
+    Returns: dict of rule -> (seconds from first face to punch, employee_id) or None
+    """
+    cap = cv2.VideoCapture(path)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    
+    tracker = FaceTracker(recognizer)
+    legacy_state = {'consecutive': 0}
+    decisions = {'legacy': None, 'fusion': None}
+    first_face_time = None
+    frame_index = 0
+    
+    while decisions['legacy'] is None or decisions['fusion'] is None:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        
+        now = frame_index / fps
+        frame_index += 1
+        
+        face_locations, face_encodings = recognizer.detect_and_encode(frame)
+        if face_locations and first_face_time is None:
+            first_face_time = now
+        
+        if decisions['legacy'] is None:
+            employee_id = legacy_decision(recognizer, face_encodings, legacy_state)
+            if employee_id is not None:
+                decisions['legacy'] = (now - first_face_time, employee_id)
+        
+        if decisions['fusion'] is None:
+            for track in tracker.update(face_locations, face_encodings):
+                if track['ready']:
+                    decisions['fusion'] = (now - first_face_time, track['employee_id'])
+                    break
+    
+    cap.release()
+    return decisions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('clips', help="Directory of recorded clips")
+    args = parser.parse_args()
+    
+    recognizer = FaceRecognizer()
+    results = {'legacy': [], 'fusion': []}
+    
+    for file_name in sorted(os.listdir(args.clips)):
+        if '__' not in file_name:
+            continue
+        
+        label = file_name.split('__', 1)[0]
+        decisions = run_clip(recognizer, os.path.join(args.clips, file_name))
+        
+        for rule, decision in decisions.items():
+            results[rule].append((label, decision))
+    
+    rows = []
+    for rule, outcomes in results.items():
+        genuine = [(label, decision) for label, decision in outcomes if label != 'unknown']
+        times = [decision[0] for label, decision in genuine if decision and decision[1] == label]
+        false_accepts = sum(
+            1 for label, decision in outcomes
+            if decision is not None and decision[1] != label
+        )
+        
+        rows.append({
+            'rule': rule,
+            'clips': len(outcomes),
+            'punched': sum(1 for _, decision in outcomes if decision is not None),
+            'median_time_to_punch_s': round(float(np.median(times)), 3) if times else 'n/a',
+            'false_accepts': false_accepts,
+            'false_accept_rate': f"{100 * false_accepts / max(len(outcomes), 1):.1f}%",
+        })
+    
+    print_table(rows, ['rule', 'clips', 'punched', 'median_time_to_punch_s', 'false_accepts', 'false_accept_rate'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""
+Compare text IST timestamps with integer UTC-epoch timestamps
+
+Builds the same attendance month both ways and reports bytes per row (table
+plus indexes), the punch cooldown check, a one-day range query and the pandas
+conversion done when a page is rendered.
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import datetime
+
+import pytz
+
+from common import time_call, print_table
+
+import config
+
+
+SCHEMAS = {
+    'text': ('timestamp TEXT', 'timestamp'),
+    'epoch': ('punched_at INTEGER NOT NULL', 'punched_at'),
+}
+
+
+def build(path, layout, records):
+    """Create one month table with its indexes and fill it"""
+    column, name = SCHEMAS[layout]
+    conn = sqlite3.connect(path)
+    conn.execute(f'''
+        CREATE TABLE attendance (
+            attendance_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            employee_id TEXT,
+            action TEXT,
+            {column}
+        )
+    ''')
+    conn.execute(f'CREATE INDEX idx_employee ON attendance (employee_id, {name})')
+    conn.execute(f'CREATE INDEX idx_time ON attendance ({name})')
+    conn.execute('CREATE INDEX idx_user ON attendance (user_id)')
+    conn.executemany(f'INSERT INTO attendance (user_id, employee_id, action, {name}) VALUES (?, ?, ?, ?)', records)
+    conn.commit()
+    conn.execute('VACUUM')
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[100000, 1000000])
+    parser.add_argument('--employees', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    import pandas as pd
+
+    timezone = pytz.timezone(config.TIMEZONE)
+    rng = random.Random(0)
+    start = int(timezone.localize(datetime(2026, 1, 1)).timestamp())
+    day = start + 14 * 86400
+    rows = []
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for size in args.rows:
+            epoch_records = []
+            for i in range(size):
+                employee = rng.randrange(args.employees)
+                epoch_records.append((
+                    employee + 1, f"EMP{employee:06d}", 'punch-in' if i % 2 == 0 else 'punch-out',
+                    start + rng.randrange(31 * 86400),
+                ))
+            text_records = [
+                record[:3] + (datetime.fromtimestamp(record[3], timezone).strftime('%Y-%m-%d %H:%M:%S'),)
+                for record in epoch_records
+            ]
+            day_text = datetime.fromtimestamp(day, timezone).strftime('%Y-%m-%d')
+
+            paths = {layout: os.path.join(temp_dir, f"{layout}_{size}.db") for layout in SCHEMAS}
+            build(paths['text'], 'text', text_records)
+            build(paths['epoch'], 'epoch', epoch_records)
+
+            text_conn = sqlite3.connect(paths['text'])
+            epoch_conn = sqlite3.connect(paths['epoch'])
+
+            def text_cooldown():
+                last = text_conn.execute(
+                    'SELECT action, timestamp FROM attendance WHERE employee_id = ? ORDER BY timestamp DESC LIMIT 1',
+                    ('EMP000001',)
+                ).fetchone()
+                last_time = datetime.strptime(last[1], '%Y-%m-%d %H:%M:%S')
+                current_time = datetime.now(timezone).replace(tzinfo=None)
+                return (current_time - last_time).total_seconds() < config.MIN_TIME_BETWEEN_PUNCHES
+
+            def epoch_cooldown():
+                last = epoch_conn.execute(
+                    'SELECT action, punched_at FROM attendance WHERE employee_id = ? ORDER BY punched_at DESC LIMIT 1',
+                    ('EMP000001',)
+                ).fetchone()
+                return time.time() - last[1] < config.MIN_TIME_BETWEEN_PUNCHES
+
+            def text_day():
+                df = pd.read_sql_query(
+                    'SELECT employee_id, action, timestamp FROM attendance WHERE DATE(timestamp) = DATE(?)',
+                    text_conn, params=[day_text]
+                )
+                df['timestamp'] = pd.to_datetime(df['timestamp'])
+                return df
+
+            def epoch_day():
+                df = pd.read_sql_query(
+                    'SELECT employee_id, action, punched_at FROM attendance WHERE punched_at >= ? AND punched_at < ?',
+                    epoch_conn, params=[day, day + 86400]
+                )
+                df['timestamp'] = pd.to_datetime(df['punched_at'], unit='s', utc=True).dt.tz_convert(timezone)
+                return df
+
+            assert len(text_day()) == len(epoch_day())
+
+            for layout, cooldown, day_query in [
+                ('text', text_cooldown, text_day),
+                ('epoch', epoch_cooldown, epoch_day),
+            ]:
+                rows.append({
+                    'rows': size,
+                    'layout': layout,
+                    'bytes_per_row': round(os.path.getsize(paths[layout]) / size, 1),
+                    'cooldown_ms': time_call(cooldown, repeat=args.repeat)['median_ms'],
+                    'day_query_ms': time_call(day_query, repeat=max(5, args.repeat // 5))['median_ms'],
+                })
+
+            text_conn.close()
+            epoch_conn.close()
+
+    print_table(rows, ['rows', 'layout', 'bytes_per_row', 'cooldown_ms', 'day_query_ms'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Shared helpers for the benchmark scripts
+
+Scripts are run from the project root, e.g. `python benchmarks/bench_preprocessing.py`
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+
+def time_call(func, repeat=50, warmup=3):
+    """
+    Time a zero-argument callable
+    Returns: dict with mean/median/p95/min in milliseconds
+    """
+    for _ in range(warmup):
+        func()
+    
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    
+    samples = np.array(samples)
+    return {
+        'mean_ms': round(float(samples.mean()), 3),
+        'median_ms': round(float(np.median(samples)), 3),
+        'p95_ms': round(float(np.percentile(samples, 95)), 3),
+        'min_ms': round(float(samples.min()), 3),
+    }
+
+
+def synthetic_frame(width=640, height=480, brightness=128, contrast=40, seed=0):
+    """
+    Generate a BGR frame with a face-sized bright blob on a textured background
+    """
+    rng = np.random.default_rng(seed)
+    frame = rng.normal(brightness, contrast, (height, width, 3))
+    
+    yy, xx = np.mgrid[0:height, 0:width]
+    cy, cx = height / 2, width / 2
+    blob = ((yy - cy) / (height / 4)) ** 2 + ((xx - cx) / (width / 6)) ** 2 < 1
+    frame[blob] += contrast
+    
+    return np.clip(frame, 0, 255).astype(np.uint8)
+
+
+def list_labelled_images(dataset_dir):
+    """
+    List images laid out as <dataset_dir>/<employee_id>/<image>
+    Returns: list of (employee_id, image_path) sorted by label and file name
+    """
+    images = []
+    
+    for label in sorted(os.listdir(dataset_dir)):
+        label_dir = os.path.join(dataset_dir, label)
+        if not os.path.isdir(label_dir):
+            continue
+        
+        for file_name in sorted(os.listdir(label_dir)):
+            if file_name.lower().endswith(('.jpg', '.jpeg', '.png', '.bmp')):
+                images.append((label, os.path.join(label_dir, file_name)))
+    
+    return images
+
+
+def print_table(rows, columns):
+    """Print a list of dicts as an aligned text table"""
+    widths = {
+        column: max([len(column)] + [len(str(row.get(column, ''))) for row in rows])
+        for column in columns
+    }
+    
+    print("  ".join(column.ljust(widths[column]) for column in columns))
+    print("  ".join("-" * widths[column] for column in columns))
+    for row in rows:
+        print("  ".join(str(row.get(column, '')).ljust(widths[column]) for column in columns))
@@ -0,0 +1,318 @@
+"""
+Stage-level benchmark suite
+
+Times each pipeline stage in isolation and end to end, using generated fixtures
+(synthetic frames, 128-D galleries and attendance databases) or the images in
+--fixtures, and writes machine-readable results. Results are checked against
+benchmarks/thresholds.json (absolute limits) and optionally a previous results
+file (--baseline); the exit code is 1 if any benchmark regressed.
+
+    python benchmarks/suite.py --quick
+    python benchmarks/suite.py --baseline benchmarks/results/latest.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import tempfile
+import time
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from common import ROOT_DIR, time_call, synthetic_frame, print_table
+
+import config
+from attendance_manager import AttendanceManager
+from face_detector import FaceDetector
+from face_recognizer import FaceRecognizer
+from spoof_detector import SpoofDetector
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+THRESHOLDS_PATH = os.path.join(BENCH_DIR, 'thresholds.json')
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+
+
+def load_frames(fixtures_dir):
+    """Load fixture images, or generate a synthetic frame"""
+    frames = []
+    
+    if fixtures_dir:
+        for file_name in sorted(os.listdir(fixtures_dir)):
+            if file_name.lower().endswith(('.jpg', '.jpeg', '.png')):
+                frame = cv2.imread(os.path.join(fixtures_dir, file_name))
+                if frame is not None:
+                    frames.append(cv2.resize(frame, (config.FRAME_WIDTH, config.FRAME_HEIGHT)))
+    
+    if not frames:
+        frames.append(synthetic_frame(config.FRAME_WIDTH, config.FRAME_HEIGHT))
+    
+    return frames
+
+
+def synthetic_gallery(size, seed=0):
+    """Random 128-D encodings on the same scale as dlib's"""
+    rng = np.random.default_rng(seed)
+    encodings = rng.normal(0, 0.09, (size, 128))
+    employee_ids = [f"EMP{i:06d}" for i in range(size)]
+    return encodings, employee_ids
+
+
+def synthetic_landmarks(face_location):
+    """A plausible landmark dict for a face box (open eyes)"""
+    top, right, bottom, left = face_location
+    width = right - left
+    eye_y = top + (bottom - top) // 3
+    
+    def eye(center_x):
+        half = width // 10
+        return [
+            (center_x - half, eye_y), (center_x - half // 2, eye_y - 4), (center_x + half // 2, eye_y - 4),
+            (center_x + half, eye_y), (center_x + half // 2, eye_y + 4), (center_x - half // 2, eye_y + 4),
+        ]
+    
+    return [{'left_eye': eye(left + width // 3), 'right_eye': eye(left + 2 * width // 3)}]
+
+
+def populate_attendance(db_manager, employees, rows, seed=0):
+    """Fill a database with users and `rows` attendance records over the last year"""
+    rng = random.Random(seed)
+    now = datetime.now(db_manager.timezone).replace(tzinfo=None)
+    registered = now.strftime('%Y-%m-%d %H:%M:%S')
+    now_epoch = int(time.time())
+    
+    conn = sqlite3.connect(db_manager.db_path)
+    conn.executemany(
+        'INSERT INTO users (name, employee_id, email, department, registered_date) VALUES (?, ?, ?, ?, ?)',
+        [(f"Employee {i}", f"EMP{i:06d}", None, 'Engineering', registered) for i in range(employees)]
+    )
+    
+    batch = []
+    for i in range(rows):
+        user_index = rng.randrange(employees)
+        # Keep the last hour free so punches aren't rejected by the cooldown
+        batch.append((
+            user_index + 1,
+            f"EMP{user_index:06d}",
+            'punch-in' if i % 2 == 0 else 'punch-out',
+            now_epoch - 3600 - rng.randrange(365 * 86400),
+        ))
+    
+    conn.commit()
+    conn.close()
+    
+    # Routed to the monthly partitions
+    db_manager.insert_records(batch)
+
+
+def bench_detector(results, frames, repeat):
+    detector = FaceDetector()
+    frame = frames[0]
+    face_location = (150, 400, 330, 240)
+    
+    results['detector.detect_faces'] = time_call(lambda: detector.detect_faces(frame), repeat=repeat)
+    results['detector.get_face_encodings'] = time_call(
+        lambda: detector.get_face_encodings(frame, [face_location]), repeat=repeat
+    )
+    results['detector.get_facial_landmarks'] = time_call(
+        lambda: detector.get_facial_landmarks(frame, [face_location]), repeat=repeat
+    )
+    results['detector.preprocess_frame'] = time_call(
+        lambda: detector.preprocess_frame(frame, [face_location]), repeat=repeat
+    )
+
+
+def bench_recognizer(results, frames, gallery_sizes, repeat, work_dir):
+    db_manager = AttendanceManager(db_path=os.path.join(work_dir, 'recognizer.db'))
+    recognizer = FaceRecognizer(
+        db_manager=db_manager, encodings_path=os.path.join(work_dir, 'encodings.pkl')
+    )
+    probe = synthetic_gallery(1, seed=1)[0][0]
+    
+    for size in gallery_sizes:
+        encodings, employee_ids = synthetic_gallery(size)
+        recognizer.gallery.load(encodings, employee_ids, employee_ids)
+        
+        results[f'recognizer.match_encoding[n={size}]'] = time_call(
+            lambda: recognizer.match_identity(probe), repeat=repeat
+        )
+    
+    results[f'recognizer.recognize_face[n={gallery_sizes[-1]}]'] = time_call(
+        lambda: recognizer.recognize_face(frames[0]), repeat=max(3, repeat // 5)
+    )
+
+
+def bench_spoof(results, frames, repeat):
+    spoof_detector = SpoofDetector()
+    face_location = (150, 400, 330, 240)
+    landmarks = synthetic_landmarks(face_location)
+    
+    results['spoof.is_live_person'] = time_call(
+        lambda: spoof_detector.is_live_person(frames[0], face_location, landmarks), repeat=repeat
+    )
+
+
+def bench_attendance(results, employees, rows, repeat, work_dir):
+    db_manager = AttendanceManager(db_path=os.path.join(work_dir, 'attendance.db'))
+    
+    start = time.perf_counter()
+    populate_attendance(db_manager, employees, rows)
+    print(f"Generated {rows} attendance rows in {time.perf_counter() - start:.1f}s")
+    
+    counter = iter(range(10 ** 9))
+    
+    def punch():
+        employee_id = f"EMP{next(counter) % employees:06d}"
+        db_manager.mark_attendance(employee_id, 'punch-in')
+    
+    results[f'attendance.mark_attendance[rows={rows}]'] = time_call(punch, repeat=repeat, warmup=1)
+    results[f'attendance.get_last_attendance[rows={rows}]'] = time_call(
+        lambda: db_manager.get_last_attendance('EMP000001'), repeat=repeat, warmup=1
+    )
+    
+    # Cached queries: the plain key times the query itself (the cache is emptied
+    # before every call), '.cached' the hit served while the data version is unchanged
+    for name, size, query in [
+        ('get_today_attendance', f'rows={rows}', db_manager.get_today_attendance),
+        ('get_all_users', f'users={employees}', db_manager.get_all_users),
+    ]:
+        def miss():
+            db_manager.query_cache.clear()
+            query()
+        
+        results[f'attendance.{name}[{size}]'] = time_call(miss, repeat=repeat, warmup=1)
+        results[f'attendance.{name}.cached[{size}]'] = time_call(query, repeat=repeat, warmup=1)
+
+
+def bench_end_to_end(results, frames, repeat, work_dir):
+    """One kiosk frame: detect, encode, match, liveness and punch"""
+    db_manager = AttendanceManager(db_path=os.path.join(work_dir, 'e2e.db'))
+    detector = FaceDetector()
+    recognizer = FaceRecognizer(detector, db_manager, os.path.join(work_dir, 'e2e.pkl'))
+    spoof_detector = SpoofDetector()
+    
+    encodings, employee_ids = synthetic_gallery(100)
+    recognizer.gallery.load(encodings, employee_ids, employee_ids)
+    
+    frame_iter = iter(range(10 ** 9))
+    
+    def process_frame():
+        frame = frames[next(frame_iter) % len(frames)]
+        for result in recognizer.recognize_face(frame):
+            landmarks = detector.get_facial_landmarks(frame, [result['face_location']])
+            is_live, _, _ = spoof_detector.is_live_person(frame, result['face_location'], landmarks)
+            if is_live:
+                recognizer.mark_attendance(result['employee_id'])
+    
+    results['end_to_end.frame'] = time_call(process_frame, repeat=max(3, repeat // 5))
+
+
+def check_regressions(results, thresholds, baseline, max_slowdown):
+    """
+    Returns: list of regression messages
+    """
+    regressions = []
+    
+    for name, stats in results.items():
+        limit = thresholds.get(name, {}).get('max_median_ms')
+        if limit is not None and stats['median_ms'] > limit:
+            regressions.append(f"{name}: median {stats['median_ms']} ms > threshold {limit} ms")
+        
+        previous = baseline.get(name)
+        if previous and stats['median_ms'] > previous['median_ms'] * max_slowdown:
+            regressions.append(
+                f"{name}: median {stats['median_ms']} ms > {max_slowdown}x baseline {previous['median_ms']} ms"
+            )
+    
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--quick', action='store_true', help="Smaller galleries and databases")
+    parser.add_argument('--fixtures', help="Directory of face images to use instead of synthetic frames")
+    parser.add_argument('--repeat', type=int, default=30)
+    parser.add_argument('--gallery-sizes', type=int, nargs='+')
+    parser.add_argument('--attendance-rows', type=int)
+    parser.add_argument('--employees', type=int, default=1000)
+    parser.add_argument('--stages', nargs='+', default=['detector', 'recognizer', 'spoof', 'attendance', 'end_to_end'])
+    parser.add_argument('--output', help="Results file (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument('--baseline', help="Previous results file to compare against")
+    parser.add_argument('--max-slowdown', type=float, default=1.25)
+    args = parser.parse_args()
+    
+    gallery_sizes = args.gallery_sizes or ([10, 100, 1000, 10000] if args.quick else [10, 100, 1000, 10000, 100000])
+    attendance_rows = args.attendance_rows or (100000 if args.quick else 2000000)
+    
+    frames = load_frames(args.fixtures)
+    results = {}
+    work_dir = tempfile.mkdtemp(prefix='attendance_bench_')
+    
+    try:
+        if 'detector' in args.stages:
+            bench_detector(results, frames, args.repeat)
+        if 'recognizer' in args.stages:
+            bench_recognizer(results, frames, gallery_sizes, args.repeat, work_dir)
+        if 'spoof' in args.stages:
+            bench_spoof(results, frames, args.repeat)
+        if 'attendance' in args.stages:
+            bench_attendance(results, args.employees, attendance_rows, args.repeat, work_dir)
+        if 'end_to_end' in args.stages:
+            bench_end_to_end(results, frames, args.repeat, work_dir)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    
+    thresholds = {}
+    if os.path.exists(THRESHOLDS_PATH):
+        with open(THRESHOLDS_PATH) as f:
+            thresholds = json.load(f)
+    
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f).get('results', {})
+    
+    regressions = check_regressions(results, thresholds, baseline, args.max_slowdown)
+    
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'frames': 'synthetic' if not args.fixtures else args.fixtures,
+            'quick': args.quick,
+        },
+        'results': results,
+        'regressions': regressions,
+    }
+    
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, datetime.now().strftime('%Y%m%d_%H%M%S') + '.json')
+    
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    
+    if args.output is None:
+        shutil.copyfile(output, os.path.join(RESULTS_DIR, 'latest.json'))
+    
+    print_table(
+        [dict(benchmark=name, **stats) for name, stats in results.items()],
+        ['benchmark', 'median_ms', 'p95_ms', 'mean_ms', 'min_ms']
+    )
+    print(f"\nResults written to {os.path.relpath(output, ROOT_DIR)}")
+    
+    for message in regressions:
+        print(f"REGRESSION: {message}")
+    
+    raise SystemExit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
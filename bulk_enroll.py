@@ -0,0 +1,214 @@
+"""
+Bulk offline enrollment from a directory of photos or a CSV manifest
+
+    python bulk_enroll.py photos/             # EMP001_John_Doe.jpg or EMP001_John_Doe/*.jpg
+    python bulk_enroll.py manifest.csv        # columns: image, name, employee_id[, email, department, site]
+    python bulk_enroll.py photos/ --workers 8 --errors errors.csv
+
+Photos are detected and encoded in parallel worker processes. Images with no face
+or more than one face are rejected. Users are inserted in one SQLite transaction
+and the change log / encodings file are written once at the end. Only the aligned
+face crop of each photo is kept in the image store.
+"""
+import argparse
+import csv
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import cv2
+import config
+from face_detector import FaceDetector
+from face_store import crop_face
+
+_detector = None
+
+def init_worker():
+    """Create one detector per worker process"""
+    global _detector
+    _detector = FaceDetector()
+
+def encode_image(image_path):
+    """
+    Detect and encode the single face in a photo (runs in a worker process)
+    Returns: (encoding, face crop, error) - encoding is None if the image was rejected
+    """
+    try:
+        frame = cv2.imread(image_path)
+        
+        if frame is None:
+            return None, None, "Could not read image"
+        
+        height, width = frame.shape[:2]
+        scale = config.ENROLL_MAX_IMAGE_SIDE / max(height, width)
+        if scale < 1.0:
+            frame = cv2.resize(frame, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+        
+        face_locations = _detector.detect_faces(frame, apply_region=False)
+        
+        if len(face_locations) == 0:
+            return None, None, "No face detected"
+        
+        if len(face_locations) > 1:
+            return None, None, f"{len(face_locations)} faces detected"
+        
+        enhanced_frame = _detector.preprocess_frame(frame, face_locations)
+        encodings = _detector.get_face_encodings(enhanced_frame, face_locations)
+        
+        if len(encodings) == 0:
+            return None, None, "Could not generate face encoding"
+        
+        landmarks = _detector.get_facial_landmarks(frame, face_locations)
+        crop = crop_face(frame, face_locations[0], landmarks[0] if landmarks else None)
+        
+        return encodings[0], crop, None
+    except Exception as e:
+        return None, None, f"Error: {str(e)}"
+
+def parse_name(stem):
+    """'EMP001_John_Doe' -> ('EMP001', 'John Doe')"""
+    employee_id, _, name = stem.partition('_')
+    return employee_id, name.replace('_', ' ').strip() or employee_id
+
+def read_directory(directory):
+    """
+    Entries from a directory: one photo per employee (EMP001_John_Doe.jpg)
+    or one folder of photos per employee (EMP001_John_Doe/*.jpg)
+    """
+    entries = []
+    
+    for item in sorted(os.listdir(directory)):
+        path = os.path.join(directory, item)
+        stem, extension = os.path.splitext(item)
+        
+        if os.path.isdir(path):
+            employee_id, name = parse_name(item)
+            entries.extend(
+                {'image': os.path.join(path, image), 'name': name, 'employee_id': employee_id}
+                for image in sorted(os.listdir(path))
+                if image.lower().endswith(config.ENROLL_IMAGE_EXTENSIONS)
+            )
+        elif extension.lower() in config.ENROLL_IMAGE_EXTENSIONS:
+            employee_id, name = parse_name(stem)
+            entries.append({'image': path, 'name': name, 'employee_id': employee_id})
+    
+    return entries
+
+def read_manifest(manifest_path):
+    """Entries from a CSV manifest (image paths are relative to the manifest)"""
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    entries = []
+    
+    with open(manifest_path, newline='') as f:
+        for row in csv.DictReader(f):
+            entries.append({
+                'image': os.path.join(base_dir, row['image'].strip()),
+                'name': row['name'].strip(),
+                'employee_id': row['employee_id'].strip(),
+                'email': (row.get('email') or '').strip() or None,
+                'department': (row.get('department') or '').strip() or None,
+                'site': (row.get('site') or '').strip() or None,
+            })
+    
+    return entries
+
+def enroll(entries, recognizer, workers=None):
+    """
+    Encode all entries in parallel and register the accepted ones
+    Returns: (enrolled_users, enrolled_images, errors) - errors is a list of (image, message)
+    """
+    errors = []
+    encoded = []
+    workers = workers or config.ENROLL_WORKERS or os.cpu_count() or 1
+    chunksize = max(1, len(entries) // (workers * 4))
+    
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as pool:
+        results = pool.map(encode_image, [entry['image'] for entry in entries], chunksize=chunksize)
+        
+        for done, (entry, (encoding, crop, error)) in enumerate(zip(entries, results), 1):
+            if error:
+                errors.append((entry['image'], error))
+            else:
+                encoded.append((entry, encoding, crop))
+            
+            if done % 100 == 0:
+                print(f"Encoded {done}/{len(entries)} images")
+    
+    # One user row per employee, in one transaction
+    users = {}
+    for entry, _, _ in encoded:
+        users.setdefault(entry['employee_id'], entry)
+    
+    registered = recognizer.db_manager.register_users(list(users.values()))
+    
+    changes = []
+    for entry, encoding, crop in encoded:
+        user_id, message = registered[entry['employee_id']]
+        
+        if user_id is None:
+            errors.append((entry['image'], message))
+            continue
+        
+        changes.append((
+            'insert', entry['employee_id'], entry['name'], encoding,
+            entry.get('site'), entry.get('department')
+        ))
+        
+        recognizer.image_store.save_crop(entry['employee_id'], crop)
+    
+    # One change log transaction; running kiosks pick the new templates up on their next sync
+    if changes:
+        recognizer.change_log.record(changes)
+        recognizer.sync_gallery()
+        recognizer.save_encodings()
+    recognizer.image_store.flush()
+    
+    enrolled_images = len(changes)
+    
+    enrolled_users = sum(1 for user_id, _ in registered.values() if user_id is not None)
+    return enrolled_users, enrolled_images, errors
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk offline enrollment")
+    parser.add_argument('source', help="Directory of photos or CSV manifest")
+    parser.add_argument('--workers', type=int, help="Worker processes (default: one per CPU core)")
+    parser.add_argument('--errors', help="Write the per-image error list to this CSV file")
+    parser.add_argument('--site', default=config.SITE_ID, help="Site for entries without one")
+    parser.add_argument('--department', help="Department for entries without one")
+    args = parser.parse_args()
+    
+    if os.path.isdir(args.source):
+        entries = read_directory(args.source)
+    else:
+        entries = read_manifest(args.source)
+    
+    if not entries:
+        print("No images found")
+        return
+    
+    for entry in entries:
+        entry['site'] = entry.get('site') or args.site
+        entry['department'] = entry.get('department') or args.department
+    
+    from face_recognizer import FaceRecognizer
+    recognizer = FaceRecognizer()
+    
+    start = time.perf_counter()
+    enrolled_users, enrolled_images, errors = enroll(entries, recognizer, args.workers)
+    elapsed = time.perf_counter() - start
+    
+    print(f"Enrolled {enrolled_users} users ({enrolled_images} images) from {len(entries)} images "
+          f"in {elapsed:.1f}s - {len(entries) / elapsed:.1f} images/sec")
+    
+    if errors:
+        print(f"{len(errors)} images rejected:")
+        for image, message in errors:
+            print(f"  {image}: {message}")
+        
+        if args.errors:
+            with open(args.errors, 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(['image', 'error'])
+                writer.writerows(errors)
+
+if __name__ == '__main__':
+    main()
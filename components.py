@@ -0,0 +1,113 @@
+import threading
+import time
+import numpy as np
+import config
+
+class ComponentRegistry:
+    """
+    Single shared set of pipeline components
+    Components are built on first access and the dlib models are warmed up
+    in a background thread so the first recognized frame doesn't pay for it
+    """
+    def __init__(self, journal_path=None, kiosk_id=None):
+        self.journal_path = journal_path  # Punch journal / writer identity (None = config defaults)
+        self.kiosk_id = kiosk_id
+        self._lock = threading.RLock()
+        self._detector = None
+        self._db_manager = None
+        self._recognizer = None
+        self._spoof_detector = None
+        self._settings = None
+        
+        from profiler import LoopProfiler
+        self.profiler = LoopProfiler()
+        
+        self.ready = threading.Event()
+        self.warmup_error = None
+        self.warmup_seconds = None
+        self._warmup_thread = None
+    
+    @property
+    def detector(self):
+        with self._lock:
+            if self._detector is None:
+                from face_detector import FaceDetector
+                self._detector = FaceDetector()
+            return self._detector
+    
+    @property
+    def settings(self):
+        """Runtime settings store; components follow its changes"""
+        with self._lock:
+            if self._settings is None:
+                from runtime_settings import SettingsStore
+                self._settings = SettingsStore()
+            return self._settings
+    
+    @property
+    def db_manager(self):
+        with self._lock:
+            if self._db_manager is None:
+                from attendance_manager import AttendanceManager
+                self._db_manager = AttendanceManager(journal_path=self.journal_path, kiosk_id=self.kiosk_id)
+                self.settings.subscribe(self._db_manager.apply_settings)
+            return self._db_manager
+    
+    @property
+    def recognizer(self):
+        with self._lock:
+            if self._recognizer is None:
+                from face_recognizer import FaceRecognizer
+                self._recognizer = FaceRecognizer(self.detector, self.db_manager)
+                self.settings.subscribe(self._recognizer.apply_settings)
+            return self._recognizer
+    
+    @property
+    def spoof_detector(self):
+        with self._lock:
+            if self._spoof_detector is None:
+                from spoof_detector import SpoofDetector
+                self._spoof_detector = SpoofDetector()
+                self.settings.subscribe(self._spoof_detector.apply_settings)
+            return self._spoof_detector
+    
+    def warm_up(self):
+        """
+        Load the models and run a dummy detection, encoding and landmark pass
+        """
+        start = time.perf_counter()
+        
+        try:
+            detector = self.detector
+            self.recognizer
+            self.spoof_detector
+            
+            frame = np.zeros((config.FRAME_HEIGHT, config.FRAME_WIDTH, 3), dtype=np.uint8)
+            dummy_location = [(0, 150, 150, 0)]
+            
+            detector.detect_faces(frame)
+            detector.get_face_encodings(frame, dummy_location)
+            detector.get_facial_landmarks(frame, dummy_location)
+        except Exception as e:
+            self.warmup_error = str(e)
+            print(f"Error warming up models: {e}")
+        finally:
+            self.warmup_seconds = time.perf_counter() - start
+            self.ready.set()
+    
+    def start_warmup(self):
+        """Warm up the models in a background thread (once)"""
+        with self._lock:
+            if self._warmup_thread is None:
+                self._warmup_thread = threading.Thread(
+                    target=self.warm_up, name="model-warmup", daemon=True
+                )
+                self._warmup_thread.start()
+    
+    def is_ready(self):
+        """Check if the warm-up has finished"""
+        return self.ready.is_set()
+    
+    def components(self):
+        """Returns: (recognizer, detector, spoof_detector, db_manager)"""
+        return self.recognizer, self.detector, self.spoof_detector, self.db_manager
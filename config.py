@@ -1,4 +1,5 @@
 import os
+import socket
 
 # Project paths
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -15,21 +16,159 @@ FACE_RECOGNITION_TOLERANCE = 0.6  # Lower = more strict
 FACE_DETECTION_MODEL = 'hog'  # 'hog' or 'cnn' (cnn is more accurate but slower)
 NUMBER_OF_TIMES_TO_UPSAMPLE = 1
 
+# Gallery settings
+GALLERY_QUANTIZATION = None  # None, 'float16' or 'int8' - compact copy used for the coarse search
+GALLERY_RERANK_K = 32  # Candidates from the coarse search re-ranked with exact distances
+GALLERY_EXACT_ON_DISK = True  # With quantization, keep float32 encodings in a memory-mapped temp file
+GALLERY_COMPACTION_RATIO = 0.2  # Compact once this fraction of rows is tombstoned
+GALLERY_COMPACTION_MIN_ROWS = 64  # ...and at least this many rows are dead
+GALLERY_MAX_TEMPLATES = 5  # Captures per employee before they are clustered into prototypes
+GALLERY_IDENTITY_REDUCTION = 'min'  # 'min' or 'mean' distance over an employee's templates
+
+# Site partitioning settings
+SITE_ID = None  # Site of this deployment - new registrations are tagged with it
+GALLERY_PARTITION_BY = ('site', 'department')  # Enrollment fields that split the gallery into blocks
+KIOSK_SITES = None  # e.g. ['Pune'] - partitions searched first (None = any site)
+KIOSK_DEPARTMENTS = None  # e.g. ['Operations'] - (None = any department)
+
+# Gallery change log and sync settings
+GALLERY_LOG_PATH = os.path.join(DATA_DIR, 'gallery_log.db')
+KIOSK_ID = socket.gethostname()  # Origin of the changes recorded on this machine
+GALLERY_SYNC_DIR = None  # Shared directory for delta files, e.g. '/mnt/share/gallery'
+GALLERY_SYNC_INTERVAL = 5  # seconds - how often running recognizers check for changes
+GALLERY_SNAPSHOT_INTERVAL = 100  # Rewrite the encodings file after this many applied changes
+
+# Gallery audit settings
+AUDIT_DUPLICATE_DISTANCE = 0.35  # Different employees closer than this are probably one person
+AUDIT_BLOCK_ROWS = 1024  # Row block per task
+AUDIT_BLOCK_COLUMNS = 4096  # Distance block = rows x columns float32 (16 MB)
+AUDIT_WORKERS = None  # None = one worker thread per CPU core
+
+# Lighting preprocessing settings
+ADAPTIVE_PREPROCESSING = True  # Only enhance when the scene is dim, bright or flat
+LIGHTING_SAMPLE_SIZE = (64, 48)  # Downsampled size used for the luminance histogram
+LIGHTING_MIN_LUMINANCE = 70  # Mean luminance (0-255) below this = too dark
+LIGHTING_MAX_LUMINANCE = 200  # Mean luminance (0-255) above this = too bright
+LIGHTING_MIN_CONTRAST = 60  # 5th-95th percentile spread below this = too flat
+CLAHE_CLIP_LIMIT = 3.0
+CLAHE_TILE_GRID_SIZE = (8, 8)  # Used for full-frame enhancement
+CLAHE_ROI_TILE_GRID_SIZE = (4, 4)  # Used for face-region enhancement
+FACE_ROI_PADDING = 0.2  # Fraction of face size added around each enhanced region
+
+# Detection region settings
+# Per-camera region of interest and face size limits, keyed by camera index.
+# 'roi' is a (left, top, right, bottom) rectangle or a list of (x, y) polygon
+# points in full-frame pixels; detection runs on the bounding box of the ROI
+# and faces whose centre falls outside it are discarded.
+# Example: {0: {'roi': (160, 60, 480, 420), 'min_face_size': 100, 'max_face_size': 360}}
+CAMERA_DETECTION_REGIONS = {}
+MIN_FACE_SIZE = 0  # pixels - default for cameras without a setting (0 = no limit)
+MAX_FACE_SIZE = None  # pixels - default for cameras without a setting (None = no limit)
+HOG_MIN_DETECTABLE_FACE = 80  # pixels - smallest face the detector finds without upsampling
+
+# Tiled detection settings (high-resolution cameras)
+TILED_DETECTION = False  # Split large frames into overlapping tiles detected in parallel
+TILE_MIN_FRAME_PIXELS = 1280 * 720  # Smaller detection images are scanned in one piece
+TILE_GRID = None  # (rows, cols), None = one tile per worker
+TILE_OVERLAP = 160  # pixels - must exceed the largest face in the detection image
+DETECTION_WORKERS = None  # None = one worker per CPU core
+DETECTION_POOL = 'process'  # 'process' or 'thread'
+NMS_OVERLAP_THRESHOLD = 0.5  # Boxes overlapping more than this (of the smaller box) are merged
+
+# Enrollment image store
+FACE_CROP_SIZE = 256  # pixels - stored captures are square, eye-aligned face crops
+FACE_CROP_PADDING = 0.3  # Fraction of face size added around the crop
+FACE_THUMBNAIL_SIZE = 64  # pixels
+FACE_IMAGE_JPEG_QUALITY = 85
+FACE_STORE_QUEUE_SIZE = 32  # Pending image writes before registration waits for the disk
+
+# Bulk enrollment
+ENROLL_WORKERS = None  # None = one worker process per CPU core
+ENROLL_MAX_IMAGE_SIDE = 1600  # Larger photos are downscaled before detection
+ENROLL_IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
 # Attendance settings
+TIMEZONE = 'Asia/Kolkata'  # Punches are stored as UTC epochs and shown in this timezone
 MIN_TIME_BETWEEN_PUNCHES = 30  # seconds - prevent accidental double entries
 WORK_START_TIME = "09:00:00"
 WORK_END_TIME = "18:00:00"
+ATTENDANCE_ARCHIVE_DIR = os.path.join(DATA_DIR, 'archive')  # Compressed read-only closed months
+ATTENDANCE_HOT_MONTHS = 3  # Months kept in the live database (including the current one)
+ATTENDANCE_ARCHIVE_CACHE_MONTHS = 6  # Decompressed archived months kept on disk for reports (least recently read go first)
+ATTENDANCE_ARCHIVE_ATTACH_BATCH = 8  # Archived months attached per query step (SQLite allows 10 attached databases)
+QUERY_CACHE_SIZE = 64  # Dashboard/report query results kept per process, LRU (0 = no cache)
+
+# Punch journal settings
+PUNCH_JOURNAL_ENABLED = True  # Journal punches before acknowledging them, then apply to the database
+PUNCH_JOURNAL_PATH = os.path.join(DATA_DIR, 'punch_journal.bin')  # Locked by one process; others use punch_journal.1.bin, ...
+JOURNAL_FSYNC_INTERVAL = 0.05  # seconds - punches written within this window share one fsync (0 = every punch)
+JOURNAL_APPLY_TIMEOUT = 0.1  # seconds - wait for a locked database before leaving a punch journaled
+JOURNAL_MAX_BYTES = 1024 * 1024  # Rewrite the journal without applied punches beyond this size
+JOURNAL_MAX_WRITERS = 16  # Processes on one host that can journal punches at the same time
+JOURNAL_REPLAY_INTERVAL = 5  # seconds - how often the camera loop retries unapplied punches
+
+# Runtime settings (tolerance, consecutive frames, liveness checks and punch
+# interval can be changed from the Settings page without a restart; the values
+# above are the defaults until the first save)
+RUNTIME_SETTINGS_PATH = os.path.join(DATA_DIR, 'runtime_settings.json')
+RUNTIME_SETTINGS_POLL_INTERVAL = 2  # seconds - how often running kiosks check for changes
 
 # Spoof detection settings
 ENABLE_BLINK_DETECTION = True
 ENABLE_MOVEMENT_DETECTION = True
 CONSECUTIVE_FRAMES_FOR_RECOGNITION = 3
 
+# Temporal fusion settings
+# Each tracked face accumulates evidence; a frame matching at
+# (tolerance - FUSION_DISTANCE_SCALE) adds one unit, closer matches add more.
+# Every frame within tolerance adds at least 1/(FUSION_MAX_FRAMES // 2) of the
+# threshold, so steady borderline matches still commit before fusion restarts.
+# Attendance is marked once evidence reaches CONSECUTIVE_FRAMES_FOR_RECOGNITION.
+TRACK_IOU_THRESHOLD = 0.3  # Minimum box overlap to continue a track
+TRACK_MAX_MISSED_FRAMES = 5  # Frames a track survives without a detection
+TRACK_MAX_IDENTITY_MISMATCHES = 2  # A committed track restarts after this many frames in a row of someone else
+FUSION_MIN_FRAMES = 2  # Never commit on a single frame
+FUSION_MAX_FRAMES = 15  # Restart fusion if still undecided after this many frames
+FUSION_DISTANCE_SCALE = 0.1
+FUSION_MIN_MARGIN = 0.05  # Runner-up identity must be at least this much further away
+FUSION_REFERENCE_FACE_SIZE = 150  # pixels - faces this big or bigger get full weight
+
+# Instrumentation settings
+METRICS_ENABLED = True  # Stage timers and counters (near-zero cost when off)
+METRICS_HTTP_PORT = None  # e.g. 9108 to serve Prometheus text at /metrics
+METRICS_HTTP_HOST = '127.0.0.1'  # Bind address - '0.0.0.0' exposes the metrics to the network
+METRICS_DUMP_PATH = os.path.join(LOGS_DIR, 'metrics.prom')
+METRICS_DUMP_INTERVAL = 30  # seconds - how often the camera loop writes the dump file
+
+# Profiling settings
+PROFILE_DEFAULT_SECONDS = 10  # Capture length when neither seconds nor frames are given
+PROFILE_TOP_FUNCTIONS = 5  # Hot functions listed per module group
+
 # Camera settings
 CAMERA_INDEX = 0  # Default camera
 FRAME_WIDTH = 640
 FRAME_HEIGHT = 480
 
+# UI preview settings
+PREVIEW_MAX_FPS = 10  # Camera preview updates sent to the browser per second (0 = every frame)
+PREVIEW_MAX_WIDTH = 480  # pixels - preview is downscaled to this width (None = full size)
+PREVIEW_JPEG_QUALITY = 75
+
+# Recognition service settings (recognition_service.py)
+SERVICE_HOST = '127.0.0.1'
+SERVICE_PORT = 8600
+SERVICE_WORKERS = 4  # Threads decoding images, detecting / encoding faces and marking punches
+SERVICE_QUEUE_SIZE = 64  # Requests waiting per stage; further requests get 503
+SERVICE_BATCH_SIZE = 32  # Max requests matched against the gallery in one pass
+SERVICE_BATCH_WAIT = 0.002  # seconds - how long a batch waits for more requests
+SERVICE_MAX_BODY_BYTES = 10 * 1024 * 1024
+SERVICE_PUNCH_JOURNAL_PATH = os.path.join(DATA_DIR, 'punch_journal_service.bin')  # Not shared with the kiosk UI
+SERVICE_KIOSK_ID = f"{KIOSK_ID}-service"  # Writer identity of the service's punch journal
+# POST /punch checks liveness on one uploaded image, where the blink and movement
+# checks can't run - a printed photo or screen replay of an employee can punch them.
+# Only enable it behind a client that does its own liveness check.
+SERVICE_PUNCH_ENABLED = False
+
 # Create directories if they don't exist
 os.makedirs(DATA_DIR, exist_ok=True)
 os.makedirs(FACES_DIR, exist_ok=True)
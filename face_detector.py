@@ -1,30 +1,315 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import cv2
-import face_recognition
 import numpy as np
 import config
+from metrics import metrics, timed
+
+# face_recognition loads the dlib models when imported, so it is deferred to first use
+face_recognition = None
+
+def load_face_recognition():
+    """
+    Import face_recognition (and load the dlib models) on first use
+    """
+    global face_recognition
+    
+    if face_recognition is None:
+        import face_recognition as module
+        face_recognition = module
+    
+    return face_recognition
+
+# CLAHE operators are expensive to build, so they are shared per settings.
+# apply() writes into the operator's own buffers, so each thread gets its own.
+_clahe_cache = threading.local()
+
+def get_clahe(clip_limit=None, tile_grid_size=None):
+    """
+    Get the calling thread's cached CLAHE operator for the given settings
+    """
+    clip_limit = config.CLAHE_CLIP_LIMIT if clip_limit is None else clip_limit
+    tile_grid_size = tuple(tile_grid_size or config.CLAHE_TILE_GRID_SIZE)
+    
+    operators = getattr(_clahe_cache, 'operators', None)
+    if operators is None:
+        operators = _clahe_cache.operators = {}
+    
+    key = (clip_limit, tile_grid_size)
+    clahe = operators.get(key)
+    
+    if clahe is None:
+        clahe = cv2.createCLAHE(clipLimit=clip_limit, tileGridSize=tile_grid_size)
+        operators[key] = clahe
+    
+    return clahe
+
+def tile_grid(height, width, tiles):
+    """
+    Pick the (rows, cols) grid with the most square tiles for the given tile count
+    """
+    grids = [(tiles // cols, cols) for cols in range(1, tiles + 1) if tiles % cols == 0]
+    
+    return min(
+        grids,
+        key=lambda grid: abs(np.log((width / float(grid[1])) / (height / float(grid[0]))))
+    )
+
+def split_tiles(height, width, grid, overlap):
+    """
+    Split an image into a grid of tiles that overlap by `overlap` pixels
+    Returns: list of (top, left, bottom, right)
+    """
+    rows, cols = grid
+    half = overlap // 2
+    
+    def spans(length, parts):
+        edges = [int(round(length * i / float(parts))) for i in range(parts + 1)]
+        return [
+            (max(0, edges[i] - half), min(length, edges[i + 1] + half))
+            for i in range(parts)
+        ]
+    
+    return [
+        (top, left, bottom, right)
+        for top, bottom in spans(height, rows)
+        for left, right in spans(width, cols)
+    ]
+
+def non_max_suppression(face_locations, overlap_threshold):
+    """
+    Merge duplicate detections from overlapping tiles
+    Overlap is measured against the smaller box, so partial faces cut at a tile
+    edge are dropped in favour of the full detection from the neighbouring tile
+    """
+    if len(face_locations) < 2:
+        return list(face_locations)
+    
+    boxes = np.array(face_locations, dtype=np.float64)
+    top, right, bottom, left = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    areas = (bottom - top) * (right - left)
+    order = np.argsort(-areas)
+    
+    keep = []
+    while len(order) > 0:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        
+        inter_h = np.maximum(0, np.minimum(bottom[i], bottom[rest]) - np.maximum(top[i], top[rest]))
+        inter_w = np.maximum(0, np.minimum(right[i], right[rest]) - np.maximum(left[i], left[rest]))
+        overlap = inter_h * inter_w / np.minimum(areas[i], areas[rest])
+        
+        order = rest[overlap <= overlap_threshold]
+    
+    return [face_locations[i] for i in sorted(keep)]
+
+def detect_tile(rgb_tile, offset, upsample_times, model):
+    """
+    Detect faces in one tile and shift them to image coordinates
+    Module level so it can run in a worker process
+    """
+    offset_y, offset_x = offset
+    locations = load_face_recognition().face_locations(
+        rgb_tile,
+        number_of_times_to_upsample=upsample_times,
+        model=model
+    )
+    
+    return [
+        (top + offset_y, right + offset_x, bottom + offset_y, left + offset_x)
+        for top, right, bottom, left in locations
+    ]
 
 class FaceDetector:
-    def __init__(self):
+    def __init__(self, camera_index=None):
         self.detection_model = config.FACE_DETECTION_MODEL
         self.upsample_times = config.NUMBER_OF_TIMES_TO_UPSAMPLE
+        self.camera_index = config.CAMERA_INDEX if camera_index is None else camera_index
+        self.configure_region(config.CAMERA_DETECTION_REGIONS.get(self.camera_index, {}))
+        
+        # No per-call scratch buffers: the recognition service detects on several
+        # threads with one detector, so every call works on arrays it owns
+        self._tile_pool_lock = threading.Lock()
+        self._tile_pool = None
+        self._tile_workers = 1
+    
+    @property
+    def frame_clahe(self):
+        return get_clahe(tile_grid_size=config.CLAHE_TILE_GRID_SIZE)
+    
+    @property
+    def roi_clahe(self):
+        return get_clahe(tile_grid_size=config.CLAHE_ROI_TILE_GRID_SIZE)
+    
+    def configure_region(self, settings):
+        """
+        Set the region of interest and face size limits for this camera
+        Picks the detection scale / upsampling from the minimum face size
+        """
+        roi = settings.get('roi')
+        self.min_face_size = settings.get('min_face_size', config.MIN_FACE_SIZE) or 0
+        self.max_face_size = settings.get('max_face_size', config.MAX_FACE_SIZE)
+        
+        self.roi_polygon = None
+        self.roi_rect = None
+        
+        if roi is not None:
+            if len(roi) == 4 and np.isscalar(roi[0]):
+                left, top, right, bottom = roi
+            else:
+                self.roi_polygon = np.array(roi, dtype=np.int32).reshape(-1, 1, 2)
+                x, y, w, h = cv2.boundingRect(self.roi_polygon)
+                left, top, right, bottom = x, y, x + w, y + h
+            self.roi_rect = (int(left), int(top), int(right), int(bottom))
+        
+        # Faces bigger than the detector's minimum let us shrink the search image;
+        # smaller ones need the detector's own 2x upsampling
+        base = config.HOG_MIN_DETECTABLE_FACE
+        self.detection_scale = 1.0
+        self.region_upsample_times = self.upsample_times
+        
+        if self.min_face_size >= base:
+            self.detection_scale = base / float(self.min_face_size)
+            self.region_upsample_times = 0
+        elif self.min_face_size > 0:
+            self.region_upsample_times = int(np.ceil(np.log2(base / float(self.min_face_size))))
+    
+    def is_face_allowed(self, face_location):
+        """
+        Check a detection against the face size limits and ROI polygon
+        """
+        top, right, bottom, left = face_location
+        size = max(bottom - top, right - left)
+        
+        if size < self.min_face_size:
+            return False
+        
+        if self.max_face_size is not None and size > self.max_face_size:
+            return False
+        
+        if self.roi_polygon is not None:
+            center = (float(left + right) / 2, float(top + bottom) / 2)
+            if cv2.pointPolygonTest(self.roi_polygon, center, False) < 0:
+                return False
+        
+        return True
     
-    def detect_faces(self, frame):
+    @timed('detector.detect_faces')
+    def detect_faces(self, frame, apply_region=True, enhance=None):
         """
         Detect faces in a frame
+        Only the configured ROI is scanned unless apply_region is False
+        enhance is the needs_enhancement() result for the frame when the caller
+        already has it (None = estimate the lighting here)
         Returns: list of face locations [(top, right, bottom, left), ...]
         """
-        # Convert BGR (OpenCV) to RGB (face_recognition)
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        if not apply_region:
+            rgb_frame = self.detection_input(frame, enhance)
+            
+            return load_face_recognition().face_locations(
+                rgb_frame,
+                number_of_times_to_upsample=self.upsample_times,
+                model=self.detection_model
+            )
+        
+        height, width = frame.shape[:2]
+        offset_x, offset_y = 0, 0
+        region = frame
+        
+        # Crop to the ROI before any colour conversion or resizing
+        if self.roi_rect is not None:
+            left, top, right, bottom = self.roi_rect
+            offset_x, offset_y = max(0, left), max(0, top)
+            region = frame[offset_y:min(height, bottom), offset_x:min(width, right)]
+            
+            if region.size == 0:
+                return []
+        
+        scale = self.detection_scale
+        if scale < 1.0:
+            region = cv2.resize(region, (0, 0), fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        
+        rgb_region = self.detection_input(region, enhance)
         
         # Detect face locations
-        face_locations = face_recognition.face_locations(
-            rgb_frame,
-            number_of_times_to_upsample=self.upsample_times,
-            model=self.detection_model
-        )
+        if config.TILED_DETECTION and rgb_region.shape[0] * rgb_region.shape[1] >= config.TILE_MIN_FRAME_PIXELS:
+            region_locations = self.detect_faces_tiled(rgb_region, self.region_upsample_times)
+        else:
+            region_locations = load_face_recognition().face_locations(
+                rgb_region,
+                number_of_times_to_upsample=self.region_upsample_times,
+                model=self.detection_model
+            )
+        
+        face_locations = []
+        
+        for top, right, bottom, left in region_locations:
+            # Map back to full-frame coordinates
+            face_location = (
+                max(0, int(round(top / scale)) + offset_y),
+                min(width, int(round(right / scale)) + offset_x),
+                min(height, int(round(bottom / scale)) + offset_y),
+                max(0, int(round(left / scale)) + offset_x),
+            )
+            
+            # Discard detections outside the constraints before they are encoded
+            if self.is_face_allowed(face_location):
+                face_locations.append(face_location)
         
         return face_locations
     
+    def get_tile_pool(self):
+        """Create the tile worker pool on first use"""
+        with self._tile_pool_lock:
+            if self._tile_pool is None:
+                self._tile_workers = config.DETECTION_WORKERS or os.cpu_count() or 1
+                
+                if config.DETECTION_POOL == 'thread':
+                    self._tile_pool = ThreadPoolExecutor(max_workers=self._tile_workers)
+                else:
+                    self._tile_pool = ProcessPoolExecutor(max_workers=self._tile_workers)
+            
+            return self._tile_pool
+    
+    def detect_faces_tiled(self, rgb_image, upsample_times=None):
+        """
+        Detect faces in overlapping tiles in parallel and merge the results
+        Returns: list of face locations [(top, right, bottom, left), ...]
+        """
+        if upsample_times is None:
+            upsample_times = self.upsample_times
+        
+        height, width = rgb_image.shape[:2]
+        pool = self.get_tile_pool()
+        grid = config.TILE_GRID or tile_grid(height, width, self._tile_workers)
+        tiles = split_tiles(height, width, grid, config.TILE_OVERLAP)
+        
+        futures = [
+            pool.submit(
+                detect_tile,
+                np.ascontiguousarray(rgb_image[top:bottom, left:right]),
+                (top, left),
+                upsample_times,
+                self.detection_model
+            )
+            for top, left, bottom, right in tiles
+        ]
+        
+        face_locations = []
+        for future in futures:
+            face_locations.extend(future.result())
+        
+        return non_max_suppression(face_locations, config.NMS_OVERLAP_THRESHOLD)
+    
+    def close(self):
+        """Shut down the tile worker pool"""
+        if self._tile_pool is not None:
+            self._tile_pool.shutdown()
+            self._tile_pool = None
+    
+    @timed('detector.get_face_encodings')
     def get_face_encodings(self, frame, face_locations=None):
         """
         Generate 128D face encodings for detected faces
@@ -35,13 +320,14 @@ class FaceDetector:
             face_locations = self.detect_faces(frame)
         
         # Generate encodings
-        encodings = face_recognition.face_encodings(
+        encodings = load_face_recognition().face_encodings(
             rgb_frame,
             known_face_locations=face_locations
         )
         
         return encodings
     
+    @timed('detector.get_facial_landmarks')
     def get_facial_landmarks(self, frame, face_locations=None):
         """
         Get facial landmarks (68 points) for each face
@@ -52,7 +338,7 @@ class FaceDetector:
         if face_locations is None:
             face_locations = self.detect_faces(frame)
         
-        landmarks = face_recognition.face_landmarks(
+        landmarks = load_face_recognition().face_landmarks(
             rgb_frame,
             face_locations=face_locations
         )
@@ -77,24 +363,113 @@ class FaceDetector:
         
         return frame
     
-    def preprocess_frame(self, frame):
+    def estimate_lighting(self, frame):
+        """
+        Estimate scene luminance and contrast from a downsampled histogram
+        Returns: (mean_luminance, contrast) on a 0-255 scale
+        """
+        small = cv2.resize(frame, config.LIGHTING_SAMPLE_SIZE, interpolation=cv2.INTER_AREA)
+        
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+        
+        hist = cv2.calcHist([gray], [0], None, [256], [0, 256]).ravel()
+        cdf = np.cumsum(hist) / hist.sum()
+        
+        mean_luminance = float(np.dot(hist, np.arange(256)) / hist.sum())
+        
+        # Spread between the 5th and 95th percentile is robust to specular highlights
+        low = int(np.searchsorted(cdf, 0.05))
+        high = int(np.searchsorted(cdf, 0.95))
+        contrast = float(high - low)
+        
+        return mean_luminance, contrast
+    
+    def needs_enhancement(self, frame):
+        """
+        Check if the scene is too dark, too bright or too flat
+        """
+        if not config.ADAPTIVE_PREPROCESSING:
+            return True
+        
+        mean_luminance, contrast = self.estimate_lighting(frame)
+        
+        return (
+            mean_luminance < config.LIGHTING_MIN_LUMINANCE or
+            mean_luminance > config.LIGHTING_MAX_LUMINANCE or
+            contrast < config.LIGHTING_MIN_CONTRAST
+        )
+    
+    def detection_input(self, image, enhance=None):
+        """
+        RGB image for the detector (face_recognition)
+        Dim, bright or flat scenes are enhanced as a whole here, on the small
+        detection image, since HOG can't find faces it can't see; encoding
+        keeps the face-region enhancement of preprocess_frame()
+        """
+        if enhance is None:
+            enhance = self.needs_enhancement(image)
+        
+        if enhance:
+            image = self.enhance_region(image.copy(), self.frame_clahe)
+            metrics.inc('detection_inputs_enhanced')
+        
+        # Convert BGR (OpenCV) to RGB (face_recognition)
+        return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    
+    def enhance_region(self, region, clahe):
+        """
+        Apply CLAHE to the L channel of a BGR region in place
+        """
+        lab = cv2.cvtColor(region, cv2.COLOR_BGR2LAB)
+        l_channel = np.ascontiguousarray(lab[:, :, 0])
+        clahe.apply(l_channel, dst=l_channel)
+        lab[:, :, 0] = l_channel
+        region[:] = cv2.cvtColor(lab, cv2.COLOR_LAB2BGR)
+        
+        return region
+    
+    @timed('detector.preprocess_frame')
+    def preprocess_frame(self, frame, face_locations=None, enhance=None):
         """
         Preprocess frame for better face detection
         Handles lighting variations
+        
+        Well-lit frames are returned unchanged. When face_locations are given
+        only the (padded) face regions are enhanced, otherwise the full frame is.
+        enhance is the needs_enhancement() result for the frame when the caller
+        already has it (None = estimate the lighting here).
+        An enhanced frame is a new array owned by the caller; the input frame is
+        never modified.
         """
-        # Convert to LAB color space
-        lab = cv2.cvtColor(frame, cv2.COLOR_BGR2LAB)
-        l, a, b = cv2.split(lab)
+        if enhance is None:
+            enhance = self.needs_enhancement(frame)
+        
+        if not enhance:
+            return frame
+        
+        if face_locations is not None and len(face_locations) == 0:
+            return frame
         
-        # Apply CLAHE to L channel
-        clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8, 8))
-        l = clahe.apply(l)
+        enhanced = frame.copy()
+        
+        if face_locations is None:
+            return self.enhance_region(enhanced, self.frame_clahe)
         
-        # Merge channels
-        lab = cv2.merge([l, a, b])
+        height, width = frame.shape[:2]
         
-        # Convert back to BGR
-        enhanced = cv2.cvtColor(lab, cv2.COLOR_LAB2BGR)
+        for top, right, bottom, left in face_locations:
+            pad_y = int((bottom - top) * config.FACE_ROI_PADDING)
+            pad_x = int((right - left) * config.FACE_ROI_PADDING)
+            
+            top = max(0, top - pad_y)
+            bottom = min(height, bottom + pad_y)
+            left = max(0, left - pad_x)
+            right = min(width, right + pad_x)
+            
+            if bottom <= top or right <= left:
+                continue
+            
+            self.enhance_region(enhanced[top:bottom, left:right], self.roi_clahe)
         
         return enhanced
     
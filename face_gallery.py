@@ -0,0 +1,878 @@
+import tempfile
+import threading
+import numpy as np
+import config
+from metrics import metrics
+
+ENCODING_SIZE = 128
+COARSE_CHUNK_ROWS = 4096  # Rows dequantized at a time (stays in cache)
+
+def cluster_prototypes(encodings, k, iterations=10):
+    """
+    Cluster encodings into at most k prototypes with k-means
+    Seeds are picked farthest-first from the encoding closest to the mean, so the
+    result is deterministic and covers distinct captures (e.g. with/without glasses)
+    Returns: array of prototypes
+    """
+    if len(encodings) <= k:
+        return encodings
+    
+    seeds = [int(np.argmin(np.linalg.norm(encodings - encodings.mean(axis=0), axis=1)))]
+    nearest = np.linalg.norm(encodings - encodings[seeds[0]], axis=1)
+    while len(seeds) < k:
+        seeds.append(int(np.argmax(nearest)))
+        nearest = np.minimum(nearest, np.linalg.norm(encodings - encodings[seeds[-1]], axis=1))
+    
+    centroids = encodings[seeds].copy()
+    for _ in range(iterations):
+        distances = np.linalg.norm(encodings[:, None, :] - centroids[None, :, :], axis=2)
+        labels = np.argmin(distances, axis=1)
+        updated = np.array([
+            encodings[labels == cluster].mean(axis=0) if np.any(labels == cluster) else centroids[cluster]
+            for cluster in range(len(centroids))
+        ])
+        if np.allclose(updated, centroids):
+            break
+        centroids = updated
+    
+    return centroids.astype(np.float32)
+
+class FaceGallery:
+    """
+    Known face encodings in one contiguous float32 buffer
+    
+    An employee can have several templates (rows); searches reduce row distances
+    per identity, and add_template() clusters an employee's templates down to
+    GALLERY_MAX_TEMPLATES prototypes so the gallery stays bounded.
+    
+    Rows are looked up per employee through a hash map. Deleting an employee
+    tombstones their rows (their norms become inf, so searches skip them without
+    a mask) and a background compaction drops dead rows in batches.
+    
+    With quantization ('float16' or 'int8') a compact copy of the gallery is kept
+    in memory; searches scan the compact copy and re-rank the closest candidates
+    against the float32 encodings, which then live in a file-backed buffer
+    (GALLERY_EXACT_ON_DISK) so only the re-ranked rows are paged in.
+    """
+    def __init__(self, quantization=None, rerank_k=None, exact_on_disk=None):
+        self.quantization = quantization if quantization is not None else config.GALLERY_QUANTIZATION
+        self.rerank_k = rerank_k or config.GALLERY_RERANK_K
+        self.max_templates = config.GALLERY_MAX_TEMPLATES
+        self.reduction = config.GALLERY_IDENTITY_REDUCTION
+        
+        if exact_on_disk is None:
+            exact_on_disk = config.GALLERY_EXACT_ON_DISK
+        self._exact_on_disk = bool(self.quantization and exact_on_disk)
+        self._exact_file = self._new_exact_file()
+        
+        self._lock = threading.RLock()
+        self._compaction_thread = None
+        self.version = 0  # Bumped on every change
+        
+        self._reset()
+        
+        # Quantized copy
+        self._codes = None
+        self._code_norms = None
+        self._scale = None
+        self._chunk = None
+    
+    def _reset(self):
+        self._capacity = 0
+        self._size = 0
+        self._deleted = 0
+        self._encodings = self._allocate(0)
+        self._norms = np.empty(0, dtype=np.float32)
+        self._identities = np.empty(0, dtype=np.int32)
+        
+        self.names = []
+        self.employee_ids = []
+        self._identity_index = {}
+        self._rows_by_id = {}
+    
+    def __len__(self):
+        """Number of live rows (templates)"""
+        return self._size - self._deleted
+    
+    @property
+    def encodings(self):
+        """
+        Float32 view of all rows, including tombstoned ones
+        Rows follow names / employee_ids; see live_rows()
+        """
+        return self._encodings[:self._size]
+    
+    def live_rows(self):
+        """Row indices that are not tombstoned"""
+        return np.flatnonzero(np.isfinite(self._norms[:self._size]))
+    
+    def identity_count(self):
+        """Number of employees with at least one row"""
+        return len(self._rows_by_id)
+    
+    def has_employee(self, employee_id):
+        return employee_id in self._rows_by_id
+    
+    def rows_for(self, employee_id):
+        """Live rows of an employee (O(1) lookup)"""
+        return list(self._rows_by_id.get(employee_id, []))
+    
+    def _new_exact_file(self):
+        if not self._exact_on_disk:
+            return None
+        # Unlinked on creation (POSIX), so it disappears with the process
+        return tempfile.TemporaryFile(dir=config.DATA_DIR, prefix='gallery_', suffix='.f32')
+    
+    def _allocate(self, capacity, exact_file=None):
+        """
+        Float32 encodings buffer - memory-mapped on the temporary file when the
+        exact encodings are kept on disk (existing rows are preserved on growth)
+        """
+        exact_file = exact_file or self._exact_file
+        
+        if exact_file is None:
+            return np.empty((capacity, ENCODING_SIZE), dtype=np.float32)
+        
+        exact_file.truncate(max(capacity, 1) * ENCODING_SIZE * 4)
+        return np.memmap(exact_file, dtype=np.float32, mode='r+', shape=(max(capacity, 1), ENCODING_SIZE))
+    
+    def _grow(self, needed):
+        """Grow buffers geometrically so appends are amortized O(1)"""
+        if needed <= self._capacity:
+            return
+        
+        capacity = max(needed, 2 * self._capacity, 16)
+        self._capacity = capacity
+        
+        if self._exact_file is None:
+            encodings = self._allocate(capacity)
+            encodings[:self._size] = self._encodings[:self._size]
+            self._encodings = encodings
+        else:
+            self._encodings = self._allocate(capacity)
+        
+        self._norms = np.resize(self._norms, capacity)
+        self._identities = np.resize(self._identities, capacity)
+        
+        if self._codes is not None:
+            codes = np.empty((capacity, ENCODING_SIZE), dtype=self._codes.dtype)
+            codes[:self._size] = self._codes[:self._size]
+            self._codes = codes
+            self._code_norms = np.resize(self._code_norms, capacity)
+    
+    def _identity(self, employee_id):
+        identity = self._identity_index.get(employee_id)
+        if identity is None:
+            identity = len(self._identity_index)
+            self._identity_index[employee_id] = identity
+        return identity
+    
+    def add(self, encoding, name, employee_id):
+        """
+        Append an encoding (amortized O(1))
+        Returns: row index
+        """
+        with self._lock:
+            row = self._size
+            self._grow(row + 1)
+            
+            encoding = np.asarray(encoding, dtype=np.float32)
+            self._encodings[row] = encoding
+            self._norms[row] = np.dot(encoding, encoding)
+            self._identities[row] = self._identity(employee_id)
+            self.names.append(name)
+            self.employee_ids.append(employee_id)
+            self._rows_by_id.setdefault(employee_id, []).append(row)
+            self._size += 1
+            self.version += 1
+            
+            if self.quantization:
+                self._quantize_row(row)
+            
+            return row
+    
+    def load(self, encodings, names, employee_ids):
+        """Replace the gallery contents"""
+        encodings = np.asarray(encodings, dtype=np.float32).reshape(-1, ENCODING_SIZE)
+        
+        with self._lock:
+            self._reset()
+            self._size = len(encodings)
+            self._capacity = self._size
+            self._encodings = self._allocate(self._size)
+            self._encodings[:self._size] = encodings
+            self._norms = np.einsum('ij,ij->i', encodings, encodings)
+            
+            self.names = list(names)
+            self.employee_ids = list(employee_ids)
+            self._identities = np.array(
+                [self._identity(employee_id) for employee_id in self.employee_ids], dtype=np.int32
+            )
+            for row, employee_id in enumerate(self.employee_ids):
+                self._rows_by_id.setdefault(employee_id, []).append(row)
+            
+            self.version += 1
+            self.build_quantized()
+    
+    def _tombstone(self, rows):
+        """Mark rows dead (their norms become inf)"""
+        for row in rows:
+            self._norms[row] = np.inf
+            if self._codes is not None:
+                self._code_norms[row] = np.inf
+        
+        self._deleted += len(rows)
+        if rows:
+            self.version += 1
+    
+    def remove_row(self, row):
+        """Tombstone one row (O(templates of its employee))"""
+        with self._lock:
+            if not np.isfinite(self._norms[row]):
+                return
+            
+            employee_id = self.employee_ids[row]
+            rows = self._rows_by_id.get(employee_id, [])
+            if row in rows:
+                rows.remove(row)
+            if not rows:
+                self._rows_by_id.pop(employee_id, None)
+            
+            self._tombstone([row])
+        
+        self.maybe_compact()
+    
+    def remove_employee(self, employee_id):
+        """
+        Tombstone every row of an employee (O(templates))
+        Returns: number of rows removed
+        """
+        with self._lock:
+            rows = self._rows_by_id.pop(employee_id, [])
+            self._tombstone(rows)
+        
+        self.maybe_compact()
+        return len(rows)
+    
+    def add_template(self, encoding, name, employee_id):
+        """
+        Add another capture of an employee; once they have more than
+        max_templates, their templates are clustered down to prototypes
+        Returns: number of templates the employee has
+        """
+        with self._lock:
+            self.add(encoding, name, employee_id)
+            
+            if self.max_templates and len(self._rows_by_id[employee_id]) > self.max_templates:
+                self.compact_templates(employee_id)
+            
+            return len(self._rows_by_id[employee_id])
+    
+    def compact_templates(self, employee_id, k=None):
+        """
+        Replace an employee's templates with at most k prototypes (k-means centroids)
+        Returns: number of templates the employee has
+        """
+        k = k or self.max_templates
+        
+        with self._lock:
+            rows = self._rows_by_id.get(employee_id, [])
+            if len(rows) <= k:
+                return len(rows)
+            
+            name = self.names[rows[-1]]
+            prototypes = cluster_prototypes(np.array(self._encodings[rows]), k)
+            
+            self._rows_by_id.pop(employee_id)
+            self._tombstone(rows)
+            
+            for prototype in prototypes:
+                self.add(prototype, name, employee_id)
+        
+        self.maybe_compact()
+        return len(prototypes)
+    
+    def maybe_compact(self):
+        """Start a background compaction once enough rows are tombstoned"""
+        if self._deleted < config.GALLERY_COMPACTION_MIN_ROWS:
+            return
+        if self._deleted < config.GALLERY_COMPACTION_RATIO * self._size:
+            return
+        
+        with self._lock:
+            if self._compaction_thread is not None and self._compaction_thread.is_alive():
+                return
+            self._compaction_thread = threading.Thread(
+                target=self.compact, name="gallery-compaction", daemon=True
+            )
+            self._compaction_thread.start()
+    
+    def compact(self):
+        """
+        Drop tombstoned rows
+        The new buffers are built without holding the lock; if the gallery changed
+        meanwhile the result is discarded and the next deletion retries.
+        Returns: True if the compacted buffers were installed
+        """
+        with self._lock:
+            version = self.version
+            live = self.live_rows()
+            size = self._size
+            encodings = self._encodings
+            norms = self._norms
+            names = self.names
+            employee_ids = self.employee_ids
+        
+        if len(live) == size:
+            return False
+        
+        exact_file = self._new_exact_file()
+        new_encodings = self._allocate(len(live), exact_file)
+        new_encodings[:len(live)] = encodings[live]
+        new_norms = norms[live]
+        new_names = [names[row] for row in live]
+        new_employee_ids = [employee_ids[row] for row in live]
+        
+        with self._lock:
+            if self.version != version:
+                if exact_file is not None:
+                    exact_file.close()
+                return False
+            
+            old_file = self._exact_file
+            self._exact_file = exact_file
+            
+            self._reset_rows(new_encodings, new_norms, new_names, new_employee_ids)
+            self.build_quantized()
+            self.version += 1
+        
+        if old_file is not None:
+            old_file.close()
+        
+        return True
+    
+    def _reset_rows(self, encodings, norms, names, employee_ids):
+        """Install compacted buffers and rebuild the id -> rows map"""
+        self._size = len(names)
+        self._capacity = max(self._size, 1) if self._exact_file is not None else self._size
+        self._deleted = 0
+        self._encodings = encodings
+        self._norms = norms
+        self.names = names
+        self.employee_ids = employee_ids
+        
+        self._identity_index = {}
+        self._identities = np.array(
+            [self._identity(employee_id) for employee_id in employee_ids], dtype=np.int32
+        )
+        self._rows_by_id = {}
+        for row, employee_id in enumerate(employee_ids):
+            self._rows_by_id.setdefault(employee_id, []).append(row)
+    
+    def to_dict(self):
+        """Serializable form of the live rows (same keys as the original encodings file)"""
+        with self._lock:
+            live = self.live_rows()
+            return {
+                'encodings': np.array(self.encodings[live]),
+                'names': [self.names[row] for row in live],
+                'employee_ids': [self.employee_ids[row] for row in live],
+            }
+    
+    def build_quantized(self):
+        """(Re)build the quantized copy from the float32 encodings"""
+        if not self.quantization or self._size == 0:
+            self._codes = None
+            self._code_norms = None
+            self._scale = None
+            return
+        
+        encodings = self.encodings
+        live = np.isfinite(self._norms[:self._size])
+        
+        if self.quantization == 'int8':
+            # Per-dimension scale with headroom for later enrollments
+            reference = encodings[live] if live.any() else encodings
+            self._scale = (np.abs(reference).max(axis=0) * 1.25 / 127.0).astype(np.float32)
+            self._scale[self._scale == 0] = 1.0 / 127.0
+            codes = np.clip(np.round(encodings / self._scale), -127, 127).astype(np.int8)
+            dequantized = codes.astype(np.float32) * self._scale
+        elif self.quantization == 'float16':
+            codes = encodings.astype(np.float16)
+            dequantized = codes.astype(np.float32)
+        else:
+            raise ValueError(f"Unknown gallery quantization: {self.quantization}")
+        
+        # Sized to the full capacity so later appends don't reallocate
+        self._codes = np.empty((self._capacity, ENCODING_SIZE), dtype=codes.dtype)
+        self._codes[:self._size] = codes
+        self._code_norms = np.empty(self._capacity, dtype=np.float32)
+        self._code_norms[:self._size] = np.einsum('ij,ij->i', dequantized, dequantized)
+        self._code_norms[:self._size][~live] = np.inf
+    
+    def _quantize_row(self, row):
+        """Quantize a newly added row, rebuilding if it falls outside the int8 range"""
+        if self._codes is None:
+            self.build_quantized()
+            return
+        
+        encoding = self._encodings[row]
+        
+        if self.quantization == 'int8':
+            if np.any(np.abs(encoding) > 127 * self._scale):
+                self.build_quantized()
+                return
+            code = np.round(encoding / self._scale).astype(np.int8)
+            dequantized = code.astype(np.float32) * self._scale
+        else:
+            code = encoding.astype(np.float16)
+            dequantized = code.astype(np.float32)
+        
+        self._codes[row] = code
+        self._code_norms[row] = np.dot(dequantized, dequantized)
+    
+    def exact_distances(self, encoding, rows=None):
+        """
+        Euclidean distances from an encoding to all (or the given) rows
+        Tombstoned rows are at distance inf
+        """
+        encoding = np.asarray(encoding, dtype=np.float32)
+        
+        if rows is None:
+            encodings, norms = self.encodings, self._norms[:self._size]
+        else:
+            encodings, norms = self._encodings[rows], self._norms[rows]
+        
+        squared = norms + np.dot(encoding, encoding) - 2.0 * (encodings @ encoding)
+        return np.sqrt(np.maximum(squared, 0.0))
+    
+    def coarse_distances(self, encoding):
+        """Approximate squared distances from the quantized copy"""
+        encoding = np.asarray(encoding, dtype=np.float32)
+        
+        # Fold the int8 scale into the query instead of dequantizing the codes
+        query = encoding * self._scale if self.quantization == 'int8' else encoding
+        
+        if self._chunk is None:
+            self._chunk = np.empty((COARSE_CHUNK_ROWS, ENCODING_SIZE), dtype=np.float32)
+        
+        # Widen cache-sized chunks to float32 so the dot products run through BLAS
+        dots = np.empty(self._size, dtype=np.float32)
+        for start in range(0, self._size, COARSE_CHUNK_ROWS):
+            end = min(start + COARSE_CHUNK_ROWS, self._size)
+            chunk = self._chunk[:end - start]
+            chunk[...] = self._codes[start:end]
+            np.dot(chunk, query, out=dots[start:end])
+        
+        return self._code_norms[:self._size] + np.dot(encoding, encoding) - 2.0 * dots
+    
+    def reduce_by_identity(self, distances, identities):
+        """
+        Per-identity score: min (or mean, GALLERY_IDENTITY_REDUCTION) distance over
+        the given rows. Identities without live rows score inf.
+        """
+        count = len(self._identity_index)
+        
+        if self.reduction == 'mean':
+            live = np.isfinite(distances)
+            sums = np.bincount(identities[live], weights=distances[live], minlength=count)
+            counts = np.bincount(identities[live], minlength=count)
+            scores = np.full(count, np.inf)
+            np.divide(sums, counts, out=scores, where=counts > 0)
+            return scores
+        
+        scores = np.full(count, np.inf, dtype=np.float32)
+        np.minimum.at(scores, identities, distances.astype(np.float32, copy=False))
+        return scores
+    
+    def match(self, encoding):
+        """
+        Find the closest identity for an encoding (templates are grouped per employee)
+        Returns: (row, distance, runner_up_distance) or None if the gallery is empty
+        row is the employee's closest template, distance the employee's score and
+        runner_up_distance the score of the next closest employee (inf if none)
+        """
+        with self._lock:
+            if len(self) == 0:
+                return None
+            
+            identities = self._identities[:self._size]
+            coarse = None
+            
+            if self._codes is None or self._size <= self.rerank_k:
+                rows = None
+                distances = self.exact_distances(encoding)
+                row_identities = identities
+            else:
+                # Coarse scan on the quantized copy, exact re-rank of the top candidates
+                coarse = self.coarse_distances(encoding)
+                rows = np.argpartition(coarse, self.rerank_k)[:self.rerank_k]
+                distances = self.exact_distances(encoding, rows)
+                row_identities = identities[rows]
+            
+            scores = self.reduce_by_identity(distances, row_identities)
+            best_identity = int(np.argmin(scores))
+            distance = float(scores[best_identity])
+            
+            scores[best_identity] = np.inf
+            runner_up = float(scores.min())
+            
+            if runner_up == np.inf and coarse is not None:
+                # Every candidate is the same person - fall back to the coarse scan
+                other = identities != best_identity
+                if other.any():
+                    runner_up = float(np.sqrt(max(coarse[other].min(), 0.0)))
+            
+            best = int(np.argmin(np.where(row_identities == best_identity, distances, np.inf)))
+            if rows is not None:
+                best = int(rows[best])
+            
+            return best, distance, runner_up
+    
+    def match_identity(self, encoding):
+        """
+        Like match(), but resolves the row to its identity under the same lock
+        so a concurrent compaction cannot shift the row in between
+        Returns: (employee_id, name, distance, runner_up_distance) or None
+        """
+        with self._lock:
+            match = self.match(encoding)
+            if match is None:
+                return None
+            row, distance, runner_up = match
+            return self.employee_ids[row], self.names[row], distance, runner_up
+    
+    def match_identities(self, encodings):
+        """
+        match_identity() for several encodings at once
+        On the exact path the distances of all probes are one matrix product
+        Returns: list of (employee_id, name, distance, runner_up_distance) or None
+        """
+        encodings = np.asarray(encodings, dtype=np.float32).reshape(-1, ENCODING_SIZE)
+        
+        with self._lock:
+            if len(self) == 0:
+                return [None] * len(encodings)
+            
+            if self._codes is not None and self._size > self.rerank_k:
+                # Coarse scan and re-rank are per probe
+                return [self.match_identity(encoding) for encoding in encodings]
+            
+            identities = self._identities[:self._size]
+            squared = (
+                self._norms[:self._size] + np.einsum('ij,ij->i', encodings, encodings)[:, None]
+                - 2.0 * (encodings @ self.encodings.T)
+            )
+            distances = np.sqrt(np.maximum(squared, 0.0))
+            
+            results = []
+            for probe_distances in distances:
+                scores = self.reduce_by_identity(probe_distances, identities)
+                best_identity = int(np.argmin(scores))
+                distance = float(scores[best_identity])
+                
+                scores[best_identity] = np.inf
+                runner_up = float(scores.min())
+                
+                row = int(np.argmin(np.where(identities == best_identity, probe_distances, np.inf)))
+                results.append((self.employee_ids[row], self.names[row], distance, runner_up))
+            
+            return results
+    
+    def memory_bytes(self):
+        """
+        Resident bytes of the encoding buffers (excluding names / ids)
+        File-backed exact encodings are not counted - see disk_bytes()
+        """
+        total = self._norms[:self._size].nbytes + self._identities[:self._size].nbytes
+        if self._exact_file is None:
+            total += self._encodings[:self._size].nbytes
+        if self._codes is not None:
+            total += self._codes[:self._size].nbytes + self._code_norms[:self._size].nbytes
+        return total
+    
+    def disk_bytes(self):
+        """Bytes of exact encodings kept in the file-backed buffer"""
+        if self._exact_file is None:
+            return 0
+        return self._encodings[:self._size].nbytes
+    
+    def close(self):
+        """Release the file-backed buffer"""
+        if self._exact_file is not None:
+            self._encodings = np.array(self.encodings)
+            self._exact_file.close()
+            self._exact_file = None
+
+def partition_key(site=None, department=None):
+    """Partition tag of an enrollment under GALLERY_PARTITION_BY"""
+    fields = {'site': site, 'department': department}
+    return '/'.join(f"{field}={fields[field] or ''}" for field in config.GALLERY_PARTITION_BY)
+
+class PartitionedGallery:
+    """
+    Face gallery split by site / department (GALLERY_PARTITION_BY)
+    
+    Each partition is its own FaceGallery, i.e. one contiguous block. A kiosk
+    configured with KIOSK_SITES / KIOSK_DEPARTMENTS searches its own partitions
+    first and only falls back to the others when nothing is within tolerance.
+    """
+    def __init__(self, sites=None, departments=None):
+        self.sites = sites if sites is not None else config.KIOSK_SITES
+        self.departments = departments if departments is not None else config.KIOSK_DEPARTMENTS
+        
+        self._lock = threading.RLock()
+        self.partitions = {}  # key -> FaceGallery
+        self._local = {}  # key -> searched first on this kiosk
+        self._partition_of = {}  # employee_id -> key
+        self._tags = {}  # employee_id -> (site, department)
+    
+    def is_local(self, site, department):
+        """Whether a partition is one of this kiosk's own"""
+        if self.sites is None and self.departments is None:
+            return True
+        if self.sites is not None and site not in self.sites:
+            return False
+        if self.departments is not None and department not in self.departments:
+            return False
+        return True
+    
+    def _partition(self, site, department):
+        key = partition_key(site, department)
+        gallery = self.partitions.get(key)
+        
+        if gallery is None:
+            gallery = FaceGallery()
+            self.partitions[key] = gallery
+            self._local[key] = self.is_local(site, department)
+        
+        return key, gallery
+    
+    def __len__(self):
+        return sum(len(gallery) for gallery in self.partitions.values())
+    
+    def identity_count(self):
+        return len(self._partition_of)
+    
+    def has_employee(self, employee_id):
+        return employee_id in self._partition_of
+    
+    def partition_of(self, employee_id):
+        return self._partition_of.get(employee_id)
+    
+    def rows_for(self, employee_id):
+        """Live rows of an employee within their partition"""
+        key = self._partition_of.get(employee_id)
+        return self.partitions[key].rows_for(employee_id) if key is not None else []
+    
+    def _rows(self):
+        """(partition, FaceGallery, live rows) for every partition"""
+        return [(key, gallery, gallery.live_rows()) for key, gallery in self.partitions.items()]
+    
+    @property
+    def encodings(self):
+        parts = [gallery.encodings[rows] for _, gallery, rows in self._rows()]
+        return np.concatenate(parts) if parts else np.empty((0, ENCODING_SIZE), dtype=np.float32)
+    
+    @property
+    def names(self):
+        return [gallery.names[row] for _, gallery, rows in self._rows() for row in rows]
+    
+    @property
+    def employee_ids(self):
+        return [gallery.employee_ids[row] for _, gallery, rows in self._rows() for row in rows]
+    
+    def add_template(self, encoding, name, employee_id, site=None, department=None):
+        """
+        Add a capture to the employee's partition (moving them if the partition changed)
+        Returns: number of templates the employee has
+        """
+        with self._lock:
+            key, gallery = self._partition(site, department)
+            
+            previous = self._partition_of.get(employee_id)
+            if previous is not None and previous != key:
+                self.partitions[previous].remove_employee(employee_id)
+            
+            self._partition_of[employee_id] = key
+            self._tags[employee_id] = (site, department)
+            return gallery.add_template(encoding, name, employee_id)
+    
+    def add(self, encoding, name, employee_id, site=None, department=None):
+        with self._lock:
+            key, gallery = self._partition(site, department)
+            self._partition_of[employee_id] = key
+            self._tags[employee_id] = (site, department)
+            return gallery.add(encoding, name, employee_id)
+    
+    def remove_employee(self, employee_id):
+        """Remove every template of an employee - Returns: number of rows removed"""
+        with self._lock:
+            key = self._partition_of.pop(employee_id, None)
+            self._tags.pop(employee_id, None)
+            if key is None:
+                return 0
+            return self.partitions[key].remove_employee(employee_id)
+    
+    def load(self, encodings, names, employee_ids, sites=None, departments=None):
+        """Replace the gallery contents, grouping rows into partitions"""
+        encodings = np.asarray(encodings, dtype=np.float32).reshape(-1, ENCODING_SIZE)
+        sites = sites or [None] * len(employee_ids)
+        departments = departments or [None] * len(employee_ids)
+        
+        groups = {}
+        for row, (site, department) in enumerate(zip(sites, departments)):
+            groups.setdefault((site, department), []).append(row)
+        
+        with self._lock:
+            self.close()
+            self.partitions = {}
+            self._local = {}
+            self._partition_of = {}
+            self._tags = {}
+            
+            merged = {}
+            for (site, department), rows in groups.items():
+                key, _ = self._partition(site, department)
+                merged.setdefault(key, []).extend(rows)
+            
+            for key, rows in merged.items():
+                self.partitions[key].load(
+                    encodings[rows], [names[row] for row in rows], [employee_ids[row] for row in rows]
+                )
+                for row in rows:
+                    self._partition_of[employee_ids[row]] = key
+                    self._tags[employee_ids[row]] = (sites[row], departments[row])
+    
+    def to_dict(self):
+        """Serializable form (encodings file keys plus each row's site / department)"""
+        with self._lock:
+            data = {'encodings': [], 'names': [], 'employee_ids': [], 'sites': [], 'departments': []}
+            
+            for gallery in self.partitions.values():
+                part = gallery.to_dict()
+                tags = [self._tags.get(employee_id, (None, None)) for employee_id in part['employee_ids']]
+                
+                data['encodings'].append(part['encodings'])
+                data['names'].extend(part['names'])
+                data['employee_ids'].extend(part['employee_ids'])
+                data['sites'].extend(site for site, _ in tags)
+                data['departments'].extend(department for _, department in tags)
+            
+            data['encodings'] = (
+                np.concatenate(data['encodings']) if data['encodings']
+                else np.empty((0, ENCODING_SIZE), dtype=np.float32)
+            )
+            return data
+    
+    @staticmethod
+    def _merge(best, runner_up, match):
+        """
+        Fold one partition's match into the best match so far
+        Returns: (best, runner_up_distance)
+        """
+        if match is None:
+            return best, runner_up
+        
+        if best is None or match[2] < best[2]:
+            if best is not None:
+                runner_up = min(runner_up, best[2])
+            return match, min(runner_up, match[3])
+        
+        return best, min(runner_up, match[2])
+    
+    @staticmethod
+    def _combine(match, fallback):
+        """Best of a local match and a fallback match (either may be None)"""
+        if match is None:
+            return fallback
+        if fallback is None:
+            return match
+        
+        first, second = (match, fallback) if match[2] <= fallback[2] else (fallback, match)
+        return first[0], first[1], first[2], min(first[3], second[2])
+    
+    def _search(self, encoding, keys):
+        """
+        Best match over the given partitions
+        Returns: (employee_id, name, distance, runner_up_distance) or None
+        """
+        best = None
+        runner_up = np.inf
+        
+        for key in keys:
+            best, runner_up = self._merge(best, runner_up, self.partitions[key].match_identity(encoding))
+        
+        if best is None:
+            return None
+        return best[0], best[1], best[2], runner_up
+    
+    def _search_many(self, encodings, keys):
+        """_search() for several encodings, one batched match per partition"""
+        best = [None] * len(encodings)
+        runner_up = [np.inf] * len(encodings)
+        
+        for key in keys:
+            for index, match in enumerate(self.partitions[key].match_identities(encodings)):
+                best[index], runner_up[index] = self._merge(best[index], runner_up[index], match)
+        
+        return [
+            None if match is None else (match[0], match[1], match[2], distance)
+            for match, distance in zip(best, runner_up)
+        ]
+    
+    def _keys(self):
+        """(local partitions, remote partitions)"""
+        with self._lock:
+            local = [key for key in self.partitions if self._local[key]]
+            remote = [key for key in self.partitions if not self._local[key]]
+        return local, remote
+    
+    def match_identity(self, encoding, tolerance=None):
+        """
+        Find the closest employee, searching local partitions first
+        Remote partitions are only searched when no local match is within tolerance
+        Returns: (employee_id, name, distance, runner_up_distance) or None if the gallery is empty
+        """
+        local, remote = self._keys()
+        
+        if not remote or tolerance is None:
+            return self._search(encoding, local + remote)
+        
+        match = self._search(encoding, local)
+        if match is not None and match[2] <= tolerance:
+            return match
+        
+        # Global fallback
+        metrics.inc('partition_fallbacks')
+        return self._combine(match, self._search(encoding, remote))
+    
+    def match_identities(self, encodings, tolerance=None):
+        """
+        match_identity() for several encodings at once
+        Only the probes without a local match within tolerance fall back to the remote partitions
+        Returns: list of (employee_id, name, distance, runner_up_distance) or None
+        """
+        encodings = np.asarray(encodings, dtype=np.float32).reshape(-1, ENCODING_SIZE)
+        local, remote = self._keys()
+        
+        if not remote or tolerance is None:
+            return self._search_many(encodings, local + remote)
+        
+        matches = self._search_many(encodings, local)
+        misses = [index for index, match in enumerate(matches) if match is None or match[2] > tolerance]
+        
+        if misses:
+            metrics.inc('partition_fallbacks', len(misses))
+            fallbacks = self._search_many(encodings[misses], remote)
+            for index, fallback in zip(misses, fallbacks):
+                matches[index] = self._combine(matches[index], fallback)
+        
+        return matches
+    
+    def memory_bytes(self):
+        return sum(gallery.memory_bytes() for gallery in self.partitions.values())
+    
+    def close(self):
+        for gallery in self.partitions.values():
+            gallery.close()
@@ -1,64 +1,169 @@
 import os
 import pickle
-import face_recognition
-import cv2
+import threading
+import time
 import numpy as np
-from datetime import datetime
 import config
+from metrics import metrics, timed
 from face_detector import FaceDetector
+from face_gallery import PartitionedGallery
+from gallery_sync import GalleryChangeLog
+from face_store import FaceImageStore
 from attendance_manager import AttendanceManager
+from runtime_settings import default_settings
 
 class FaceRecognizer:
-    def __init__(self):
-        self.detector = FaceDetector()
-        self.db_manager = AttendanceManager()
-        self.known_face_encodings = []
-        self.known_face_names = []
-        self.known_employee_ids = []
-        self.tolerance = config.FACE_RECOGNITION_TOLERANCE
+    def __init__(self, detector=None, db_manager=None, encodings_path=None):
+        self.detector = detector if detector is not None else FaceDetector()
+        self.db_manager = db_manager if db_manager is not None else AttendanceManager()
+        self.gallery = PartitionedGallery()
+        self.settings = default_settings()  # Replaced as a whole by apply_settings
+        self.encodings_path = encodings_path or config.ENCODINGS_PATH
+        
+        # The change log belongs to its encodings snapshot
+        if self.encodings_path == config.ENCODINGS_PATH:
+            self.change_log = GalleryChangeLog()
+        else:
+            self.change_log = GalleryChangeLog(os.path.splitext(self.encodings_path)[0] + '_log.db')
+        
+        self.image_store = FaceImageStore()
+        self._sync_lock = threading.RLock()
+        self._punch_locks = {}  # employee_id -> Lock, so concurrent punches of one person take turns
+        self._punch_locks_guard = threading.Lock()
+        self.applied_seq = 0  # Last change log entry applied to the gallery
+        self.snapshot_seq = 0  # Last change log entry included in the encodings file
+        self.last_sync = 0.0
         self.load_encodings()
     
+    @property
+    def tolerance(self):
+        return self.settings.tolerance
+    
+    def apply_settings(self, settings):
+        """Switch to new runtime settings (the gallery is kept)"""
+        self.settings = settings
+    
     def load_encodings(self):
-        """Load face encodings from pickle file"""
-        if os.path.exists(config.ENCODINGS_PATH):
+        """Load the face encodings snapshot and replay newer change log entries"""
+        if os.path.exists(self.encodings_path):
             try:
-                with open(config.ENCODINGS_PATH, 'rb') as f:
+                with open(self.encodings_path, 'rb') as f:
                     data = pickle.load(f)
-                    self.known_face_encodings = data.get('encodings', [])
-                    self.known_face_names = data.get('names', [])
-                    self.known_employee_ids = data.get('employee_ids', [])
-                print(f"Loaded {len(self.known_face_encodings)} face encodings")
+                
+                employee_ids = data.get('employee_ids', [])
+                sites, departments = data.get('sites'), data.get('departments')
+                
+                if sites is None:
+                    # Snapshot from before partitioning - tags come from the users table
+                    partitions = self.db_manager.get_user_partitions()
+                    sites = [partitions.get(employee_id, (None, None))[0] for employee_id in employee_ids]
+                    departments = [partitions.get(employee_id, (None, None))[1] for employee_id in employee_ids]
+                
+                self.gallery.load(
+                    data.get('encodings', []),
+                    data.get('names', []),
+                    employee_ids,
+                    sites,
+                    departments
+                )
+                self.snapshot_seq = self.applied_seq = data.get('log_seq', 0)
+                print(f"Loaded {len(self.gallery)} face encodings")
             except Exception as e:
                 print(f"Error loading encodings: {e}")
         else:
             print("No existing encodings found. Starting fresh.")
+        
+        applied = self.sync_gallery(remote=False)
+        if applied:
+            print(f"Applied {applied} gallery changes from the change log")
+    
+    @property
+    def known_face_encodings(self):
+        return self.gallery.encodings
+    
+    @property
+    def known_face_names(self):
+        return self.gallery.names
+    
+    @property
+    def known_employee_ids(self):
+        return self.gallery.employee_ids
     
     def save_encodings(self):
-        """Save face encodings to pickle file"""
-        data = {
-            'encodings': self.known_face_encodings,
-            'names': self.known_face_names,
-            'employee_ids': self.known_employee_ids
-        }
-        
-        with open(config.ENCODINGS_PATH, 'wb') as f:
-            pickle.dump(data, f)
+        """Save a face encodings snapshot (with the change log version it includes)"""
+        with self._sync_lock:
+            data = self.gallery.to_dict()
+            data['log_seq'] = self.applied_seq
+            
+            temp_path = self.encodings_path + '.tmp'
+            with open(temp_path, 'wb') as f:
+                pickle.dump(data, f)
+            os.replace(temp_path, self.encodings_path)
+            
+            self.snapshot_seq = self.applied_seq
         
         print("Encodings saved successfully")
     
-    def register_new_face(self, frame, name, employee_id, email=None, department=None):
+    def apply_change(self, change):
+        """Apply one change log entry to the gallery"""
+        if change['op'] == 'insert':
+            self.gallery.add_template(
+                change['encoding'], change['name'], change['employee_id'],
+                change.get('site'), change.get('department')
+            )
+        elif change['op'] == 'delete':
+            self.gallery.remove_employee(change['employee_id'])
+    
+    def sync_gallery(self, remote=True):
+        """
+        Apply change log entries recorded since the last sync - by this or any other
+        process, or imported from GALLERY_SYNC_DIR when remote is True
+        Returns: number of changes applied
+        """
+        with self._sync_lock:
+            self.last_sync = time.time()
+            
+            if remote and config.GALLERY_SYNC_DIR:
+                try:
+                    self.change_log.import_deltas(config.GALLERY_SYNC_DIR)
+                    self.change_log.export_deltas(config.GALLERY_SYNC_DIR)
+                    self.change_log.prune_deltas(config.GALLERY_SYNC_DIR)
+                except OSError as e:
+                    print(f"Gallery sync directory unavailable: {e}")
+            
+            changes = self.change_log.changes_since(self.applied_seq)
+            
+            for change in changes:
+                self.apply_change(change)
+                self.applied_seq = change['seq']
+            
+            # Keep the log replay at startup short
+            if self.applied_seq - self.snapshot_seq >= config.GALLERY_SNAPSHOT_INTERVAL:
+                self.save_encodings()
+            
+            return len(changes)
+    
+    def poll_gallery(self):
+        """Sync the gallery at most every GALLERY_SYNC_INTERVAL seconds (for camera loops)"""
+        if time.time() - self.last_sync < config.GALLERY_SYNC_INTERVAL:
+            return 0
+        return self.sync_gallery()
+    
+    def register_new_face(self, frame, name, employee_id, email=None, department=None, site=None):
         """
         Register a new user's face
-        Captures multiple images and stores average encoding
+        The photo becomes the user's first template; more captures can be added
+        with add_face_template()
         """
         # Register user in database first
-        user_id, message = self.db_manager.register_user(name, employee_id, email, department)
+        site = site or config.SITE_ID
+        user_id, message = self.db_manager.register_user(name, employee_id, email, department, site)
         
         if user_id is None:
             return False, message
         
-        # Detect face in frame
-        face_locations = self.detector.detect_faces(frame)
+        # Detect face in frame (registration photos are not limited to the kiosk ROI)
+        face_locations = self.detector.detect_faces(frame, apply_region=False)
         
         if len(face_locations) == 0:
             return False, "No face detected. Please ensure your face is visible."
@@ -66,128 +171,172 @@ class FaceRecognizer:
         if len(face_locations) > 1:
             return False, "Multiple faces detected. Please ensure only one person is in frame."
         
-        # Get face encoding
-        encodings = self.detector.get_face_encodings(frame, face_locations)
+        # Get face encoding (lighting is corrected on the face region only)
+        enhanced_frame = self.detector.preprocess_frame(frame, face_locations)
+        encodings = self.detector.get_face_encodings(enhanced_frame, face_locations)
         
         if len(encodings) == 0:
             return False, "Could not generate face encoding. Please try again."
         
         encoding = encodings[0]
         
-        # Add to known faces
-        self.known_face_encodings.append(encoding)
-        self.known_face_names.append(name)
-        self.known_employee_ids.append(employee_id)
+        # Add to known faces (through the change log so other processes and kiosks follow)
+        self.change_log.record_insert(employee_id, name, encoding, site, department)
+        self.sync_gallery()
+        
+        # Save the aligned face crop (written in the background)
+        landmarks = self.detector.get_facial_landmarks(frame, face_locations)
+        self.image_store.save(employee_id, frame, face_locations[0], landmarks[0] if landmarks else None)
+        
+        return True, f"User {name} registered successfully!"
+    
+    def add_face_template(self, frame, employee_id):
+        """
+        Add another capture of a registered user
+        Templates beyond GALLERY_MAX_TEMPLATES are clustered into prototypes
+        """
+        user = self.db_manager.get_user_by_employee_id(employee_id)
+        
+        if user is None:
+            return False, "User not found"
+        
+        name, department, site = user[1], user[4], user[6]
         
-        # Save face image
-        face_dir = os.path.join(config.FACES_DIR, employee_id)
-        os.makedirs(face_dir, exist_ok=True)
+        face_locations = self.detector.detect_faces(frame, apply_region=False)
         
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        image_path = os.path.join(face_dir, f"{timestamp}.jpg")
-        cv2.imwrite(image_path, frame)
+        if len(face_locations) == 0:
+            return False, "No face detected. Please ensure your face is visible."
         
-        # Save encodings
-        self.save_encodings()
+        if len(face_locations) > 1:
+            return False, "Multiple faces detected. Please ensure only one person is in frame."
         
-        return True, f"User {name} registered successfully!"
+        enhanced_frame = self.detector.preprocess_frame(frame, face_locations)
+        encodings = self.detector.get_face_encodings(enhanced_frame, face_locations)
+        
+        if len(encodings) == 0:
+            return False, "Could not generate face encoding. Please try again."
+        
+        self.change_log.record_insert(employee_id, name, encodings[0], site, department)
+        self.sync_gallery()
+        templates = len(self.gallery.rows_for(employee_id))
+        
+        landmarks = self.detector.get_facial_landmarks(frame, face_locations)
+        self.image_store.save(employee_id, frame, face_locations[0], landmarks[0] if landmarks else None)
+        
+        return True, f"Photo added for {name} ({templates} templates)"
+    
+    @timed('recognizer.detect_and_encode')
+    def detect_and_encode(self, frame):
+        """
+        Detect faces and generate their encodings
+        Returns: (face_locations, face_encodings)
+        """
+        # Lighting is estimated once per frame; poorly lit scenes are enhanced
+        # on the downscaled detection image
+        enhance = self.detector.needs_enhancement(frame)
+        face_locations = self.detector.detect_faces(frame, enhance=enhance)
+        metrics.inc('frames_processed')
+        
+        if len(face_locations) == 0:
+            return [], []
+        
+        metrics.inc('faces_detected', len(face_locations))
+        
+        # Encodings use the full-resolution frame, lighting corrected on face regions only
+        enhanced_frame = self.detector.preprocess_frame(frame, face_locations, enhance)
+        face_encodings = self.detector.get_face_encodings(enhanced_frame, face_locations)
+        
+        return face_locations, face_encodings
+    
+    @timed('recognizer.match_encoding')
+    def match_identity(self, face_encoding):
+        """
+        Find the closest known employee for an encoding
+        The kiosk's own partitions are searched first (see PartitionedGallery)
+        Returns: (employee_id, name, best_distance, runner_up_distance) or None if no faces are known
+        runner_up_distance is the distance to the next closest employee (inf if none)
+        """
+        return self.gallery.match_identity(face_encoding, self.tolerance)
     
+    @timed('recognizer.match_batch')
+    def match_identities(self, face_encodings):
+        """
+        match_identity() for a batch of encodings (one gallery pass per partition)
+        Returns: list of (employee_id, name, best_distance, runner_up_distance) or None
+        """
+        if len(face_encodings) == 0:
+            return []
+        return self.gallery.match_identities(face_encodings, self.tolerance)
+    
+    @timed('recognizer.recognize_face')
     def recognize_face(self, frame):
         """
         Recognize faces in the frame
         Returns: list of (name, employee_id, face_location, distance)
         """
-        if len(self.known_face_encodings) == 0:
-            return []
-        
-        # Detect faces
-        face_locations = self.detector.detect_faces(frame)
-        
-        if len(face_locations) == 0:
+        if len(self.gallery) == 0:
             return []
         
-        # Get encodings for detected faces
-        face_encodings = self.detector.get_face_encodings(frame, face_locations)
+        face_locations, face_encodings = self.detect_and_encode(frame)
         
         results = []
         
         for face_encoding, face_location in zip(face_encodings, face_locations):
-            # Compare with known faces
-            matches = face_recognition.compare_faces(
-                self.known_face_encodings,
-                face_encoding,
-                tolerance=self.tolerance
-            )
-            
-            name = "Unknown"
-            employee_id = None
+            employee_id, name, distance, _ = self.match_identity(face_encoding)
             
-            # Calculate face distances
-            face_distances = face_recognition.face_distance(
-                self.known_face_encodings,
-                face_encoding
-            )
-            
-            if len(face_distances) > 0:
-                best_match_index = np.argmin(face_distances)
-                
-                if matches[best_match_index]:
-                    name = self.known_face_names[best_match_index]
-                    employee_id = self.known_employee_ids[best_match_index]
-                    distance = face_distances[best_match_index]
-                    
-                    results.append({
-                        'name': name,
-                        'employee_id': employee_id,
-                        'face_location': face_location,
-                        'distance': distance,
-                        'confidence': round((1 - distance) * 100, 2)
-                    })
+            if distance <= self.tolerance:
+                results.append({
+                    'name': name,
+                    'employee_id': employee_id,
+                    'face_location': face_location,
+                    'distance': distance,
+                    'confidence': round((1 - distance) * 100, 2)
+                })
+        
+        if len(face_locations) > 0 and len(results) == 0:
+            metrics.inc('recognition_empty')
         
         return results
     
     def mark_attendance(self, employee_id):
         """
         Automatically determine and mark punch-in or punch-out
+        Punches of the same employee are serialized, so two threads can't both
+        pass the last-punch / interval check and record the same punch twice
         """
-        # Get last attendance record
-        last_record = self.db_manager.get_last_attendance(employee_id)
-        
-        # Determine action
-        if last_record is None:
-            action = "punch-in"
-        else:
-            last_action, last_time = last_record
-            # If last was punch-in, now do punch-out and vice versa
-            action = "punch-out" if last_action == "punch-in" else "punch-in"
+        with self._punch_locks_guard:
+            punch_lock = self._punch_locks.setdefault(employee_id, threading.Lock())
         
-        # Mark attendance
-        success, message = self.db_manager.mark_attendance(employee_id, action)
+        with punch_lock:
+            # Get last attendance record
+            last_record = self.db_manager.get_last_attendance(employee_id)
+            
+            # Determine action
+            if last_record is None:
+                action = "punch-in"
+            else:
+                last_action, last_time = last_record
+                # If last was punch-in, now do punch-out and vice versa
+                action = "punch-out" if last_action == "punch-in" else "punch-in"
+            
+            # Mark attendance
+            success, message = self.db_manager.mark_attendance(employee_id, action)
         
         return success, message, action
     
     def delete_user_encoding(self, employee_id):
-        """Remove user's face encoding"""
+        """Remove all of a user's face encodings"""
         try:
-            if employee_id in self.known_employee_ids:
-                index = self.known_employee_ids.index(employee_id)
-                
-                # Remove from lists
-                del self.known_face_encodings[index]
-                del self.known_face_names[index]
-                del self.known_employee_ids[index]
-                
-                # Save updated encodings
-                self.save_encodings()
+            if self.gallery.has_employee(employee_id):
+                # Tombstones every template of the employee; compaction runs in the background
+                self.change_log.record_delete(employee_id)
+                self.sync_gallery()
                 
-                # Delete face images
-                import shutil
-                face_dir = os.path.join(config.FACES_DIR, employee_id)
-                if os.path.exists(face_dir):
-                    shutil.rmtree(face_dir)
+                # Face images are removed in the background
+                self.image_store.delete_employee(employee_id)
                 
                 return True, "Face encoding deleted"
             else:
                 return False, "User encoding not found"
         except Exception as e:
-            return False, f"Error: {str(e)}"
\ No newline at end of file
+            return False, f"Error: {str(e)}"
@@ -0,0 +1,145 @@
+"""
+Enrollment image store
+
+Keeps an eye-aligned face crop and a small thumbnail per capture instead of the
+full camera frame:
+
+    registered_faces/<employee_id>/<content hash>.jpg
+    registered_faces/<employee_id>/<content hash>_thumb.jpg
+
+Encoding and writing happen on a background thread fed by a bounded queue, so
+registration doesn't wait for the disk. Files are named by a hash of their JPEG
+bytes, so saving the same photo again is a no-op. Deleting an employee's images
+is queued behind their pending writes.
+"""
+import atexit
+import hashlib
+import math
+import os
+import queue
+import shutil
+import threading
+import cv2
+import config
+from metrics import metrics
+
+def eye_angle(landmarks):
+    """
+    Tilt of the line between the eye centres in degrees (0 = level)
+    landmarks: dict from face_recognition.face_landmarks
+    """
+    eyes = [landmarks.get('left_eye'), landmarks.get('right_eye')]
+    if not all(eyes):
+        return 0.0
+    
+    (x1, y1), (x2, y2) = sorted(
+        (sum(x for x, _ in eye) / len(eye), sum(y for _, y in eye) / len(eye)) for eye in eyes
+    )
+    return math.degrees(math.atan2(y2 - y1, x2 - x1))
+
+def crop_face(frame, face_location, landmarks=None, size=None, padding=None):
+    """
+    Square crop around a face, rotated so the eyes are level, resized to size x size
+    Crop, rotation and scaling are one warpAffine over the output pixels only
+    """
+    size = size or config.FACE_CROP_SIZE
+    padding = config.FACE_CROP_PADDING if padding is None else padding
+    
+    top, right, bottom, left = face_location
+    centre = ((left + right) / 2.0, (top + bottom) / 2.0)
+    side = max(bottom - top, right - left) * (1 + 2 * padding)
+    angle = eye_angle(landmarks) if landmarks else 0.0
+    
+    matrix = cv2.getRotationMatrix2D(centre, angle, size / float(side))
+    matrix[0, 2] += size / 2.0 - centre[0]
+    matrix[1, 2] += size / 2.0 - centre[1]
+    
+    return cv2.warpAffine(frame, matrix, (size, size), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+
+class FaceImageStore:
+    def __init__(self, base_dir=None, jpeg_quality=None, thumbnail_size=None, queue_size=None):
+        self.base_dir = base_dir or config.FACES_DIR
+        self.jpeg_quality = jpeg_quality or config.FACE_IMAGE_JPEG_QUALITY
+        self.thumbnail_size = thumbnail_size or config.FACE_THUMBNAIL_SIZE
+        self._queue = queue.Queue(maxsize=queue_size or config.FACE_STORE_QUEUE_SIZE)
+        self._writer = None
+        self._lock = threading.Lock()
+    
+    def employee_dir(self, employee_id):
+        return os.path.join(self.base_dir, employee_id)
+    
+    def _submit(self, task):
+        """Queue a task for the writer thread (blocks while the queue is full)"""
+        with self._lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._run, name="face-image-store", daemon=True)
+                self._writer.start()
+                atexit.register(self.flush)
+        self._queue.put(task)
+    
+    def save(self, employee_id, frame, face_location, landmarks=None):
+        """Queue the aligned crop of a face for saving (the frame itself is not kept)"""
+        self.save_crop(employee_id, crop_face(frame, face_location, landmarks))
+    
+    def save_crop(self, employee_id, crop):
+        self._submit(('save', employee_id, crop))
+    
+    def delete_employee(self, employee_id):
+        """Queue removal of all of an employee's images"""
+        self._submit(('delete', employee_id, None))
+    
+    def flush(self):
+        """Wait until every queued write and delete is done"""
+        if self._writer is not None:
+            self._queue.join()
+    
+    def list_images(self, employee_id):
+        """Paths of an employee's stored crops (thumbnails excluded)"""
+        face_dir = self.employee_dir(employee_id)
+        if not os.path.isdir(face_dir):
+            return []
+        return sorted(
+            os.path.join(face_dir, file_name) for file_name in os.listdir(face_dir)
+            if file_name.endswith('.jpg') and not file_name.endswith('_thumb.jpg')
+        )
+    
+    def _run(self):
+        while True:
+            op, employee_id, crop = self._queue.get()
+            try:
+                if op == 'save':
+                    self._write(employee_id, crop)
+                else:
+                    shutil.rmtree(self.employee_dir(employee_id), ignore_errors=True)
+            except Exception as e:
+                print(f"Error storing face image for {employee_id}: {e}")
+            finally:
+                self._queue.task_done()
+    
+    def _encode(self, image):
+        ok, data = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        if not ok:
+            raise ValueError("Could not encode face image")
+        return data.tobytes()
+    
+    def _write_file(self, path, data):
+        temp_path = path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    
+    def _write(self, employee_id, crop):
+        data = self._encode(crop)
+        digest = hashlib.sha1(data).hexdigest()[:16]
+        
+        face_dir = self.employee_dir(employee_id)
+        path = os.path.join(face_dir, f"{digest}.jpg")
+        if os.path.exists(path):
+            metrics.inc('face_images_deduplicated')
+            return
+        
+        os.makedirs(face_dir, exist_ok=True)
+        thumbnail = cv2.resize(crop, (self.thumbnail_size, self.thumbnail_size), interpolation=cv2.INTER_AREA)
+        self._write_file(os.path.join(face_dir, f"{digest}_thumb.jpg"), self._encode(thumbnail))
+        self._write_file(path, data)
+        metrics.inc('face_images_saved')
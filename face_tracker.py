@@ -0,0 +1,281 @@
+import numpy as np
+import config
+from metrics import metrics
+
+def box_iou(box_a, box_b):
+    """
+    Intersection over union of two (top, right, bottom, left) boxes
+    """
+    top = max(box_a[0], box_b[0])
+    right = min(box_a[1], box_b[1])
+    bottom = min(box_a[2], box_b[2])
+    left = max(box_a[3], box_b[3])
+    
+    intersection = max(0, bottom - top) * max(0, right - left)
+    if intersection == 0:
+        return 0.0
+    
+    area_a = (box_a[2] - box_a[0]) * (box_a[1] - box_a[3])
+    area_b = (box_b[2] - box_b[0]) * (box_b[1] - box_b[3])
+    
+    return intersection / float(area_a + area_b - intersection)
+
+class FaceTrack:
+    def __init__(self, track_id, face_location):
+        self.track_id = track_id
+        self.face_location = face_location
+        self.missed = 0
+        self.committed = False
+        self.mismatches = 0  # Frames in a row a committed track didn't match its employee
+        self.reset_fusion()
+    
+    def reset_fusion(self):
+        """Forget accumulated encodings and evidence"""
+        self.encoding_sum = None
+        self.weight_sum = 0.0
+        self.frames = 0
+        self.evidence = 0.0
+        self.name = None
+        self.employee_id = None
+        self.distance = None
+        self.margin = 0.0
+    
+    def add_encoding(self, face_encoding, weight):
+        """
+        Add an encoding to the quality-weighted running mean
+        Returns: fused encoding
+        """
+        if self.encoding_sum is None:
+            self.encoding_sum = np.zeros_like(face_encoding, dtype=np.float64)
+        
+        self.encoding_sum += weight * face_encoding
+        self.weight_sum += weight
+        self.frames += 1
+        
+        return self.encoding_sum / self.weight_sum
+
+class FaceTracker:
+    def __init__(self, recognizer):
+        self.recognizer = recognizer
+        self.settings = recognizer.settings  # Taken once per frame from the recognizer
+        self.tracks = []
+        self.next_track_id = 1
+    
+    def face_quality(self, face_location):
+        """
+        Weight of a frame's encoding - larger faces give more reliable encodings
+        """
+        top, right, bottom, left = face_location
+        size = max(bottom - top, right - left)
+        
+        return min(1.0, max(size, 1) / float(config.FUSION_REFERENCE_FACE_SIZE))
+    
+    def associate(self, face_locations):
+        """
+        Greedily match detections to existing tracks by box overlap
+        Returns: list of tracks, one per detection
+        """
+        pairs = []
+        for det_index, face_location in enumerate(face_locations):
+            for track in self.tracks:
+                iou = box_iou(track.face_location, face_location)
+                if iou >= config.TRACK_IOU_THRESHOLD:
+                    pairs.append((iou, det_index, track))
+        
+        pairs.sort(key=lambda pair: pair[0], reverse=True)
+        
+        assigned = [None] * len(face_locations)
+        used_tracks = set()
+        
+        for iou, det_index, track in pairs:
+            if assigned[det_index] is None and track.track_id not in used_tracks:
+                assigned[det_index] = track
+                used_tracks.add(track.track_id)
+        
+        # Tracks without a detection this frame age out
+        for track in self.tracks:
+            if track.track_id not in used_tracks:
+                track.missed += 1
+        
+        self.tracks = [
+            track for track in self.tracks
+            if track.missed <= config.TRACK_MAX_MISSED_FRAMES
+        ]
+        
+        for det_index, face_location in enumerate(face_locations):
+            track = assigned[det_index]
+            
+            if track is None:
+                track = FaceTrack(self.next_track_id, face_location)
+                self.next_track_id += 1
+                self.tracks.append(track)
+            
+            track.face_location = face_location
+            track.missed = 0
+            assigned[det_index] = track
+        
+        return assigned
+    
+    def observe(self, track, fused_match, frame_match):
+        """
+        Update a track's evidence from the matches of its fused encoding and of
+        this frame's encoding
+        
+        Sequential rule: each frame that agrees with the fused identity adds
+        (tolerance - distance) / FUSION_DISTANCE_SCALE evidence, so close matches
+        commit in a couple of frames while borderline or ambiguous ones wait.
+        """
+        tolerance = self.settings.tolerance
+        
+        if fused_match is None:
+            track.reset_fusion()
+            return
+        
+        fused_id, fused_name, fused_distance, fused_runner_up = fused_match
+        employee_id = None
+        
+        if fused_distance <= tolerance:
+            employee_id = fused_id
+        
+        # A change of fused identity invalidates the evidence gathered so far
+        if employee_id != track.employee_id:
+            track.evidence = 0.0
+        
+        track.name = fused_name if employee_id is not None else None
+        track.employee_id = employee_id
+        track.distance = fused_distance
+        track.margin = fused_runner_up - fused_distance
+        
+        if employee_id is None:
+            return
+        
+        frame_id, _, frame_distance, frame_runner_up = frame_match
+        
+        if frame_id != employee_id:
+            # This frame points to someone else
+            track.evidence -= 1.0
+        elif frame_runner_up - frame_distance >= config.FUSION_MIN_MARGIN:
+            evidence = (tolerance - frame_distance) / config.FUSION_DISTANCE_SCALE
+            if frame_distance <= tolerance:
+                # Floor for borderline matches: a face matching on every frame commits
+                # within half of FUSION_MAX_FRAMES, well before fusion restarts
+                evidence = max(evidence, self.settings.consecutive_frames / (config.FUSION_MAX_FRAMES // 2))
+            track.evidence += evidence
+        
+        track.evidence = max(track.evidence, 0.0)
+    
+    def is_ready(self, track):
+        """Check if a track has enough evidence to mark attendance"""
+        if track.committed or track.employee_id is None:
+            return False
+        
+        return (
+            track.frames >= config.FUSION_MIN_FRAMES and
+            track.evidence >= self.settings.consecutive_frames and
+            track.margin >= config.FUSION_MIN_MARGIN
+        )
+    
+    def identity_changed(self, track, frame_match):
+        """
+        Check whether a committed track's face has stopped matching its employee
+        (someone else stepped into its place while the track was still alive)
+        """
+        if (
+            frame_match is not None and
+            frame_match[0] == track.employee_id and
+            frame_match[2] <= self.settings.tolerance
+        ):
+            track.mismatches = 0
+            return False
+        
+        track.mismatches += 1
+        return track.mismatches > config.TRACK_MAX_IDENTITY_MISMATCHES
+    
+    def restart(self, track):
+        """
+        Replace a track with a new, uncommitted one at the same place
+        Returns: new track
+        """
+        new_track = FaceTrack(self.next_track_id, track.face_location)
+        self.next_track_id += 1
+        self.tracks[self.tracks.index(track)] = new_track
+        metrics.inc('track_identity_changes')
+        return new_track
+    
+    def update(self, face_locations, face_encodings):
+        """
+        Update tracks with the faces of a new frame
+        Returns: list of dicts (largest face first) with track_id, name, employee_id,
+        face_location, distance, confidence, frames, evidence and ready
+        """
+        self.settings = self.recognizer.settings
+        tracks = self.associate(face_locations)
+        results = []
+        
+        # One gallery pass per frame: every frame encoding (committed tracks too, so
+        # they notice a change of person) and the fused encodings of undecided tracks
+        fused = [
+            None if track.committed else track.add_encoding(face_encoding, self.face_quality(track.face_location))
+            for track, face_encoding in zip(tracks, face_encodings)
+        ]
+        probes = list(face_encodings) + [encoding for encoding in fused if encoding is not None]
+        matches = self.recognizer.match_identities(probes) if probes else []
+        frame_matches = matches[:len(face_encodings)]
+        fused_matches = iter(matches[len(face_encodings):])
+        
+        for track, face_encoding, fused_encoding, frame_match in zip(tracks, face_encodings, fused, frame_matches):
+            if fused_encoding is not None:
+                self.observe(track, next(fused_matches), frame_match)
+            elif self.identity_changed(track, frame_match):
+                # Start over from this frame; its encoding is the new fused encoding
+                track = self.restart(track)
+                track.add_encoding(face_encoding, self.face_quality(track.face_location))
+                self.observe(track, frame_match, frame_match)
+            
+            ready = self.is_ready(track)
+            
+            # Give up on undecided tracks so stale frames stop dragging the mean
+            if not ready and not track.committed and track.frames >= config.FUSION_MAX_FRAMES:
+                track.reset_fusion()
+            
+            name = track.name if track.name is not None else "Unknown"
+            
+            distance = track.distance
+            results.append({
+                'track_id': track.track_id,
+                'name': name,
+                'employee_id': track.employee_id,
+                'face_location': track.face_location,
+                'distance': distance,
+                'confidence': round((1 - distance) * 100, 2) if distance is not None else 0.0,
+                'frames': track.frames,
+                'evidence': round(track.evidence, 2),
+                'ready': ready,
+            })
+        
+        if len(results) > 0 and all(result['employee_id'] is None for result in results):
+            metrics.inc('recognition_empty')
+        
+        results.sort(
+            key=lambda result: (result['face_location'][2] - result['face_location'][0]) *
+                               (result['face_location'][1] - result['face_location'][3]),
+            reverse=True
+        )
+        
+        return results
+    
+    def mark_committed(self, track_id):
+        """Stop a track from marking attendance again while it stays in view"""
+        for track in self.tracks:
+            if track.track_id == track_id:
+                track.committed = True
+    
+    def reset_evidence(self, track_id):
+        """Discard a track's evidence, e.g. after a failed liveness check"""
+        for track in self.tracks:
+            if track.track_id == track_id:
+                track.reset_fusion()
+    
+    def reset(self):
+        """Drop all tracks"""
+        self.tracks = []
@@ -0,0 +1,183 @@
+"""
+Gallery audit: duplicate enrollments and look-alike identities
+
+    python gallery_audit.py                         # audit data/encodings.pkl
+    python gallery_audit.py --output logs/audit     # also write CSV reports
+
+All-pairs distances are computed in row x column blocks (bounded memory, one
+BLAS matrix product per block) with row blocks spread over worker threads.
+For every employee it reports the nearest other employee and the margin to
+FACE_RECOGNITION_TOLERANCE; pairs closer than AUDIT_DUPLICATE_DISTANCE are
+reported as probable duplicate registrations of the same person.
+"""
+import argparse
+import csv
+import os
+import pickle
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import config
+
+def audit_block(encodings, norms, identities, start, end, duplicate_distance):
+    """
+    Nearest other-identity neighbour for rows start:end, scanning all columns
+    Returns: (nearest_distances, nearest_rows, duplicate_pairs)
+    """
+    rows = encodings[start:end]
+    row_norms = norms[start:end]
+    row_identities = identities[start:end]
+    
+    nearest = np.full(end - start, np.inf, dtype=np.float32)
+    nearest_rows = np.full(end - start, -1, dtype=np.int64)
+    duplicates = []
+    duplicate_squared = duplicate_distance ** 2
+    
+    for column in range(0, len(encodings), config.AUDIT_BLOCK_COLUMNS):
+        column_end = min(column + config.AUDIT_BLOCK_COLUMNS, len(encodings))
+        
+        squared = rows @ encodings[column:column_end].T
+        squared *= -2.0
+        squared += row_norms[:, None]
+        squared += norms[None, column:column_end]
+        
+        # Rows of the same employee are not neighbours
+        squared[row_identities[:, None] == identities[None, column:column_end]] = np.inf
+        
+        best = np.argmin(squared, axis=1)
+        best_squared = squared[np.arange(len(rows)), best]
+        closer = best_squared < nearest
+        nearest[closer] = best_squared[closer]
+        nearest_rows[closer] = best[closer] + column
+        
+        # Each pair once (lower identity first)
+        hits = np.nonzero(squared < duplicate_squared)
+        for row, col in zip(*hits):
+            if row_identities[row] < identities[col + column]:
+                duplicates.append((start + row, column + col, float(np.sqrt(max(squared[row, col], 0.0)))))
+    
+    return np.sqrt(np.maximum(nearest, 0.0)), nearest_rows, duplicates
+
+def audit_gallery(encodings, employee_ids, duplicate_distance=None, workers=None):
+    """
+    Audit a gallery for duplicate and look-alike enrollments
+    Returns: (neighbours, duplicates)
+        neighbours: {employee_id: (nearest_employee_id, distance)}
+        duplicates: list of (employee_id, other_employee_id, distance) sorted by distance
+    """
+    if duplicate_distance is None:
+        duplicate_distance = config.AUDIT_DUPLICATE_DISTANCE
+    
+    encodings = np.ascontiguousarray(encodings, dtype=np.float32)
+    norms = np.einsum('ij,ij->i', encodings, encodings)
+    
+    identity_index = {}
+    identities = np.array(
+        [identity_index.setdefault(employee_id, len(identity_index)) for employee_id in employee_ids],
+        dtype=np.int64
+    )
+    
+    workers = workers or config.AUDIT_WORKERS or os.cpu_count() or 1
+    blocks = [
+        (start, min(start + config.AUDIT_BLOCK_ROWS, len(encodings)))
+        for start in range(0, len(encodings), config.AUDIT_BLOCK_ROWS)
+    ]
+    
+    # Matrix products release the GIL, so threads share the encodings without copies
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(
+            lambda block: audit_block(encodings, norms, identities, block[0], block[1], duplicate_distance),
+            blocks
+        ))
+    
+    nearest = np.concatenate([result[0] for result in results]) if results else np.empty(0)
+    nearest_rows = np.concatenate([result[1] for result in results]) if results else np.empty(0)
+    
+    # Reduce template rows to identities (closest template pair wins)
+    neighbours = {}
+    for row, employee_id in enumerate(employee_ids):
+        if nearest_rows[row] < 0:
+            continue
+        distance = float(nearest[row])
+        if employee_id not in neighbours or distance < neighbours[employee_id][1]:
+            neighbours[employee_id] = (employee_ids[nearest_rows[row]], distance)
+    
+    pairs = {}
+    for result in results:
+        for row, col, distance in result[2]:
+            key = (employee_ids[row], employee_ids[col])
+            if key not in pairs or distance < pairs[key]:
+                pairs[key] = distance
+    
+    duplicates = sorted(
+        ((first, second, distance) for (first, second), distance in pairs.items()),
+        key=lambda pair: pair[2]
+    )
+    
+    return neighbours, duplicates
+
+def write_reports(output_dir, neighbours, duplicates, names, tolerance):
+    """Write neighbours.csv (closest first) and duplicates.csv"""
+    os.makedirs(output_dir, exist_ok=True)
+    
+    with open(os.path.join(output_dir, 'neighbours.csv'), 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['employee_id', 'name', 'nearest_employee_id', 'nearest_name', 'distance', 'margin'])
+        for employee_id, (other, distance) in sorted(neighbours.items(), key=lambda item: item[1][1]):
+            writer.writerow([employee_id, names.get(employee_id), other, names.get(other),
+                             round(distance, 4), round(distance - tolerance, 4)])
+    
+    with open(os.path.join(output_dir, 'duplicates.csv'), 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['employee_id', 'name', 'other_employee_id', 'other_name', 'distance'])
+        for first, second, distance in duplicates:
+            writer.writerow([first, names.get(first), second, names.get(second), round(distance, 4)])
+
+def main():
+    parser = argparse.ArgumentParser(description="Audit the face gallery for duplicates and look-alikes")
+    parser.add_argument('--encodings', default=config.ENCODINGS_PATH, help="Encodings file")
+    parser.add_argument('--duplicate-distance', type=float, default=config.AUDIT_DUPLICATE_DISTANCE)
+    parser.add_argument('--workers', type=int, help="Worker threads (default: one per CPU core)")
+    parser.add_argument('--output', help="Directory for neighbours.csv and duplicates.csv")
+    parser.add_argument('--top', type=int, default=20, help="Closest pairs to print")
+    args = parser.parse_args()
+    
+    with open(args.encodings, 'rb') as f:
+        data = pickle.load(f)
+    
+    encodings = np.asarray(data.get('encodings', []), dtype=np.float32).reshape(-1, 128)
+    employee_ids = list(data.get('employee_ids', []))
+    names = dict(zip(employee_ids, data.get('names', [])))
+    tolerance = config.FACE_RECOGNITION_TOLERANCE
+    
+    start = time.perf_counter()
+    neighbours, duplicates = audit_gallery(encodings, employee_ids, args.duplicate_distance, args.workers)
+    elapsed = time.perf_counter() - start
+    
+    print(f"Audited {len(encodings)} templates of {len(names)} employees in {elapsed:.1f}s")
+    
+    look_alikes = sorted(
+        ((employee_id, other, distance) for employee_id, (other, distance) in neighbours.items()
+         if distance <= tolerance),
+        key=lambda item: item[2]
+    )
+    
+    if neighbours:
+        margins = np.array([distance for _, distance in neighbours.values()]) - tolerance
+        print(f"Nearest-neighbour margin to tolerance {tolerance}: "
+              f"min {margins.min():.3f}, p5 {np.percentile(margins, 5):.3f}, median {np.median(margins):.3f}")
+    
+    print(f"{len(duplicates)} probable duplicate pairs (distance < {args.duplicate_distance})")
+    for first, second, distance in duplicates[:args.top]:
+        print(f"  {first} ({names.get(first)}) ~ {second} ({names.get(second)}): {distance:.3f}")
+    
+    print(f"{len(look_alikes)} employees within tolerance of someone else")
+    for employee_id, other, distance in look_alikes[:args.top]:
+        print(f"  {employee_id} ({names.get(employee_id)}) -> {other} ({names.get(other)}): {distance:.3f}")
+    
+    if args.output:
+        write_reports(args.output, neighbours, duplicates, names, tolerance)
+        print(f"Reports written to {args.output}")
+
+if __name__ == '__main__':
+    main()
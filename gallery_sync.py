@@ -0,0 +1,401 @@
+"""
+Versioned change log of the face gallery and delta sync between kiosks
+
+Every enrollment and deletion is appended to a local SQLite log with a sequence
+number. Recognizers replay new entries on top of the encodings snapshot, so
+processes pick up changes without reloading the gallery. Deltas are exchanged
+through a shared directory:
+
+    python gallery_sync.py status
+    python gallery_sync.py export /mnt/share/gallery          # own changes not yet exported
+    python gallery_sync.py export /mnt/share/gallery --since 0
+    python gallery_sync.py import /mnt/share/gallery
+    python gallery_sync.py prune /mnt/share/gallery
+
+Each entry keeps the kiosk it originated on and its sequence number there, so
+imports are idempotent and changes never bounce back to their origin.
+
+Delta files are plain JSON (anyone who can write to the share can only inject
+data, never code) named <kiosk>__<first seq>-<last seq>.delta.json. After an
+import a kiosk records the last file it read from every publisher in the log
+and in acks/<kiosk>.json on the share; publishers delete their own files once
+every kiosk with an ack file has read them.
+"""
+import argparse
+import glob
+import json
+import os
+import sqlite3
+import numpy as np
+import config
+from face_gallery import ENCODING_SIZE
+
+DELTA_SUFFIX = '.delta.json'
+ACK_DIR = 'acks'
+
+def delta_name(publisher, first, last):
+    return f"{publisher}__{first:010d}-{last:010d}{DELTA_SUFFIX}"
+
+def parse_delta_name(path):
+    """
+    Publisher and last sequence number of a delta file
+    Returns: (publisher, last seq), or None if the file is not a delta
+    """
+    name = os.path.basename(path)
+    if not name.endswith(DELTA_SUFFIX):
+        return None
+    
+    publisher, separator, span = name[:-len(DELTA_SUFFIX)].rpartition('__')
+    first, dash, last = span.partition('-')
+    if not separator or not dash or not first.isdigit() or not last.isdigit():
+        return None
+    return publisher, int(last)
+
+def optional_text(value):
+    if value is not None and not isinstance(value, str):
+        raise TypeError(f"Expected a string, got {type(value).__name__}")
+    return value
+
+def parse_change(change):
+    """
+    Validate one entry of a delta file
+    Returns: (origin, origin_seq, op, employee_id, name, encoding blob, site, department)
+    Raises: ValueError, KeyError or TypeError for malformed entries
+    """
+    if change['op'] not in ('insert', 'delete'):
+        raise ValueError(f"Unknown operation {change['op']!r}")
+    
+    blob = None
+    if change['encoding'] is not None:
+        encoding = np.asarray(change['encoding'], dtype=np.float32)
+        if encoding.shape != (ENCODING_SIZE,):
+            raise ValueError(f"Encoding of shape {encoding.shape}")
+        blob = encoding.tobytes()
+    
+    origin, origin_seq, employee_id = change['origin'], change['origin_seq'], change['employee_id']
+    if not isinstance(origin, str) or not isinstance(employee_id, str) or type(origin_seq) is not int:
+        raise TypeError("origin, origin_seq or employee_id of the wrong type")
+    
+    return (
+        origin, origin_seq, change['op'], employee_id, optional_text(change['name']), blob,
+        optional_text(change.get('site')), optional_text(change.get('department')),
+    )
+
+class GalleryChangeLog:
+    def __init__(self, log_path=None, kiosk_id=None):
+        self.log_path = log_path or config.GALLERY_LOG_PATH
+        self.kiosk_id = kiosk_id or config.KIOSK_ID
+        self.init_database()
+    
+    def connect(self):
+        conn = sqlite3.connect(self.log_path, timeout=30)
+        conn.execute('PRAGMA journal_mode=WAL')
+        return conn
+    
+    def init_database(self):
+        """Initialize log tables"""
+        conn = self.connect()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS changes (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                origin TEXT NOT NULL,
+                origin_seq INTEGER,
+                op TEXT CHECK(op IN ('insert', 'delete')),
+                employee_id TEXT NOT NULL,
+                name TEXT,
+                encoding BLOB,
+                UNIQUE (origin, origin_seq)
+            )
+        ''')
+        
+        # Partition tags (added after the first release)
+        cursor.execute('PRAGMA table_info(changes)')
+        columns = [column[1] for column in cursor.fetchall()]
+        for column in ('site', 'department'):
+            if column not in columns:
+                cursor.execute(f'ALTER TABLE changes ADD COLUMN {column} TEXT')
+        
+        # Export watermark and, per remote kiosk, the last imported origin_seq
+        # ('origin:<kiosk>') and the last delta file read ('file:<publisher>')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS sync_state (
+                key TEXT PRIMARY KEY,
+                value INTEGER
+            )
+        ''')
+        
+        conn.commit()
+        conn.close()
+    
+    def record(self, changes):
+        """
+        Append local changes in one transaction
+        changes: list of (op, employee_id, name, encoding, site, department)
+        name, encoding, site and department are None for deletes
+        Returns: sequence number of the last change
+        """
+        conn = self.connect()
+        cursor = conn.cursor()
+        
+        try:
+            for op, employee_id, name, encoding, site, department in changes:
+                blob = None if encoding is None else np.asarray(encoding, dtype=np.float32).tobytes()
+                cursor.execute('''
+                    INSERT INTO changes (origin, op, employee_id, name, encoding, site, department)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', (self.kiosk_id, op, employee_id, name, blob, site, department))
+                
+                # Local changes are identified by their own sequence number
+                cursor.execute('UPDATE changes SET origin_seq = seq WHERE seq = ?', (cursor.lastrowid,))
+            
+            conn.commit()
+            return cursor.lastrowid
+        finally:
+            conn.close()
+    
+    def record_insert(self, employee_id, name, encoding, site=None, department=None):
+        return self.record([('insert', employee_id, name, encoding, site, department)])
+    
+    def record_delete(self, employee_id):
+        return self.record([('delete', employee_id, None, None, None, None)])
+    
+    def latest_seq(self):
+        """Current log version"""
+        conn = self.connect()
+        seq = conn.execute('SELECT MAX(seq) FROM changes').fetchone()[0]
+        conn.close()
+        return seq or 0
+    
+    def changes_since(self, seq, origin=None):
+        """
+        Log entries after a sequence number, oldest first
+        Returns: list of dicts with seq, origin, origin_seq, op, employee_id, name,
+        encoding, site and department
+        """
+        conn = self.connect()
+        cursor = conn.cursor()
+        
+        query = '''
+            SELECT seq, origin, origin_seq, op, employee_id, name, encoding, site, department
+            FROM changes WHERE seq > ?
+        '''
+        params = [seq]
+        if origin is not None:
+            query += ' AND origin = ?'
+            params.append(origin)
+        cursor.execute(query + ' ORDER BY seq', params)
+        
+        rows = cursor.fetchall()
+        conn.close()
+        
+        return [
+            {
+                'seq': row[0],
+                'origin': row[1],
+                'origin_seq': row[2],
+                'op': row[3],
+                'employee_id': row[4],
+                'name': row[5],
+                'encoding': None if row[6] is None else np.frombuffer(row[6], dtype=np.float32),
+                'site': row[7],
+                'department': row[8],
+            }
+            for row in rows
+        ]
+    
+    def get_state(self, key):
+        conn = self.connect()
+        row = conn.execute('SELECT value FROM sync_state WHERE key = ?', (key,)).fetchone()
+        conn.close()
+        return row[0] if row else 0
+    
+    def set_state(self, cursor, key, value):
+        cursor.execute('INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)', (key, value))
+    
+    def states(self, cursor, prefix):
+        """Returns: dict of name -> value for the sync_state keys '<prefix>:<name>'"""
+        return dict(cursor.execute(
+            'SELECT substr(key, ?), value FROM sync_state WHERE key LIKE ?',
+            (len(prefix) + 2, prefix + ':%')
+        ).fetchall())
+    
+    def export_deltas(self, directory, since=None):
+        """
+        Write a delta file with this kiosk's changes not yet exported, or every
+        entry after `since` (any origin) when given
+        Returns: (path, number of changes) - path is None if there was nothing to export
+        """
+        if since is None:
+            changes = self.changes_since(self.get_state('exported_seq'), origin=self.kiosk_id)
+        else:
+            changes = self.changes_since(since)
+        
+        if not changes:
+            return None, 0
+        
+        for change in changes:
+            change['encoding'] = None if change['encoding'] is None else change['encoding'].tolist()
+        
+        os.makedirs(directory, exist_ok=True)
+        first, last = changes[0]['seq'], changes[-1]['seq']
+        path = os.path.join(directory, delta_name(self.kiosk_id, first, last))
+        
+        # Atomic publish: readers never see a partial file
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump({'kiosk_id': self.kiosk_id, 'changes': changes}, f)
+        os.replace(temp_path, path)
+        
+        if since is None:
+            conn = self.connect()
+            self.set_state(conn.cursor(), 'exported_seq', last)
+            conn.commit()
+            conn.close()
+        
+        return path, len(changes)
+    
+    def import_deltas(self, directory):
+        """
+        Append remote changes from the delta files in a directory to the local log
+        Files already read (per publisher), this kiosk's own files and entries
+        already imported (per origin kiosk) are skipped; malformed files are
+        reported and skipped for good. The files read are acknowledged in acks/
+        Returns: number of changes imported
+        """
+        conn = self.connect()
+        cursor = conn.cursor()
+        imported = 0
+        
+        try:
+            read_up_to = self.states(cursor, 'file')
+            paths = []
+            for path in sorted(glob.glob(os.path.join(directory, '*' + DELTA_SUFFIX))):
+                parsed = parse_delta_name(path)
+                if parsed is not None and parsed[0] != self.kiosk_id and parsed[1] > read_up_to.get(parsed[0], 0):
+                    paths.append((path, parsed))
+            
+            if not paths:
+                # Announce this kiosk, so publishers keep their files until it has read them
+                if not os.path.exists(self.ack_path(directory)):
+                    self.acknowledge(directory, read_up_to)
+                return 0
+            
+            applied = self.states(cursor, 'origin')
+            
+            for path, (publisher, last) in paths:
+                with open(path) as f:
+                    try:
+                        changes = [parse_change(change) for change in json.load(f)['changes']]
+                    except (ValueError, KeyError, TypeError) as e:
+                        print(f"Skipping malformed delta file {path}: {e}")
+                        changes = []
+                
+                for change in changes:
+                    origin, origin_seq = change[0], change[1]
+                    if origin == self.kiosk_id or origin_seq <= applied.get(origin, 0):
+                        continue
+                    
+                    cursor.execute('''
+                        INSERT OR IGNORE INTO changes
+                            (origin, origin_seq, op, employee_id, name, encoding, site, department)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    ''', change)
+                    
+                    applied[origin] = origin_seq
+                    self.set_state(cursor, f"origin:{origin}", origin_seq)
+                    imported += cursor.rowcount
+                
+                read_up_to[publisher] = last
+                self.set_state(cursor, f"file:{publisher}", last)
+            
+            conn.commit()
+        finally:
+            conn.close()
+        
+        self.acknowledge(directory, read_up_to)
+        return imported
+    
+    def ack_path(self, directory):
+        return os.path.join(directory, ACK_DIR, f"{self.kiosk_id}.json")
+    
+    def acknowledge(self, directory, read_up_to):
+        """Publish the last delta file read from every publisher as acks/<kiosk_id>.json"""
+        path = self.ack_path(directory)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump({'kiosk_id': self.kiosk_id, 'read_up_to': read_up_to}, f)
+        os.replace(temp_path, path)
+    
+    def prune_deltas(self, directory):
+        """
+        Delete this kiosk's delta files that every other kiosk has read
+        Only kiosks with an ack file count, so a kiosk that has never synced
+        doesn't hold files back - start new kiosks from a copy of the encodings
+        snapshot and log, or an `export --since 0` from a running kiosk.
+        An unreadable ack file acknowledges nothing.
+        Returns: number of files deleted
+        """
+        acknowledged = None
+        for path in glob.glob(os.path.join(directory, ACK_DIR, '*.json')):
+            if os.path.basename(path) == f"{self.kiosk_id}.json":
+                continue
+            
+            try:
+                with open(path) as f:
+                    read_up_to = int(json.load(f)['read_up_to'].get(self.kiosk_id, 0))
+            except (ValueError, KeyError, TypeError, AttributeError):
+                read_up_to = 0
+            acknowledged = read_up_to if acknowledged is None else min(acknowledged, read_up_to)
+        
+        if not acknowledged:
+            return 0
+        
+        deleted = 0
+        for path in glob.glob(os.path.join(directory, '*' + DELTA_SUFFIX)):
+            parsed = parse_delta_name(path)
+            if parsed is not None and parsed[0] == self.kiosk_id and parsed[1] <= acknowledged:
+                try:
+                    os.remove(path)
+                    deleted += 1
+                except FileNotFoundError:
+                    pass
+        
+        return deleted
+
+def main():
+    parser = argparse.ArgumentParser(description="Gallery change log and delta sync")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    
+    subparsers.add_parser('status', help="Show the log version")
+    
+    export_parser = subparsers.add_parser('export', help="Export deltas to a directory")
+    export_parser.add_argument('directory')
+    export_parser.add_argument('--since', type=int, help="Export every change after this version")
+    
+    import_parser = subparsers.add_parser('import', help="Import deltas from a directory")
+    import_parser.add_argument('directory')
+    
+    prune_parser = subparsers.add_parser('prune', help="Delete own deltas every kiosk has read")
+    prune_parser.add_argument('directory')
+    
+    args = parser.parse_args()
+    change_log = GalleryChangeLog()
+    
+    if args.command == 'status':
+        print(f"Kiosk {change_log.kiosk_id}: log version {change_log.latest_seq()}, "
+              f"exported up to {change_log.get_state('exported_seq')}")
+    elif args.command == 'export':
+        path, count = change_log.export_deltas(args.directory, args.since)
+        print(f"Exported {count} changes to {path}" if path else "Nothing to export")
+    elif args.command == 'import':
+        count = change_log.import_deltas(args.directory)
+        print(f"Imported {count} changes (running recognizers apply them automatically)")
+    elif args.command == 'prune':
+        print(f"Deleted {change_log.prune_deltas(args.directory)} delta files")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""
+Headless kiosk runner: recognition loop without the Streamlit UI
+
+    python headless.py                        # default camera
+    python headless.py --video entrance.mp4   # recorded clip
+    python headless.py --profile-seconds 30   # capture a profile at startup
+
+Send SIGUSR1 to a running process to capture a PROFILE_DEFAULT_SECONDS profile.
+"""
+import argparse
+import signal
+import time
+import cv2
+import config
+from components import ComponentRegistry
+from face_tracker import FaceTracker
+from metrics import metrics
+
+def run(registry, source, max_frames=None):
+    """Run the recognition loop until the source ends or max_frames is reached"""
+    recognizer, detector, spoof_detector, db_manager = registry.components()
+    tracker = FaceTracker(recognizer)
+    profiler = registry.profiler
+    
+    cap = cv2.VideoCapture(source)
+    frames = 0
+    last_metrics_dump = time.time()
+    last_replay = time.time()
+    
+    try:
+        while max_frames is None or frames < max_frames:
+            ret, frame = cap.read()
+            
+            if not ret:
+                print("Camera / video ended")
+                break
+            
+            frames += 1
+            
+            if profiler.on_frame():
+                print(profiler.last_report)
+            
+            face_locations, face_encodings = recognizer.detect_and_encode(frame)
+            tracks = tracker.update(face_locations, face_encodings)
+            
+            for track in tracks:
+                if not track['ready']:
+                    continue
+                
+                landmarks = detector.get_facial_landmarks(frame, [track['face_location']])
+                is_live, liveness_conf, checks = spoof_detector.is_live_person(
+                    frame, track['face_location'], landmarks
+                )
+                
+                if not is_live:
+                    print(f"Spoof detected for {track['name']} ({liveness_conf:.1f}%)")
+                    tracker.reset_evidence(track['track_id'])
+                    continue
+                
+                success, message, action = recognizer.mark_attendance(track['employee_id'])
+                print(f"{track['name']} ({track['employee_id']}): {message}")
+                if success:
+                    tracker.mark_committed(track['track_id'])
+                else:
+                    # Retry once the track has gathered evidence again
+                    tracker.reset_evidence(track['track_id'])
+            
+            if metrics.enabled and time.time() - last_metrics_dump >= config.METRICS_DUMP_INTERVAL:
+                metrics.dump()
+                last_metrics_dump = time.time()
+            
+            # Apply punches left in the journal while the database was locked
+            if db_manager.journal is not None and time.time() - last_replay >= config.JOURNAL_REPLAY_INTERVAL:
+                db_manager.replay_journal(timeout=config.JOURNAL_APPLY_TIMEOUT)
+                last_replay = time.time()
+            
+            # Pick up enrollments / deletions and settings changed elsewhere
+            recognizer.poll_gallery()
+            registry.settings.poll()
+    finally:
+        if profiler.stop():
+            print(profiler.last_report)
+        if db_manager.journal is not None:
+            db_manager.journal.sync()
+        cap.release()
+    
+    return frames
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless attendance kiosk")
+    parser.add_argument('--camera', type=int, default=config.CAMERA_INDEX, help="Camera index")
+    parser.add_argument('--video', help="Video file to use instead of a camera")
+    parser.add_argument('--max-frames', type=int, help="Stop after this many frames")
+    parser.add_argument('--profile-seconds', type=float, help="Profile the first N seconds")
+    parser.add_argument('--profile-frames', type=int, help="Profile the first N frames")
+    args = parser.parse_args()
+    
+    registry = ComponentRegistry()
+    registry.warm_up()
+    
+    if config.METRICS_HTTP_PORT:
+        metrics.start_http_server()
+    
+    if args.profile_seconds or args.profile_frames:
+        registry.profiler.request(seconds=args.profile_seconds, frames=args.profile_frames)
+    
+    if hasattr(signal, 'SIGUSR1'):
+        signal.signal(signal.SIGUSR1, lambda signum, frame: registry.profiler.request())
+    
+    source = args.video if args.video else args.camera
+    frames = run(registry, source, args.max_frames)
+    print(f"Processed {frames} frames")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,213 @@
+import bisect
+import functools
+import os
+import threading
+import time
+import config
+
+# Upper bounds in seconds; the last bucket is +Inf
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+class Histogram:
+    """
+    Fixed-bucket latency histogram (cumulative counts are computed on export)
+    """
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+    
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.total += value
+            self.count += 1
+    
+    def quantile(self, q):
+        """
+        Estimate a quantile from the buckets (upper bound of the bucket it falls in)
+        """
+        with self._lock:
+            counts = list(self.counts)
+            count = self.count
+        
+        if count == 0:
+            return None
+        
+        target = q * count
+        running = 0
+        for index, bucket_count in enumerate(counts):
+            running += bucket_count
+            if running >= target:
+                return self.buckets[index] if index < len(self.buckets) else float('inf')
+        
+        return float('inf')
+
+class MetricsRegistry:
+    """
+    Process-wide stage timers and counters
+    When disabled, timers and counters return immediately
+    """
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.histograms = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+        self._server = None
+    
+    def histogram(self, stage):
+        histogram = self.histograms.get(stage)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(stage, Histogram())
+        return histogram
+    
+    def observe(self, stage, seconds):
+        """Record a stage latency in seconds"""
+        if self.enabled:
+            self.histogram(stage).observe(seconds)
+    
+    def inc(self, name, amount=1):
+        """Increment a counter"""
+        if self.enabled:
+            with self._lock:
+                self.counters[name] = self.counters.get(name, 0) + amount
+    
+    def timed(self, stage):
+        """
+        Decorator that records a function's latency under `stage`
+        """
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.histogram(stage).observe(time.perf_counter() - start)
+            return wrapper
+        return decorator
+    
+    def reset(self):
+        """Clear all recorded values"""
+        with self._lock:
+            self.histograms = {}
+            self.counters = {}
+    
+    def copy(self):
+        """
+        Copies of the histogram and counter dicts, safe to iterate while other
+        threads add stages and counters
+        Returns: (dict of stage -> Histogram, dict of counters)
+        """
+        with self._lock:
+            return dict(self.histograms), dict(self.counters)
+    
+    def snapshot(self):
+        """
+        Summary of all stages and counters
+        Returns: (list of stage dicts, dict of counters)
+        """
+        histograms, counters = self.copy()
+        
+        stages = []
+        for stage, histogram in sorted(histograms.items()):
+            if histogram.count == 0:
+                continue
+            
+            stages.append({
+                'stage': stage,
+                'count': histogram.count,
+                'mean_ms': round(1000 * histogram.total / histogram.count, 2),
+                'p50_ms': round(1000 * histogram.quantile(0.5), 2),
+                'p95_ms': round(1000 * histogram.quantile(0.95), 2),
+                'p99_ms': round(1000 * histogram.quantile(0.99), 2),
+            })
+        
+        return stages, counters
+    
+    def render_prometheus(self):
+        """Render all metrics in the Prometheus text exposition format"""
+        lines = [
+            '# HELP attendance_stage_seconds Latency of pipeline stages',
+            '# TYPE attendance_stage_seconds histogram',
+        ]
+        histograms, counters = self.copy()
+        
+        for stage, histogram in sorted(histograms.items()):
+            with histogram._lock:
+                counts = list(histogram.counts)
+                total = histogram.total
+                count = histogram.count
+            
+            running = 0
+            for bound, bucket_count in zip(histogram.buckets, counts):
+                running += bucket_count
+                lines.append(f'attendance_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {running}')
+            
+            lines.append(f'attendance_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {count}')
+            lines.append(f'attendance_stage_seconds_sum{{stage="{stage}"}} {total:.6f}')
+            lines.append(f'attendance_stage_seconds_count{{stage="{stage}"}} {count}')
+        
+        for name, value in sorted(counters.items()):
+            lines.append(f'# TYPE attendance_{name}_total counter')
+            lines.append(f'attendance_{name}_total {value}')
+        
+        return '\n'.join(lines) + '\n'
+    
+    def dump(self, path=None):
+        """Write the Prometheus text to a file (atomically)"""
+        path = path or config.METRICS_DUMP_PATH
+        tmp_path = path + '.tmp'
+        
+        with open(tmp_path, 'w') as f:
+            f.write(self.render_prometheus())
+        os.replace(tmp_path, path)
+        
+        return path
+    
+    def start_http_server(self, port=None, host=None):
+        """
+        Serve GET /metrics from a daemon thread
+        Listens on METRICS_HTTP_HOST (loopback unless configured otherwise)
+        """
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        
+        if self._server is not None:
+            return self._server
+        
+        registry = self
+        host = config.METRICS_HTTP_HOST if host is None else host
+        
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                
+                body = registry.render_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def log_message(self, format, *args):
+                pass
+        
+        self._server = ThreadingHTTPServer(
+            (host, config.METRICS_HTTP_PORT if port is None else port), MetricsHandler
+        )
+        threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True).start()
+        print(f"Metrics available at http://{host}:{self._server.server_address[1]}/metrics")
+        
+        return self._server
+
+metrics = MetricsRegistry(enabled=config.METRICS_ENABLED)
+timed = metrics.timed
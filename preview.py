@@ -0,0 +1,84 @@
+import time
+import cv2
+import config
+from metrics import metrics
+
+def encode_preview(frame, max_width=None, jpeg_quality=None, boxes=(), draw=None):
+    """
+    Downscale a BGR frame and encode it as JPEG for the browser
+    boxes: list of (face_location, name, color) in full-frame coordinates, drawn
+    on the small image with draw(frame, face_location, name, color)
+    Returns: JPEG bytes
+    """
+    max_width = config.PREVIEW_MAX_WIDTH if max_width is None else max_width
+    jpeg_quality = config.PREVIEW_JPEG_QUALITY if jpeg_quality is None else jpeg_quality
+    
+    scale = min(1.0, max_width / frame.shape[1]) if max_width else 1.0
+    if scale < 1.0:
+        size = (int(round(frame.shape[1] * scale)), int(round(frame.shape[0] * scale)))
+        small = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+    else:
+        small = frame.copy() if boxes else frame
+    
+    for face_location, name, color in boxes:
+        scaled_location = tuple(int(round(value * scale)) for value in face_location)
+        small = draw(small, scaled_location, name, color)
+    
+    # imencode takes BGR directly, so no color conversion is needed
+    ok, jpeg = cv2.imencode('.jpg', small, [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality])
+    if not ok:
+        raise ValueError("Could not encode preview frame")
+    return jpeg.tobytes()
+
+class StatusSlot:
+    """
+    A Streamlit placeholder that is only rewritten when its content changes
+    """
+    def __init__(self, placeholder):
+        self.placeholder = placeholder
+        self.content = None
+    
+    def show(self, kind, text):
+        """kind: 'success', 'info', 'warning' or 'error'"""
+        if self.content != (kind, text):
+            getattr(self.placeholder, kind)(text)
+            self.content = (kind, text)
+    
+    def clear(self):
+        if self.content is not None:
+            self.placeholder.empty()
+            self.content = None
+
+class PreviewRenderer:
+    """
+    Sends the camera preview to the UI at no more than max_fps, as a downscaled JPEG
+    Recognition keeps running on every frame; skipped frames are never drawn,
+    resized or encoded.
+    """
+    def __init__(self, placeholder, max_fps=None, max_width=None, jpeg_quality=None):
+        self.placeholder = placeholder
+        self.max_fps = config.PREVIEW_MAX_FPS if max_fps is None else max_fps
+        self.max_width = config.PREVIEW_MAX_WIDTH if max_width is None else max_width
+        self.jpeg_quality = config.PREVIEW_JPEG_QUALITY if jpeg_quality is None else jpeg_quality
+        self.last_render = None  # perf_counter() of the last frame sent
+    
+    def due(self):
+        """Check if the next frame should be shown"""
+        if not self.max_fps or self.last_render is None:
+            return True
+        return time.perf_counter() - self.last_render >= 1.0 / self.max_fps
+    
+    def render(self, frame, boxes=(), draw=None):
+        """
+        Show a frame if the FPS cap allows it
+        Returns: True if the frame was sent to the UI
+        """
+        if not self.due():
+            metrics.inc('preview_frames_skipped')
+            return False
+        
+        self.last_render = start = time.perf_counter()
+        jpeg = encode_preview(frame, self.max_width, self.jpeg_quality, boxes, draw)
+        self.placeholder.image(jpeg, use_container_width=True)
+        metrics.observe('ui.preview', time.perf_counter() - start)
+        return True
@@ -0,0 +1,146 @@
+import cProfile
+import os
+import pstats
+import threading
+import time
+from datetime import datetime
+import cv2
+import config
+
+# Groups used when summarizing a profile, matched against file names / builtin names
+MODULE_GROUPS = [
+    ('face_detector', ('face_detector.py',)),
+    ('face_recognizer', ('face_recognizer.py', 'face_tracker.py')),
+    ('spoof_detector', ('spoof_detector.py',)),
+    ('attendance_manager', ('attendance_manager.py', 'sqlite3')),
+    ('dlib', ('dlib', 'face_recognition')),
+    ('opencv', ('cv2',)),
+    ('numpy', ('numpy',)),
+    ('instrumentation', ('metrics.py', 'profiler.py')),
+]
+
+def module_group(filename, function_name):
+    """Map a profile entry to one of MODULE_GROUPS (or 'other')"""
+    location = filename if filename != '~' else function_name
+    
+    # OpenCV functions show up as bare builtins, e.g. '<cvtColor>'
+    if filename == '~' and hasattr(cv2, function_name.strip('<>')):
+        return 'opencv'
+    
+    for group, patterns in MODULE_GROUPS:
+        if any(pattern in location for pattern in patterns):
+            return group
+    
+    return 'other'
+
+def summarize_profile(stats, top=None):
+    """
+    Group the hottest functions of a profile by module
+    Returns: report text
+    """
+    top = top or config.PROFILE_TOP_FUNCTIONS
+    groups = {}
+    
+    for (filename, lineno, function_name), (cc, nc, tt, ct, callers) in stats.stats.items():
+        group = module_group(filename, function_name)
+        entry = groups.setdefault(group, {'self_time': 0.0, 'functions': []})
+        entry['self_time'] += tt
+        
+        label = function_name if filename == '~' else f"{os.path.basename(filename)}:{lineno}({function_name})"
+        entry['functions'].append((tt, ct, nc, label))
+    
+    total = sum(entry['self_time'] for entry in groups.values()) or 1.0
+    lines = [f"Total profiled time: {total:.3f}s"]
+    
+    for group, entry in sorted(groups.items(), key=lambda item: item[1]['self_time'], reverse=True):
+        lines.append("")
+        lines.append(f"{group}: {entry['self_time']:.3f}s ({100 * entry['self_time'] / total:.1f}%)")
+        
+        for tt, ct, nc, label in sorted(entry['functions'], reverse=True)[:top]:
+            lines.append(f"    {tt:8.3f}s self  {ct:8.3f}s cumulative  {nc:7d} calls  {label}")
+    
+    return "\n".join(lines)
+
+class LoopProfiler:
+    """
+    On-demand cProfile capture of the recognition loop
+    request() can be called from any thread; the loop calls on_frame() once per
+    frame, which starts and stops the capture on the loop's own thread
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._requested = None
+        self._profile = None
+        self._started_at = None
+        self._frames = 0
+        self._limits = (None, None)
+        self.last_report = None
+        self.last_path = None
+    
+    def request(self, seconds=None, frames=None):
+        """Ask the loop to capture a profile for N seconds or N frames"""
+        if seconds is None and frames is None:
+            seconds = config.PROFILE_DEFAULT_SECONDS
+        
+        with self._lock:
+            self._requested = (seconds, frames)
+    
+    @property
+    def active(self):
+        return self._profile is not None
+    
+    @property
+    def pending(self):
+        return self._requested is not None
+    
+    def on_frame(self):
+        """
+        Start a requested capture or count a frame of the running one
+        Returns: path of the saved profile when a capture finishes, else None
+        """
+        if self._profile is None:
+            with self._lock:
+                requested, self._requested = self._requested, None
+            
+            if requested is not None:
+                self._limits = requested
+                self._frames = 0
+                self._started_at = time.time()
+                self._profile = cProfile.Profile()
+                self._profile.enable()
+            return None
+        
+        self._frames += 1
+        seconds, frames = self._limits
+        
+        if (frames is not None and self._frames >= frames) or \
+           (seconds is not None and time.time() - self._started_at >= seconds):
+            return self.stop()
+        
+        return None
+    
+    def stop(self):
+        """
+        Stop the running capture, save it under LOGS_DIR and build the report
+        Returns: path of the saved .prof file
+        """
+        if self._profile is None:
+            return None
+        
+        profile, self._profile = self._profile, None
+        profile.disable()
+        
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        path = os.path.join(config.LOGS_DIR, f"profile_{timestamp}.prof")
+        profile.dump_stats(path)
+        
+        stats = pstats.Stats(profile)
+        header = (
+            f"Profile of {self._frames} frames over {time.time() - self._started_at:.1f}s "
+            f"saved to {path}"
+        )
+        
+        self.last_report = header + "\n" + summarize_profile(stats)
+        self.last_path = path
+        
+        return path
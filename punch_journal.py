@@ -0,0 +1,250 @@
+"""
+Crash-safe append-only journal of punch events
+
+A punch is written to the journal before it is acknowledged and applied to
+SQLite afterwards, so a crash between recognition and the database commit, or
+a locked database, doesn't lose it. Each event has a sequence number; the
+database keeps the last applied one, which makes replay idempotent.
+
+File layout: an 8-byte magic, then records of
+
+    seq (uint64) | punched_at (int64) | action (uint8) | id length (uint16) | employee_id | crc32
+
+A torn record at the end (crash mid-write) fails its checksum and is dropped.
+Writes go straight to the OS; fsync is batched every JOURNAL_FSYNC_INTERVAL
+seconds by a background thread. A journal has a single writer: the process
+holding the exclusive lock on <path>.lock, taken when the journal is opened.
+"""
+import os
+import struct
+import threading
+import time
+import zlib
+import config
+from metrics import metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+MAGIC = b'PUNCHJ01'
+HEADER = struct.Struct('<QqBH')
+CRC = struct.Struct('<I')
+ACTIONS = ('punch-in', 'punch-out')
+
+def encode_event(seq, employee_id, action, punched_at):
+    """Binary record of one punch"""
+    employee_bytes = employee_id.encode('utf-8')
+    body = HEADER.pack(seq, punched_at, ACTIONS.index(action), len(employee_bytes)) + employee_bytes
+    return body + CRC.pack(zlib.crc32(body))
+
+def decode_events(data):
+    """
+    Events of a journal file
+    Returns: (list of (seq, employee_id, action, punched_at), end offset of the last valid record)
+    """
+    events = []
+    offset = len(MAGIC)
+    
+    while offset + HEADER.size <= len(data):
+        seq, punched_at, action, length = HEADER.unpack_from(data, offset)
+        end = offset + HEADER.size + length
+        if end + CRC.size > len(data) or action >= len(ACTIONS):
+            break
+        if CRC.unpack_from(data, end)[0] != zlib.crc32(data[offset:end]):
+            break
+        
+        employee_id = data[offset + HEADER.size:end].decode('utf-8')
+        events.append((seq, employee_id, ACTIONS[action], punched_at))
+        offset = end + CRC.size
+    
+    return events, offset
+
+class JournalLockedError(RuntimeError):
+    """The journal is held by another writer"""
+
+def lock_exclusive(f):
+    """
+    Non-blocking exclusive lock on an open file, released when it is closed
+    Raises: OSError if another open file (in any process) holds it
+    """
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+
+class PunchJournal:
+    def __init__(self, path=None, fsync_interval=None):
+        self.path = path or config.PUNCH_JOURNAL_PATH
+        self.fsync_interval = config.JOURNAL_FSYNC_INTERVAL if fsync_interval is None else fsync_interval
+        self.events = []  # Events not known to be applied, oldest first
+        self.last_seq = 0
+        self._last_punches = {}  # employee_id -> (action, punched_at) of the newest journaled punch
+        self._valid_bytes = len(MAGIC)
+        self._file = None  # Opened by the first append
+        self._dirty = False
+        self._closed = False
+        self._lock = threading.Lock()
+        self._synced = threading.Condition(self._lock)
+        self._flusher = None
+        self._lock_file = None
+        self.claim()
+        self.load()
+    
+    def claim(self):
+        """
+        Become the journal's only writer
+        Raises: JournalLockedError if another process (or another open journal) holds it
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        lock_file = open(self.path + '.lock', 'a+b')
+        
+        try:
+            lock_exclusive(lock_file)
+        except OSError:
+            lock_file.close()
+            raise JournalLockedError(f"Punch journal {self.path} is in use by another process")
+        
+        self._lock_file = lock_file
+    
+    def load(self):
+        """Read the events in the journal file"""
+        if not os.path.exists(self.path):
+            return
+        
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        
+        if not data.startswith(MAGIC):
+            raise ValueError(f"{self.path} is not a punch journal")
+        
+        events, self._valid_bytes = decode_events(data)
+        if self._valid_bytes < len(data):
+            print(f"Ignoring {len(data) - self._valid_bytes} bytes of incomplete journal record")
+        
+        for event in events:
+            self._remember(event)
+    
+    def _remember(self, event):
+        seq, employee_id, action, punched_at = event
+        self.events.append(event)
+        self.last_seq = max(self.last_seq, seq)
+        self._last_punches[employee_id] = (action, punched_at)
+    
+    def _open(self):
+        """Open for appending, cutting off a torn record left by a crash"""
+        if not os.path.exists(self.path):
+            with open(self.path, 'wb') as f:
+                f.write(MAGIC)
+                f.flush()
+                os.fsync(f.fileno())
+        elif os.path.getsize(self.path) > self._valid_bytes:
+            with open(self.path, 'r+b') as f:
+                f.truncate(self._valid_bytes)
+        
+        self._file = open(self.path, 'ab', buffering=0)
+    
+    def advance(self, seq):
+        """Continue numbering after seq (the last sequence number the database has seen)"""
+        with self._lock:
+            self.last_seq = max(self.last_seq, seq)
+    
+    def append(self, employee_id, action, punched_at):
+        """
+        Journal a punch (one sequential write; fsync follows within fsync_interval)
+        Returns: sequence number of the event
+        """
+        with self._lock:
+            if self._file is None:
+                self._open()
+            
+            seq = self.last_seq + 1
+            self._file.write(encode_event(seq, employee_id, action, punched_at))
+            self._remember((seq, employee_id, action, punched_at))
+            self._dirty = True
+            
+            if self.fsync_interval <= 0:
+                self._fsync()
+            elif self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_loop, name="punch-journal-fsync", daemon=True)
+                self._flusher.start()
+            else:
+                self._synced.notify()
+        
+        metrics.inc('journal_appends')
+        return seq
+    
+    def _fsync(self):
+        """Caller holds the lock"""
+        if self._dirty and self._file is not None:
+            os.fsync(self._file.fileno())
+            self._dirty = False
+            metrics.inc('journal_fsyncs')
+    
+    def _flush_loop(self):
+        """Group commit: one fsync per interval covers every punch written in it"""
+        while True:
+            with self._lock:
+                while not self._dirty and not self._closed:
+                    self._synced.wait()
+                if self._closed:
+                    return
+            
+            # Let more punches join this fsync
+            time.sleep(self.fsync_interval)
+            self.sync()
+    
+    def sync(self):
+        """Force journaled punches to disk now"""
+        with self._lock:
+            self._fsync()
+    
+    def events_after(self, seq):
+        """Journaled events with a sequence number above seq, oldest first"""
+        with self._lock:
+            return [event for event in self.events if event[0] > seq]
+    
+    def last_punch(self, employee_id):
+        """Newest journaled punch of an employee: (action, punched_at) or None"""
+        return self._last_punches.get(employee_id)
+    
+    def size_bytes(self):
+        return os.path.getsize(self.path) if os.path.exists(self.path) else 0
+    
+    def applied(self, seq):
+        """
+        Forget events up to seq (they are in the database)
+        The writer also rewrites the file once it exceeds JOURNAL_MAX_BYTES
+        """
+        with self._lock:
+            self.events = [event for event in self.events if event[0] > seq]
+            
+            if self._file is None or self.size_bytes() <= config.JOURNAL_MAX_BYTES:
+                return
+            
+            temp_path = self.path + '.tmp'
+            with open(temp_path, 'wb') as f:
+                f.write(MAGIC + b''.join(encode_event(*event) for event in self.events))
+                f.flush()
+                os.fsync(f.fileno())
+            
+            self._file.close()
+            os.replace(temp_path, self.path)
+            self._file = open(self.path, 'ab', buffering=0)
+            self._valid_bytes = self.size_bytes()
+            self._dirty = False
+    
+    def close(self):
+        with self._lock:
+            self._fsync()
+            self._closed = True
+            self._synced.notify_all()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            if self._lock_file is not None:
+                self._lock_file.close()
+                self._lock_file = None
@@ -0,0 +1,458 @@
+"""
+Local recognition service: a small HTTP/JSON API around the recognizer
+
+    python recognition_service.py               # SERVICE_HOST:SERVICE_PORT
+    python recognition_service.py --port 9000
+
+Endpoints:
+    GET  /health                 gallery size and queue depths
+    POST /recognize              image bytes (JPEG / PNG), or JSON {"encodings": [[128 floats], ...]}
+    POST /enroll?employee_id=... image bytes - with &name= (&email=, &department=, &site=) a new
+                                 user is registered, otherwise the photo is added as a template
+    POST /punch                  image bytes of one face: recognize, check liveness, mark attendance
+                                 (off unless SERVICE_PUNCH_ENABLED - see config.py)
+
+Requests pass two bounded stages. Image decoding, detection and encoding run on
+SERVICE_WORKERS threads; the encodings of concurrent requests are then matched
+against the gallery together, up to SERVICE_BATCH_SIZE requests per pass (a
+batch waits SERVICE_BATCH_WAIT for company). When a stage already has
+SERVICE_QUEUE_SIZE requests waiting, new ones get 503 with Retry-After instead
+of piling up.
+"""
+import argparse
+import asyncio
+import json
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+import cv2
+import numpy as np
+import config
+from components import ComponentRegistry
+from metrics import metrics
+from face_gallery import ENCODING_SIZE
+from spoof_detector import SpoofDetector
+
+Request = namedtuple('Request', ['method', 'path', 'query', 'headers', 'version', 'body'])
+
+class HTTPError(Exception):
+    """Request failure answered with the given status and {"error": message}"""
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+def decode_image(body):
+    """Uploaded JPEG / PNG bytes -> BGR frame"""
+    frame = cv2.imdecode(np.frombuffer(body, dtype=np.uint8), cv2.IMREAD_COLOR) if body else None
+    if frame is None:
+        raise HTTPError(400, "Body is not a readable image")
+    return frame
+
+def parse_encodings(body):
+    """JSON {"encodings": [[128 floats], ...]} -> float32 array"""
+    try:
+        encodings = np.asarray(json.loads(body)['encodings'], dtype=np.float32)
+    except (ValueError, KeyError, TypeError):
+        encodings = None
+    
+    if encodings is None or encodings.ndim != 2 or encodings.shape[1] != ENCODING_SIZE:
+        raise HTTPError(400, f'Expected JSON {{"encodings": [[{ENCODING_SIZE} floats], ...]}}')
+    return encodings
+
+def describe_face(face_location, match, tolerance):
+    """JSON form of one face and its match (employee_id is None when nobody is within tolerance)"""
+    recognized = match is not None and match[2] <= tolerance
+    return {
+        'face_location': [int(value) for value in face_location] if face_location is not None else None,
+        'employee_id': match[0] if recognized else None,
+        'name': match[1] if recognized else None,
+        'distance': round(float(match[2]), 4) if match is not None else None,
+        'confidence': round((1 - float(match[2])) * 100, 2) if recognized else None,
+    }
+
+def keep_alive(request):
+    connection = request.headers.get('connection', '').lower()
+    if request.version == 'HTTP/1.0':
+        return connection == 'keep-alive'
+    return connection != 'close'
+
+class RecognitionService:
+    def __init__(self, recognizer, settings=None, workers=None, queue_size=None,
+                 batch_size=None, batch_wait=None, max_body_bytes=None):
+        self.recognizer = recognizer
+        self.db_manager = recognizer.db_manager
+        self.settings = settings  # SettingsStore polled for changes made elsewhere (optional)
+        self.workers = workers or config.SERVICE_WORKERS
+        self.queue_size = queue_size or config.SERVICE_QUEUE_SIZE
+        self.batch_size = batch_size or config.SERVICE_BATCH_SIZE
+        self.batch_wait = config.SERVICE_BATCH_WAIT if batch_wait is None else batch_wait
+        self.max_body_bytes = max_body_bytes or config.SERVICE_MAX_BODY_BYTES
+        
+        self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix='service-worker')
+        # One batch is matched at a time; requests arriving meanwhile join the next one
+        self._match_executor = ThreadPoolExecutor(1, thread_name_prefix='service-match')
+        self._jobs = None  # Bounded queues, created on the service's event loop
+        self._matches = None
+        self._tasks = []
+        self._last_replay = time.time()
+        
+        self.routes = {
+            ('GET', '/health'): self.health,
+            ('POST', '/recognize'): self.recognize,
+            ('POST', '/enroll'): self.enroll,
+            ('POST', '/punch'): self.punch,
+        }
+    
+    async def start(self, host=None, port=None):
+        """
+        Start the stage workers and listen (port 0 picks a free port)
+        Returns: asyncio.Server
+        """
+        self._jobs = asyncio.Queue(self.queue_size)
+        self._matches = asyncio.Queue(self.queue_size)
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._batch_matches()))
+        self._tasks.append(asyncio.create_task(self._maintain()))
+        
+        return await asyncio.start_server(
+            self._serve_connection,
+            host or config.SERVICE_HOST,
+            config.SERVICE_PORT if port is None else port,
+        )
+    
+    async def stop(self, server):
+        server.close()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        
+        self._executor.shutdown()
+        self._match_executor.shutdown()
+        if self.db_manager.journal is not None:
+            self.db_manager.journal.sync()
+    
+    async def serve(self, host=None, port=None):
+        """Run until cancelled (Ctrl+C)"""
+        server = await self.start(host, port)
+        host, port = server.sockets[0].getsockname()[:2]
+        print(f"Recognition service listening on http://{host}:{port}")
+        
+        try:
+            await server.serve_forever()
+        finally:
+            await self.stop(server)
+    
+    async def run_job(self, func, *args):
+        """
+        Run func(*args) on a worker thread
+        Raises: HTTPError(503) when SERVICE_QUEUE_SIZE jobs are already waiting
+        """
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._jobs.put_nowait((func, args, future))
+        except asyncio.QueueFull:
+            metrics.inc('service_rejected')
+            raise HTTPError(503, "Service busy, retry later")
+        return await future
+    
+    async def match(self, encodings):
+        """
+        Match encodings against the gallery, batched with other requests
+        Returns: list of (employee_id, name, distance, runner_up_distance) or None
+        Raises: HTTPError(503) when SERVICE_QUEUE_SIZE requests are already waiting
+        """
+        if len(encodings) == 0:
+            return []
+        
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._matches.put_nowait((encodings, future))
+        except asyncio.QueueFull:
+            metrics.inc('service_rejected')
+            raise HTTPError(503, "Service busy, retry later")
+        return await future
+    
+    async def _work(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            func, args, future = await self._jobs.get()
+            if future.done():
+                continue  # Client went away while the job was queued
+            
+            try:
+                result = await loop.run_in_executor(self._executor, func, *args)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():
+                    future.set_result(result)
+    
+    async def _batch_matches(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._matches.get()]
+            
+            if self._matches.qsize() < self.batch_size - 1 and self.batch_wait > 0:
+                await asyncio.sleep(self.batch_wait)
+            while len(batch) < self.batch_size and not self._matches.empty():
+                batch.append(self._matches.get_nowait())
+            
+            batch = [(encodings, future) for encodings, future in batch if not future.done()]
+            if not batch:
+                continue
+            
+            encodings = [encoding for request_encodings, _ in batch for encoding in request_encodings]
+            try:
+                matches = await loop.run_in_executor(
+                    self._match_executor, self.recognizer.match_identities, encodings
+                )
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            
+            metrics.inc('service_batches')
+            metrics.inc('service_batched_requests', len(batch))
+            
+            start = 0
+            for request_encodings, future in batch:
+                end = start + len(request_encodings)
+                if not future.done():
+                    future.set_result(matches[start:end])
+                start = end
+    
+    async def _maintain(self):
+        """Follow gallery and settings changes and apply journaled punches, like the camera loops"""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(1)
+            try:
+                await loop.run_in_executor(self._executor, self._poll)
+            except Exception as e:
+                print(f"Error polling for changes: {e}")
+    
+    def _poll(self):
+        self.recognizer.poll_gallery()
+        if self.settings is not None:
+            self.settings.poll()
+        
+        if self.db_manager.journal is not None and time.time() - self._last_replay >= config.JOURNAL_REPLAY_INTERVAL:
+            self.db_manager.replay_journal(timeout=config.JOURNAL_APPLY_TIMEOUT)
+            self._last_replay = time.time()
+    
+    def _detect(self, body):
+        """Returns: (frame, face_locations, face_encodings) of an uploaded image"""
+        frame = decode_image(body)
+        face_locations, face_encodings = self.recognizer.detect_and_encode(frame)
+        return frame, face_locations, face_encodings
+    
+    def _enroll(self, body, employee_id, query):
+        frame = decode_image(body)
+        if query.get('name'):
+            return self.recognizer.register_new_face(
+                frame, query['name'], employee_id,
+                query.get('email'), query.get('department'), query.get('site')
+            )
+        return self.recognizer.add_face_template(frame, employee_id)
+    
+    def _check_liveness(self, frame, face_location):
+        """
+        Liveness of a single uploaded image
+        Each request gets its own SpoofDetector so blink / movement history is not
+        shared between clients; from one image only the texture and color checks
+        can pass, which a photo of the employee may also pass - hence SERVICE_PUNCH_ENABLED.
+        """
+        spoof_detector = SpoofDetector()
+        spoof_detector.apply_settings(self.recognizer.settings)
+        landmarks = self.recognizer.detector.get_facial_landmarks(frame, [face_location])
+        return spoof_detector.is_live_person(frame, face_location, landmarks)
+    
+    async def health(self, request):
+        return 200, {
+            'status': 'ok',
+            'templates': len(self.recognizer.gallery),
+            'employees': self.recognizer.gallery.identity_count(),
+            'queued_jobs': self._jobs.qsize(),
+            'queued_matches': self._matches.qsize(),
+        }
+    
+    async def recognize(self, request):
+        if request.headers.get('content-type', '').startswith('application/json'):
+            face_encodings = parse_encodings(request.body)
+            face_locations = [None] * len(face_encodings)
+        else:
+            _, face_locations, face_encodings = await self.run_job(self._detect, request.body)
+        
+        matches = await self.match(face_encodings)
+        tolerance = self.recognizer.tolerance
+        return 200, {
+            'faces': [describe_face(location, match, tolerance) for location, match in zip(face_locations, matches)]
+        }
+    
+    async def enroll(self, request):
+        employee_id = request.query.get('employee_id')
+        if not employee_id:
+            raise HTTPError(400, "employee_id is required")
+        
+        success, message = await self.run_job(self._enroll, request.body, employee_id, request.query)
+        return 200, {'success': success, 'message': message}
+    
+    async def punch(self, request):
+        if not config.SERVICE_PUNCH_ENABLED:
+            raise HTTPError(403, "Punching is disabled: single-image liveness can't stop photo replays "
+                                 "(set SERVICE_PUNCH_ENABLED to allow it)")
+        
+        frame, face_locations, face_encodings = await self.run_job(self._detect, request.body)
+        
+        if len(face_locations) != 1:
+            message = "No face detected" if len(face_locations) == 0 else "Multiple faces detected"
+            return 200, {'success': False, 'message': message}
+        
+        matches = await self.match(face_encodings)
+        face = describe_face(face_locations[0], matches[0], self.recognizer.tolerance)
+        
+        if face['employee_id'] is None:
+            return 200, {'success': False, 'message': "Face not recognized", 'face': face}
+        
+        is_live, liveness_conf, checks = await self.run_job(self._check_liveness, frame, face_locations[0])
+        if not is_live:
+            return 200, {
+                'success': False,
+                'message': f"Liveness check failed ({liveness_conf:.1f}%)",
+                'face': face,
+                'liveness': {check: bool(passed) for check, passed in checks.items()},
+            }
+        
+        success, message, action = await self.run_job(self.recognizer.mark_attendance, face['employee_id'])
+        return 200, {'success': success, 'message': message, 'action': action, 'face': face}
+    
+    async def _serve_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except HTTPError as e:
+                    await self._respond(writer, e.status, {'error': str(e)}, keep_alive=False)
+                    break
+                
+                if request is None:
+                    break
+                
+                status, payload = await self._dispatch(request)
+                persistent = keep_alive(request)
+                await self._respond(writer, status, payload, persistent)
+                if not persistent:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+    
+    async def _read_request(self, reader):
+        """
+        Read one HTTP/1.1 request (bodies need a Content-Length)
+        Returns: Request, or None once the client has closed the connection
+        """
+        try:
+            head = await reader.readuntil(b'\r\n\r\n')
+        except asyncio.IncompleteReadError as e:
+            if e.partial.strip():
+                raise HTTPError(400, "Incomplete request")
+            return None
+        except asyncio.LimitOverrunError:
+            raise HTTPError(431, "Request headers too large")
+        
+        lines = head.decode('latin-1').split('\r\n')
+        try:
+            method, target, version = lines[0].split(' ')
+        except ValueError:
+            raise HTTPError(400, "Malformed request line")
+        
+        headers = {}
+        for line in lines[1:]:
+            if line:
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+        
+        if 'chunked' in headers.get('transfer-encoding', '').lower():
+            raise HTTPError(411, "Chunked bodies are not supported, send a Content-Length")
+        
+        try:
+            length = int(headers.get('content-length', 0))
+        except ValueError:
+            raise HTTPError(400, "Invalid Content-Length")
+        
+        if length > self.max_body_bytes:
+            raise HTTPError(413, f"Body larger than {self.max_body_bytes} bytes")
+        
+        body = await reader.readexactly(length) if length else b''
+        url = urlsplit(target)
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        return Request(method.upper(), url.path, query, headers, version, body)
+    
+    async def _dispatch(self, request):
+        """Returns: (status, JSON payload)"""
+        handler = self.routes.get((request.method, request.path))
+        if handler is None:
+            if any(path == request.path for _, path in self.routes):
+                return 405, {'error': "Method not allowed"}
+            return 404, {'error': "Not found"}
+        
+        metrics.inc('service_requests')
+        start = time.perf_counter()
+        
+        try:
+            status, payload = await handler(request)
+        except HTTPError as e:
+            status, payload = e.status, {'error': str(e)}
+        except Exception as e:
+            metrics.inc('service_errors')
+            print(f"Error handling {request.method} {request.path}: {e}")
+            status, payload = 500, {'error': str(e)}
+        
+        metrics.observe('service' + request.path.replace('/', '.'), time.perf_counter() - start)
+        return status, payload
+    
+    async def _respond(self, writer, status, payload, keep_alive=True):
+        body = json.dumps(payload).encode()
+        head = [
+            f"HTTP/1.1 {status} {HTTPStatus(status).phrase}",
+            "Content-Type: application/json",
+            f"Content-Length: {len(body)}",
+        ]
+        if status == 503:
+            head.append("Retry-After: 1")
+        if not keep_alive:
+            head.append("Connection: close")
+        
+        writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + body)
+        await writer.drain()
+
+def main():
+    parser = argparse.ArgumentParser(description="Local recognition service")
+    parser.add_argument('--host', default=config.SERVICE_HOST)
+    parser.add_argument('--port', type=int, default=config.SERVICE_PORT)
+    parser.add_argument('--workers', type=int, default=config.SERVICE_WORKERS)
+    args = parser.parse_args()
+    
+    # Runs next to the kiosk UI on the same host, so it journals punches separately
+    registry = ComponentRegistry(journal_path=config.SERVICE_PUNCH_JOURNAL_PATH, kiosk_id=config.SERVICE_KIOSK_ID)
+    registry.warm_up()
+    
+    if config.METRICS_HTTP_PORT:
+        metrics.start_http_server()
+    
+    service = RecognitionService(registry.recognizer, registry.settings, workers=args.workers)
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        print("Recognition service stopped")
+    finally:
+        registry.db_manager.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+"""
+Runtime-adjustable recognition, liveness and punch settings
+
+The Settings page writes them to a small JSON file; running components observe
+the store and swap in the new values between frames, so nothing is restarted
+and no model or gallery is reloaded. Other processes (headless kiosks) pick up
+the file with poll().
+"""
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+import config
+from metrics import metrics
+
+Settings = namedtuple('Settings', [
+    'tolerance',
+    'consecutive_frames',
+    'blink_detection',
+    'movement_detection',
+    'min_time_between_punches',
+])
+
+# Allowed ranges (same as the Settings page controls)
+LIMITS = {
+    'tolerance': (0.3, 0.8),
+    'consecutive_frames': (1, 10),
+    'min_time_between_punches': (10, 300),
+}
+
+def default_settings():
+    """Settings from config.py"""
+    return Settings(
+        tolerance=config.FACE_RECOGNITION_TOLERANCE,
+        consecutive_frames=config.CONSECUTIVE_FRAMES_FOR_RECOGNITION,
+        blink_detection=config.ENABLE_BLINK_DETECTION,
+        movement_detection=config.ENABLE_MOVEMENT_DETECTION,
+        min_time_between_punches=config.MIN_TIME_BETWEEN_PUNCHES,
+    )
+
+def validate(settings):
+    """
+    Check types and ranges
+    Returns: Settings with normalized types
+    """
+    settings = Settings(
+        tolerance=float(settings.tolerance),
+        consecutive_frames=int(settings.consecutive_frames),
+        blink_detection=bool(settings.blink_detection),
+        movement_detection=bool(settings.movement_detection),
+        min_time_between_punches=int(settings.min_time_between_punches),
+    )
+    
+    for field, (low, high) in LIMITS.items():
+        value = getattr(settings, field)
+        if not low <= value <= high:
+            raise ValueError(f"{field} must be between {low} and {high}, got {value}")
+    
+    return settings
+
+class SettingsStore:
+    def __init__(self, path=None):
+        self.path = path or config.RUNTIME_SETTINGS_PATH
+        self.current = default_settings()
+        self._observers = []
+        self._mtime = None
+        self._last_poll = 0.0
+        self._lock = threading.Lock()
+        self.load()
+    
+    def load(self):
+        """
+        Read the settings file (missing fields keep their config.py value)
+        Returns: True if the settings changed
+        """
+        try:
+            mtime = os.path.getmtime(self.path)
+            with open(self.path) as f:
+                stored = json.load(f)
+            settings = validate(default_settings()._replace(
+                **{field: value for field, value in stored.items() if field in Settings._fields}
+            ))
+        except FileNotFoundError:
+            return False
+        except (ValueError, TypeError) as e:
+            print(f"Ignoring invalid runtime settings in {self.path}: {e}")
+            return False
+        
+        self._mtime = mtime
+        if settings == self.current:
+            return False
+        
+        self._publish(settings)
+        return True
+    
+    def subscribe(self, callback):
+        """Call callback(settings) now and after every change"""
+        with self._lock:
+            self._observers.append(callback)
+        callback(self.current)
+    
+    def update(self, **changes):
+        """
+        Validate, persist and apply new values
+        Returns: the new Settings
+        """
+        settings = validate(self.current._replace(**changes))
+        
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(settings._asdict(), f, indent=2)
+        os.replace(temp_path, self.path)
+        
+        self._mtime = os.path.getmtime(self.path)
+        self._publish(settings)
+        return settings
+    
+    def poll(self):
+        """Pick up changes written by another process (checked every RUNTIME_SETTINGS_POLL_INTERVAL)"""
+        now = time.time()
+        if now - self._last_poll < config.RUNTIME_SETTINGS_POLL_INTERVAL:
+            return False
+        self._last_poll = now
+        
+        try:
+            mtime = os.path.getmtime(self.path)
+        except FileNotFoundError:
+            return False
+        
+        return mtime != self._mtime and self.load()
+    
+    def _publish(self, settings):
+        with self._lock:
+            self.current = settings
+            observers = list(self._observers)
+        
+        # Observers swap one reference, so a frame sees either the old or the new settings
+        for callback in observers:
+            callback(settings)
+        metrics.inc('settings_applied')
@@ -2,6 +2,8 @@ import cv2
 import numpy as np
 from scipy.spatial import distance as dist
 import config
+from metrics import metrics, timed
+from runtime_settings import default_settings
 
 class SpoofDetector:
     def __init__(self):
@@ -11,6 +13,11 @@ class SpoofDetector:
         self.total_blinks = 0
         self.movement_history = []
         self.MOVEMENT_THRESHOLD = 10  # Pixels
+        self.settings = default_settings()  # Replaced as a whole by apply_settings
+    
+    def apply_settings(self, settings):
+        """Switch to new runtime settings"""
+        self.settings = settings
     
     def calculate_eye_aspect_ratio(self, eye_points):
         """
@@ -152,6 +159,7 @@ class SpoofDetector:
         
         return skin_ratio > SKIN_THRESHOLD
     
+    @timed('spoof.is_live_person')
     def is_live_person(self, frame, face_location, facial_landmarks):
         """
         Comprehensive liveness check
@@ -164,14 +172,16 @@ class SpoofDetector:
             'blink': False
         }
         
+        settings = self.settings
+        
         # Texture analysis
-        if config.ENABLE_MOVEMENT_DETECTION:
+        if settings.movement_detection:
             checks['texture'] = self.check_texture_analysis(frame, face_location)
             checks['color'] = self.check_color_analysis(frame, face_location)
             checks['movement'] = self.detect_movement(face_location)
         
         # Blink detection
-        if config.ENABLE_BLINK_DETECTION and facial_landmarks:
+        if settings.blink_detection and facial_landmarks:
             is_blinking, total_blinks = self.detect_blink(facial_landmarks)
             checks['blink'] = total_blinks > 0
         
@@ -183,6 +193,9 @@ class SpoofDetector:
         # Need at least 50% checks to pass
         is_live = confidence >= 50
         
+        if not is_live:
+            metrics.inc('liveness_failed')
+        
         return is_live, confidence, checks
     
     def reset(self):
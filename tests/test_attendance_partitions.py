@@ -0,0 +1,129 @@
+"""
+Monthly attendance partitions, the archive of closed months and the legacy migration
+
+    python -m unittest discover tests
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+from datetime import date, datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+from attendance_manager import AttendanceManager, partition_table
+
+MONTHS = 12  # More than ATTENDANCE_ARCHIVE_ATTACH_BATCH archived months
+
+
+def months_back(count):
+    """The `count` months before the current one, oldest first: list of (year, month)"""
+    today = date.today()
+    index = today.year * 12 + today.month - 1
+    return [divmod(index - back, 12) for back in range(count, 0, -1)]
+
+
+class PartitionArchiveTest(unittest.TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.work_dir.name, 'attendance.db')
+        self.db_manager = AttendanceManager(db_path=self.db_path, kiosk_id='kiosk')
+        self.db_manager.register_user('Jane', 'EMP001')
+        self.user_id = self.db_manager.get_user_by_employee_id('EMP001')[0]
+        
+        self.months = [(year, month + 1) for year, month in months_back(MONTHS)]
+        self.db_manager.insert_records([
+            (self.user_id, 'EMP001', 'punch-in', self.punch_time(year, month))
+            for year, month in self.months
+        ])
+    
+    def tearDown(self):
+        self.db_manager.close()
+        self.work_dir.cleanup()
+    
+    def punch_time(self, year, month):
+        local = self.db_manager.timezone.localize(datetime(year, month, 15, 9, 0))
+        return int(local.timestamp())
+    
+    def test_keep_zero_archives_every_closed_month(self):
+        archived = self.db_manager.archive_closed_months(0)
+        
+        self.assertEqual(archived, [f"{year:04d}-{month:02d}" for year, month in self.months])
+        conn = sqlite3.connect(self.db_path)
+        hot = [month for month, state, _ in self.db_manager.get_partitions(conn.cursor()) if state == 'hot']
+        conn.close()
+        self.assertEqual(hot, [self.db_manager.month_of(datetime.now().timestamp())])
+    
+    def test_range_over_more_archived_months_than_one_attach_batch(self):
+        self.assertGreater(MONTHS, config.ATTENDANCE_ARCHIVE_ATTACH_BATCH)
+        self.db_manager.archive_closed_months(0)
+        
+        first, last = self.months[0], self.months[-1]
+        records = self.db_manager.get_attendance_range(date(first[0], first[1], 1), date(last[0], last[1], 28))
+        
+        self.assertEqual(len(records), MONTHS)
+        self.assertEqual(
+            list(records['punched_at']),
+            sorted((self.punch_time(year, month) for year, month in self.months), reverse=True)
+        )
+    
+    def test_range_mixing_hot_and_archived_months(self):
+        self.db_manager.archive_closed_months(MONTHS // 2 + 1)
+        
+        first, last = self.months[0], self.months[-1]
+        records = self.db_manager.get_attendance_range(date(first[0], first[1], 1), date(last[0], last[1], 28))
+        self.assertEqual(len(records), MONTHS)
+    
+    def test_partition_created_by_another_process(self):
+        other = AttendanceManager(
+            db_path=self.db_path,
+            journal_path=os.path.join(self.work_dir.name, 'other_journal.bin'),
+            kiosk_id='other',
+        )
+        year, month = months_back(MONTHS + 1)[0]
+        punched_at = self.punch_time(year, month + 1)
+        
+        # Neither knows the month yet; the second finds it created and must not fail
+        self.db_manager.insert_records([(self.user_id, 'EMP001', 'punch-in', punched_at)])
+        other.insert_records([(self.user_id, 'EMP001', 'punch-out', punched_at + 60)])
+        other.close()
+        
+        conn = sqlite3.connect(self.db_path)
+        table = partition_table(self.db_manager.month_of(punched_at))
+        self.assertEqual(conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0], 2)
+        conn.close()
+
+
+class LegacyMigrationTest(unittest.TestCase):
+    def test_rows_without_timestamp_are_kept(self):
+        with tempfile.TemporaryDirectory() as work_dir:
+            db_path = os.path.join(work_dir, 'attendance.db')
+            conn = sqlite3.connect(db_path)
+            conn.execute('''
+                CREATE TABLE attendance (
+                    attendance_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER,
+                    employee_id TEXT,
+                    action TEXT,
+                    timestamp TEXT
+                )
+            ''')
+            conn.executemany(
+                'INSERT INTO attendance (user_id, employee_id, action, timestamp) VALUES (?, ?, ?, ?)',
+                [(1, 'EMP001', 'punch-in', '2025-03-03 09:00:00'), (1, 'EMP001', 'punch-out', None)]
+            )
+            conn.commit()
+            conn.close()
+            
+            AttendanceManager(db_path=db_path, kiosk_id='kiosk').close()
+            
+            conn = sqlite3.connect(db_path)
+            self.assertEqual(conn.execute('SELECT COUNT(*) FROM attendance_2025_03').fetchone()[0], 1)
+            self.assertEqual(conn.execute('SELECT action FROM attendance_unmigrated').fetchall(), [('punch-out',)])
+            conn.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
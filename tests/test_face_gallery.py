@@ -0,0 +1,242 @@
+"""
+Face gallery: quantized coarse search with exact re-rank, tombstones and compaction,
+per-employee templates clustered into prototypes and the local-first
+search of the partitioned gallery
+
+    python -m unittest discover tests
+"""
+import os
+import sys
+import unittest
+from unittest import mock
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+from face_gallery import FaceGallery, PartitionedGallery, ENCODING_SIZE, cluster_prototypes
+from metrics import metrics
+
+ROWS = 300
+
+
+def random_encodings(rows, seed=0):
+    return np.random.default_rng(seed).normal(0, 0.09, (rows, ENCODING_SIZE)).astype(np.float32)
+
+
+def employee_ids(rows):
+    return [f"EMP{row:04d}" for row in range(rows)]
+
+
+class CoarseSearchTest(unittest.TestCase):
+    def setUp(self):
+        self.encodings = random_encodings(ROWS)
+        self.ids = employee_ids(ROWS)
+        
+        self.exact = FaceGallery(quantization=None)
+        self.exact.load(self.encodings, self.ids, self.ids)
+    
+    def quantized(self, quantization, rerank_k=16):
+        gallery = FaceGallery(quantization=quantization, rerank_k=rerank_k, exact_on_disk=False)
+        gallery.load(self.encodings, self.ids, self.ids)
+        self.addCleanup(gallery.close)
+        return gallery
+    
+    def test_rerank_returns_exact_distances(self):
+        probe = self.encodings[37] + 0.02
+        expected = float(np.linalg.norm(probe - self.encodings[37]))
+        
+        for quantization in ('int8', 'float16'):
+            row, distance, _ = self.quantized(quantization).match(probe)
+            
+            self.assertEqual(row, 37, quantization)
+            self.assertAlmostEqual(distance, expected, places=5, msg=quantization)
+    
+    def test_quantized_search_agrees_with_exact_search(self):
+        probes = random_encodings(20, seed=1) * 0.5 + self.encodings[:20] * 0.5
+        
+        for quantization in ('int8', 'float16'):
+            gallery = self.quantized(quantization)
+            for probe in probes:
+                self.assertEqual(
+                    gallery.match_identity(probe)[0], self.exact.match_identity(probe)[0], quantization
+                )
+    
+    def test_runner_up_found_when_candidates_are_one_person(self):
+        # rerank_k rows of one employee leave no other identity among the candidates
+        gallery = self.quantized('int8', rerank_k=4)
+        for _ in range(4):
+            gallery.add(self.encodings[0], self.ids[0], self.ids[0])
+        
+        _, distance, runner_up = gallery.match(self.encodings[0])
+        
+        self.assertAlmostEqual(distance, 0.0, places=4)
+        self.assertTrue(np.isfinite(runner_up))
+    
+    def test_added_rows_are_searchable_without_rebuild(self):
+        gallery = self.quantized('int8')
+        encoding = random_encodings(1, seed=2)[0]
+        gallery.add(encoding, 'New', 'NEW001')
+        
+        self.assertEqual(gallery.match_identity(encoding)[0], 'NEW001')
+
+
+class TombstoneTest(unittest.TestCase):
+    def setUp(self):
+        self.encodings = random_encodings(ROWS)
+        self.ids = employee_ids(ROWS)
+    
+    def gallery(self, quantization=None):
+        gallery = FaceGallery(quantization=quantization, rerank_k=16, exact_on_disk=False)
+        gallery.load(self.encodings, self.ids, self.ids)
+        self.addCleanup(gallery.close)
+        return gallery
+    
+    def test_removed_employee_is_never_matched(self):
+        for quantization in (None, 'int8'):
+            gallery = self.gallery(quantization)
+            
+            self.assertEqual(gallery.remove_employee('EMP0037'), 1)
+            
+            self.assertEqual(len(gallery), ROWS - 1)
+            self.assertFalse(gallery.has_employee('EMP0037'))
+            self.assertEqual(gallery.rows_for('EMP0037'), [])
+            self.assertNotEqual(gallery.match_identity(self.encodings[37])[0], 'EMP0037', quantization)
+            self.assertNotEqual(gallery.match_identities([self.encodings[37]])[0][0], 'EMP0037', quantization)
+    
+    def test_compact_drops_dead_rows_and_remaps_rows(self):
+        gallery = self.gallery('int8')
+        # Fewer than GALLERY_COMPACTION_MIN_ROWS, so no background compaction starts
+        for row in range(0, ROWS, 10):
+            gallery.remove_employee(self.ids[row])
+        probes = self.encodings[1::10]
+        before = [gallery.match_identity(probe)[:3] for probe in probes]
+        
+        self.assertTrue(gallery.compact())
+        
+        self.assertEqual(len(gallery.encodings), len(gallery))
+        self.assertEqual(len(gallery.live_rows()), len(gallery))
+        row = gallery.rows_for('EMP0001')[0]
+        np.testing.assert_array_equal(gallery.encodings[row], self.encodings[1])
+        self.assertEqual(gallery.employee_ids[row], 'EMP0001')
+        
+        after = [gallery.match_identity(probe)[:3] for probe in probes]
+        for (before_id, _, before_distance), (after_id, _, after_distance) in zip(before, after):
+            self.assertEqual(before_id, after_id)
+            self.assertAlmostEqual(before_distance, after_distance, places=5)
+    
+    def test_compact_without_dead_rows_is_a_no_op(self):
+        gallery = self.gallery()
+        version = gallery.version
+        
+        self.assertFalse(gallery.compact())
+        self.assertEqual(gallery.version, version)
+    
+    def test_deletions_start_background_compaction(self):
+        gallery = self.gallery()
+        
+        with mock.patch.object(config, 'GALLERY_COMPACTION_MIN_ROWS', 8), \
+                mock.patch.object(config, 'GALLERY_COMPACTION_RATIO', 0.02):
+            for row in range(7):
+                gallery.remove_employee(self.ids[row])
+            self.assertIsNone(gallery._compaction_thread)
+            
+            gallery.remove_employee(self.ids[7])
+            gallery._compaction_thread.join(timeout=10)
+        
+        self.assertEqual(len(gallery.encodings), ROWS - 8)
+        self.assertEqual(gallery.match_identity(self.encodings[8])[0], 'EMP0008')
+
+
+class PrototypeTest(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(3)
+        # Two kinds of capture of one person (e.g. with and without glasses)
+        self.modes = rng.normal(0, 0.09, (2, ENCODING_SIZE)).astype(np.float32)
+        self.captures = np.concatenate([
+            mode + rng.normal(0, 0.01, (6, ENCODING_SIZE)).astype(np.float32) for mode in self.modes
+        ])
+        rng.shuffle(self.captures)
+    
+    def test_few_encodings_are_kept_as_they_are(self):
+        prototypes = cluster_prototypes(self.captures[:3], 5)
+        
+        np.testing.assert_array_equal(prototypes, self.captures[:3])
+    
+    def test_prototypes_cover_each_kind_of_capture(self):
+        prototypes = cluster_prototypes(self.captures, 2)
+        
+        self.assertEqual(prototypes.shape, (2, ENCODING_SIZE))
+        for mode in self.modes:
+            self.assertLess(np.linalg.norm(prototypes - mode, axis=1).min(), 0.1)
+        np.testing.assert_array_equal(prototypes, cluster_prototypes(self.captures, 2))
+    
+    def test_templates_beyond_the_limit_become_prototypes(self):
+        gallery = FaceGallery(quantization=None)
+        gallery.max_templates = 3
+        other = random_encodings(1, seed=4)[0]
+        gallery.add(other, 'Bob', 'EMP002')
+        
+        counts = [gallery.add_template(capture, 'Alice', 'EMP001') for capture in self.captures]
+        
+        self.assertEqual(counts[:3], [1, 2, 3])
+        self.assertTrue(all(count <= 3 for count in counts))
+        self.assertEqual(len(gallery.rows_for('EMP001')), counts[-1])
+        self.assertEqual(len(gallery), counts[-1] + 1)
+        self.assertEqual(gallery.rows_for('EMP002'), [0])
+        
+        for mode in self.modes:
+            employee_id, _, distance, _ = gallery.match_identity(mode)
+            self.assertEqual(employee_id, 'EMP001')
+            self.assertLess(distance, 0.1)
+        self.assertEqual(gallery.match_identity(other)[0], 'EMP002')
+
+
+class PartitionedSearchTest(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(5)
+        self.local, self.remote = rng.normal(0, 0.09, (2, ENCODING_SIZE)).astype(np.float32)
+        
+        self.gallery = PartitionedGallery(sites=['Pune'])
+        self.gallery.add_template(self.local, 'Asha', 'EMP001', 'Pune', 'Operations')
+        self.gallery.add_template(self.remote, 'Ravi', 'EMP002', 'Mumbai', 'Operations')
+        metrics.reset()
+    
+    def fallbacks(self):
+        return metrics.snapshot()[1].get('partition_fallbacks', 0)
+    
+    def test_local_match_within_tolerance_skips_remote_partitions(self):
+        # Ravi is closer, but Asha is within tolerance in the kiosk's own site
+        probe = 0.45 * self.local + 0.55 * self.remote
+        distance = float(np.linalg.norm(probe - self.local))
+        
+        employee_id, _, found, _ = self.gallery.match_identity(probe, tolerance=distance + 0.01)
+        
+        self.assertEqual(employee_id, 'EMP001')
+        self.assertAlmostEqual(found, distance, places=5)
+        self.assertEqual(self.fallbacks(), 0)
+    
+    def test_remote_partitions_searched_without_local_match(self):
+        employee_id, _, distance, runner_up = self.gallery.match_identity(self.remote, tolerance=0.6)
+        
+        self.assertEqual(employee_id, 'EMP002')
+        self.assertAlmostEqual(distance, 0.0, places=4)
+        self.assertAlmostEqual(runner_up, np.linalg.norm(self.remote - self.local), places=4)
+        self.assertEqual(self.fallbacks(), 1)
+    
+    def test_without_tolerance_every_partition_is_searched(self):
+        probe = 0.45 * self.local + 0.55 * self.remote
+        
+        self.assertEqual(self.gallery.match_identity(probe)[0], 'EMP002')
+        self.assertEqual(self.fallbacks(), 0)
+    
+    def test_batch_falls_back_only_for_local_misses(self):
+        matches = self.gallery.match_identities([self.local, self.remote, self.local], tolerance=0.6)
+        
+        self.assertEqual([match[0] for match in matches], ['EMP001', 'EMP002', 'EMP001'])
+        self.assertEqual(self.fallbacks(), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+"""
+Temporal fusion: evidence, commit and identity changes on tracked faces
+
+    python -m unittest discover tests
+"""
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+from face_gallery import FaceGallery, ENCODING_SIZE
+from face_tracker import FaceTracker
+from runtime_settings import default_settings
+
+BOX = (100, 300, 300, 100)  # (top, right, bottom, left), full FUSION_REFERENCE_FACE_SIZE weight
+
+
+class GalleryRecognizer:
+    """The part of FaceRecognizer the tracker uses, on a plain FaceGallery"""
+    def __init__(self, gallery):
+        self.gallery = gallery
+        self.settings = default_settings()
+        self.batches = 0
+    
+    def match_identities(self, face_encodings):
+        self.batches += 1
+        return self.gallery.match_identities(face_encodings)
+
+
+class FaceTrackerTest(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.alice = rng.normal(0, 0.09, ENCODING_SIZE).astype(np.float32)
+        self.bob = rng.normal(0, 0.09, ENCODING_SIZE).astype(np.float32)
+        
+        gallery = FaceGallery()
+        gallery.load([self.alice, self.bob], ['Alice', 'Bob'], ['EMP001', 'EMP002'])
+        self.recognizer = GalleryRecognizer(gallery)
+        self.tracker = FaceTracker(self.recognizer)
+    
+    def run_until_ready(self, encoding, max_frames=config.FUSION_MAX_FRAMES):
+        for frame in range(1, max_frames + 1):
+            result = self.tracker.update([BOX], [encoding])[0]
+            if result['ready']:
+                return frame, result
+        return None, result
+    
+    def test_close_match_commits_after_min_frames(self):
+        frames, result = self.run_until_ready(self.alice)
+        
+        self.assertEqual(frames, config.FUSION_MIN_FRAMES)
+        self.assertEqual(result['employee_id'], 'EMP001')
+    
+    def test_one_gallery_pass_per_frame(self):
+        self.tracker.update([BOX], [self.alice])
+        self.tracker.update([BOX], [self.alice])
+        
+        self.assertEqual(self.recognizer.batches, 2)
+    
+    def test_committed_track_does_not_fire_again(self):
+        _, result = self.run_until_ready(self.alice)
+        self.tracker.mark_committed(result['track_id'])
+        
+        for _ in range(5):
+            result = self.tracker.update([BOX], [self.alice])[0]
+            self.assertFalse(result['ready'])
+            self.assertEqual(result['employee_id'], 'EMP001')
+    
+    def test_reset_evidence_waits_for_new_evidence(self):
+        _, result = self.run_until_ready(self.alice)
+        self.tracker.reset_evidence(result['track_id'])
+        
+        frames, result = self.run_until_ready(self.alice)
+        self.assertEqual(frames, config.FUSION_MIN_FRAMES)
+    
+    def test_next_person_in_a_committed_track_gets_recognized(self):
+        _, result = self.run_until_ready(self.alice)
+        self.tracker.mark_committed(result['track_id'])
+        
+        # Bob steps into the same spot before the track ages out
+        results = [self.tracker.update([BOX], [self.bob])[0] for _ in range(config.TRACK_MAX_IDENTITY_MISMATCHES)]
+        self.assertTrue(all(result['employee_id'] == 'EMP001' for result in results))
+        
+        frames, result = self.run_until_ready(self.bob)
+        self.assertIsNotNone(frames)
+        self.assertEqual(result['employee_id'], 'EMP002')
+        self.assertNotEqual(result['track_id'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+"""
+Gallery change log delta exchange through a shared directory
+
+    python -m unittest discover tests
+"""
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gallery_sync import GalleryChangeLog, DELTA_SUFFIX
+
+
+class DeltaSyncTest(unittest.TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.TemporaryDirectory()
+        self.share = os.path.join(self.work_dir.name, 'share')
+        self.kiosks = {
+            kiosk_id: GalleryChangeLog(os.path.join(self.work_dir.name, f'{kiosk_id}.db'), kiosk_id)
+            for kiosk_id in ('A', 'B', 'C')
+        }
+        for change_log in self.kiosks.values():
+            change_log.import_deltas(self.share)  # Join: publishes an empty ack
+    
+    def tearDown(self):
+        self.work_dir.cleanup()
+    
+    def deltas(self):
+        return sorted(name for name in os.listdir(self.share) if name.endswith(DELTA_SUFFIX))
+    
+    def test_deltas_are_json(self):
+        a = self.kiosks['A']
+        a.record_insert('EMP001', 'Jane', np.full(128, 0.5))
+        path, count = a.export_deltas(self.share)
+        
+        with open(path) as f:
+            delta = json.load(f)
+        self.assertEqual(count, 1)
+        self.assertEqual(delta['changes'][0]['employee_id'], 'EMP001')
+        
+        self.assertEqual(self.kiosks['B'].import_deltas(self.share), 1)
+        change = self.kiosks['B'].changes_since(0)[0]
+        self.assertEqual((change['origin'], change['name']), ('A', 'Jane'))
+        np.testing.assert_array_equal(change['encoding'], np.full(128, 0.5, dtype=np.float32))
+    
+    def test_malformed_delta_is_skipped(self):
+        with open(os.path.join(self.share, f'X__0000000001-0000000001{DELTA_SUFFIX}'), 'w') as f:
+            json.dump({'changes': [{'op': 'insert', 'origin': 'X', 'origin_seq': 1, 'employee_id': 'E',
+                                    'name': None, 'encoding': [0.0] * 3}]}, f)
+        
+        self.assertEqual(self.kiosks['B'].import_deltas(self.share), 0)
+        self.assertEqual(self.kiosks['B'].changes_since(0), [])
+    
+    def test_files_are_read_once_across_restarts(self):
+        a = self.kiosks['A']
+        a.record_insert('EMP001', 'Jane', np.zeros(128))
+        a.export_deltas(self.share)
+        self.assertEqual(self.kiosks['B'].import_deltas(self.share), 1)
+        
+        # The watermark is in the log, not in memory
+        restarted = GalleryChangeLog(self.kiosks['B'].log_path, 'B')
+        self.assertEqual(restarted.import_deltas(self.share), 0)
+    
+    def test_prune_waits_for_every_kiosk(self):
+        a = self.kiosks['A']
+        a.record_insert('EMP001', 'Jane', np.zeros(128))
+        a.export_deltas(self.share)
+        
+        self.kiosks['B'].import_deltas(self.share)
+        self.assertEqual(a.prune_deltas(self.share), 0)  # C hasn't read it yet
+        
+        self.kiosks['C'].import_deltas(self.share)
+        self.assertEqual(a.prune_deltas(self.share), 1)
+        self.assertEqual(self.deltas(), [])
+        self.assertEqual(len(self.kiosks['C'].changes_since(0)), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+"""
+Punch journal with several writers on one attendance database
+
+    python -m unittest discover tests
+"""
+import multiprocessing
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from attendance_manager import AttendanceManager, partition_table
+from punch_journal import PunchJournal, JournalLockedError
+
+EMPLOYEES = 20
+
+
+def count_punches(db_path):
+    conn = sqlite3.connect(db_path)
+    months = [row[0] for row in conn.execute('SELECT month FROM attendance_partitions')]
+    total = sum(conn.execute(f'SELECT COUNT(*) FROM {partition_table(month)}').fetchone()[0] for month in months)
+    conn.close()
+    return total
+
+
+def punch_all(db_path, employee_ids, ready, start):
+    """Worker process: one kiosk process punching its employees"""
+    db_manager = AttendanceManager(db_path=db_path, kiosk_id='kiosk')
+    ready.wait()  # Every process holds its journal before anyone punches
+    start.wait()
+    for employee_id in employee_ids:
+        success, message = db_manager.mark_attendance(employee_id, 'punch-in')
+        assert success, message
+    while db_manager.replay_journal() is None:
+        pass
+    db_manager.close()
+
+
+class PunchJournalWritersTest(unittest.TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.work_dir.name, 'attendance.db')
+        self.journal_path = os.path.join(self.work_dir.name, 'punch_journal.bin')
+        
+        db_manager = AttendanceManager(db_path=self.db_path, kiosk_id='setup')
+        self.employee_ids = [f"EMP{i:03d}" for i in range(EMPLOYEES)]
+        for employee_id in self.employee_ids:
+            db_manager.register_user(employee_id, employee_id)
+        db_manager.close()
+    
+    def tearDown(self):
+        self.work_dir.cleanup()
+    
+    def test_journal_has_one_writer(self):
+        journal = PunchJournal(self.journal_path)
+        with self.assertRaises(JournalLockedError):
+            PunchJournal(self.journal_path)
+        journal.close()
+        PunchJournal(self.journal_path).close()
+    
+    def test_second_writer_gets_its_own_journal(self):
+        first = AttendanceManager(db_path=self.db_path, kiosk_id='kiosk')
+        second = AttendanceManager(db_path=self.db_path, kiosk_id='kiosk')
+        
+        self.assertNotEqual(first.journal.path, second.journal.path)
+        self.assertNotEqual(first.journal_writer, second.journal_writer)
+        
+        half = EMPLOYEES // 2
+        for employee_id in self.employee_ids[:half]:
+            self.assertTrue(first.mark_attendance(employee_id, 'punch-in')[0])
+        for employee_id in self.employee_ids[half:]:
+            self.assertTrue(second.mark_attendance(employee_id, 'punch-in')[0])
+        
+        # Both journals numbered their punches from 1; none may be skipped
+        self.assertEqual(first.replay_journal(), 0)
+        self.assertEqual(second.replay_journal(), 0)
+        self.assertEqual(count_punches(self.db_path), EMPLOYEES)
+        
+        first.close()
+        second.close()
+    
+    def test_leftover_slot_is_replayed_by_next_owner(self):
+        first = AttendanceManager(db_path=self.db_path, kiosk_id='kiosk')
+        second = AttendanceManager(db_path=self.db_path, kiosk_id='kiosk')
+        
+        # Journaled but not applied when the second process stops
+        second.journal.append(self.employee_ids[0], 'punch-in', 1767225600)
+        second.close()
+        
+        third = AttendanceManager(db_path=self.db_path, kiosk_id='kiosk')
+        self.assertEqual(third.journal.path, second.journal.path)
+        self.assertEqual(count_punches(self.db_path), 1)
+        
+        first.close()
+        third.close()
+    
+    def test_two_processes_on_one_database(self):
+        context = multiprocessing.get_context('spawn')
+        ready = context.Barrier(2)
+        start = context.Barrier(2)
+        half = EMPLOYEES // 2
+        
+        processes = [
+            context.Process(target=punch_all, args=(self.db_path, employee_ids, ready, start))
+            for employee_ids in (self.employee_ids[:half], self.employee_ids[half:])
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join(60)
+            self.assertEqual(process.exitcode, 0)
+        
+        self.assertEqual(count_punches(self.db_path), EMPLOYEES)
+
+
+if __name__ == '__main__':
+    unittest.main()
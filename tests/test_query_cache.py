@@ -0,0 +1,84 @@
+"""
+Dashboard query cache invalidated by the database data version
+
+    python -m unittest discover tests
+"""
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from attendance_manager import AttendanceManager, QueryCache
+from metrics import metrics
+
+
+class QueryCacheTest(unittest.TestCase):
+    def test_entry_only_served_at_its_version(self):
+        cache = QueryCache(max_entries=4)
+        cache.put(('get_all_users',), 1, 'users')
+        
+        self.assertEqual(cache.get(('get_all_users',), 1), 'users')
+        self.assertIsNone(cache.get(('get_all_users',), 2))
+    
+    def test_least_recently_used_entry_goes_first(self):
+        cache = QueryCache(max_entries=2)
+        cache.put('a', 1, 'A')
+        cache.put('b', 1, 'B')
+        cache.get('a', 1)
+        cache.put('c', 1, 'C')
+        
+        self.assertEqual(cache.get('a', 1), 'A')
+        self.assertIsNone(cache.get('b', 1))
+
+
+class CachedQueryTest(unittest.TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.work_dir.name, 'attendance.db')
+        self.kiosk = AttendanceManager(db_path=self.db_path, kiosk_id='kiosk')
+        self.dashboard = AttendanceManager(
+            db_path=self.db_path,
+            journal_path=os.path.join(self.work_dir.name, 'dashboard_journal.bin'),
+            kiosk_id='dashboard',
+        )
+        self.kiosk.register_user('Jane', 'EMP001')
+        metrics.reset()
+    
+    def tearDown(self):
+        self.kiosk.close()
+        self.dashboard.close()
+        self.work_dir.cleanup()
+    
+    def counters(self):
+        counters = metrics.snapshot()[1]
+        return counters.get('query_cache_hits', 0), counters.get('query_cache_misses', 0)
+    
+    def test_repeated_query_is_a_hit(self):
+        self.dashboard.get_all_users()
+        self.dashboard.get_all_users()
+        
+        self.assertEqual(self.counters(), (1, 1))
+    
+    def test_write_in_another_process_invalidates(self):
+        self.assertEqual(len(self.dashboard.get_all_users()), 1)
+        
+        # A different manager stands in for another process sharing the database
+        self.kiosk.register_user('John', 'EMP002')
+        self.assertEqual(len(self.dashboard.get_all_users()), 2)
+        
+        self.kiosk.mark_attendance('EMP001', 'punch-in')
+        self.kiosk.replay_journal()
+        self.assertEqual(len(self.dashboard.get_today_attendance()), 1)
+        self.assertEqual(self.counters(), (0, 3))
+    
+    def test_cached_result_is_a_copy(self):
+        users = self.dashboard.get_all_users()
+        users.drop(users.index, inplace=True)
+        
+        self.assertEqual(len(self.dashboard.get_all_users()), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,9 @@
+import time
 import cv2
 import numpy as np
+import pytz
 from datetime import datetime, timedelta
+import config
 
 def calculate_eye_aspect_ratio(eye_landmarks):
     """
@@ -17,21 +20,18 @@ def calculate_eye_aspect_ratio(eye_landmarks):
     ear = (A + B) / (2.0 * C)
     return ear
 
-def format_timestamp(timestamp_str):
-    """Format timestamp for display"""
+def format_timestamp(epoch):
+    """Format an epoch timestamp (seconds, UTC) as local time for display"""
     try:
-        dt = datetime.strptime(timestamp_str, '%Y-%m-%d %H:%M:%S')
+        dt = datetime.fromtimestamp(epoch, pytz.timezone(config.TIMEZONE))
         return dt.strftime('%I:%M %p')
     except:
-        return timestamp_str
+        return str(epoch)
 
-def get_time_difference(timestamp_str):
+def get_time_difference(epoch):
     """Get time difference from now"""
     try:
-        dt = datetime.strptime(timestamp_str, '%Y-%m-%d %H:%M:%S')
-        diff = datetime.now() - dt
-        
-        seconds = diff.total_seconds()
+        seconds = time.time() - epoch
         
         if seconds < 60:
             return f"{int(seconds)} seconds ago"